@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Общие данные тестов: синтетический мир FakeWorld и локальный сервер
+FakeVKServer, на который на время тестов направляются запросы spy"""
+
+import pytest
+
+from unshared_vk import spy
+from unshared_vk.fakevk import FakeVKServer, FakeWorld
+
+USERS = dict(many_groups=dict(friends=120, groups=300), # Пользователи мира
+             many_friends=dict(friends=1500, groups=12), # тестов: короткое
+             small=dict(friends=40, groups=30))          # имя -> параметры
+                                                         # add_user
+
+
+@pytest.fixture(scope='session')
+def world():
+    """Мир с пользователями USERS. Часть профилей закрыта, чтобы
+    проверялась и замена списков групп друзей проверкой членства"""
+    world = FakeWorld(seed=7, users=20000, groups=3000, private_rate=0.2)
+    for screen_name, params in USERS.items():
+        world.add_user(screen_name, **params)
+    world.add_user('deleted', friends=5, groups=5, deactivated='deleted')
+    return world
+
+
+@pytest.fixture(scope='session')
+def server(world):
+    """Сервер без ограничения частоты запросов. Адрес API spy на время
+    тестов заменяется адресом сервера"""
+    with FakeVKServer(world, rate=None) as server:
+        spy.set_api_url(server.url)
+        try:
+            yield server
+        finally:
+            spy.set_api_url()
+
+
+@pytest.fixture
+def scan_params():
+    """Параметры поиска без вывода на экран, файлов и пауз"""
+    return dict(json_file=None, silent=True, progress=lambda status: None,
+                request_rate=0, request_delay=0)
+
+
+@pytest.fixture(scope='session')
+def friend_counts(world):
+    """Функция, возвращающая точное число друзей пользователя в каждой
+    его группе по данным мира: {группа: число друзей}"""
+    def friend_counts(screen_name):
+        user = world.resolve(screen_name)
+        return {group: sum(world.is_member(group, friend)
+                           for friend in world.user_friends(user))
+                for group in world.user_groups(user)}
+    return friend_counts
+
+
+@pytest.fixture(scope='session')
+def expected_special(friend_counts):
+    """Функция, возвращающая множество особых групп пользователя по
+    данным мира"""
+    def expected_special(screen_name, members_threshold=0):
+        return {group for group, count
+                in friend_counts(screen_name).items()
+                if count <= members_threshold}
+    return expected_special
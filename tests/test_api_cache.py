@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Тесты постоянного кэша ответов API ВК ApiCache"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+class Clock:
+    """Подменяемое время для проверки устаревания записей"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spy, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def api_cache(tmp_path):
+    api_cache = spy.ApiCache(str(tmp_path / 'cache' / 'api.sqlite3'),
+                             ttl=dict(membership=10, groups_info=100))
+    yield api_cache
+    api_cache.close()
+
+
+def test_get_put(api_cache, clock):
+    key = api_cache.key('execute', 'ru', 'return 1;')
+    assert api_cache.get(key) is None
+    api_cache.put(key, 'execute', dict(items=[1, 2]))
+    assert api_cache.get(key) == dict(items=[1, 2])
+    stats = api_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['type_hits'] == stats['type_misses'] == dict(execute=1)
+    api_cache.clear()
+    assert api_cache.stats()['size'] == 0
+    assert api_cache.get(key) is None
+
+
+def test_ttl(api_cache, clock):
+    api_cache.put('membership', 'membership', [1])
+    api_cache.put('groups_info', 'groups_info', [2])
+    clock.now += 50
+    # Время хранения задается для каждого типа данных
+    assert api_cache.get('membership', 'membership') is None
+    assert api_cache.get('groups_info', 'groups_info') == [2]
+    assert api_cache.stats()['entries'] == 1
+
+
+def test_expire_on_put(api_cache, clock):
+    api_cache.put('membership', 'membership', [1])
+    clock.now += spy.CACHE_EXPIRE_INTERVAL
+    api_cache.put('groups_info', 'groups_info', [2])
+    # Устаревшие записи удаляются при сохранении новых, даже если их не
+    # запрашивают
+    assert api_cache.stats()['entries'] == 1
+
+
+def test_evict(tmp_path, clock):
+    api_cache = spy.ApiCache(str(tmp_path / 'api.sqlite3'), max_size=40)
+    try:
+        for index in range(3):
+            clock.now += 1
+            api_cache.put(f'key{index}', 'execute', 'x' * 10)
+        clock.now += 1
+        api_cache.get('key0')
+        clock.now += 1
+        api_cache.put('key3', 'execute', 'x' * 10)
+        # Удаляется запись, к которой дольше всего не обращались
+        assert api_cache.get('key1') is None
+        assert all(api_cache.get(f'key{index}') is not None
+                   for index in (0, 2, 3))
+        assert api_cache.stats()['size'] <= 40
+        # Ответ больше max_size не сохраняется
+        api_cache.put('key4', 'execute', 'x' * 100)
+        assert api_cache.get('key4') is None
+    finally:
+        api_cache.close()
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / 'api.sqlite3')
+    api_cache = spy.ApiCache(path)
+    api_cache.put('key', 'execute', [1, 2, 3])
+    size = api_cache.stats()['size']
+    api_cache.close()
+    api_cache = spy.ApiCache(path)
+    try:
+        assert api_cache.get('key') == [1, 2, 3]
+        assert api_cache.stats()['size'] == size
+    finally:
+        api_cache.close()
+
+
+def test_scan_uses_cache(tmp_path, server, scan_params):
+    api_cache = spy.ApiCache(str(tmp_path / 'api.sqlite3'))
+    try:
+        results = []
+        for attempt in range(2):
+            server.reset_stats()
+            results.append(spy.find_unshared_groups(
+                                'small', members_threshold=1,
+                                api_cache=api_cache, **scan_params))
+            requests = server.stats()['requests']
+        assert results[0] == results[1]
+        # Повторный поиск выполняется полностью по кэшу
+        assert requests == 0
+        # Ответы, полученные другим ключом доступа, не используются
+        spy.find_unshared_groups('small', members_threshold=1,
+                                 api_cache=api_cache, token='other',
+                                 **scan_params)
+        assert server.stats()['requests'] > 0
+    finally:
+        api_cache.close()
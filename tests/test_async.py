@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Тесты асинхронного поиска особых групп"""
+
+import asyncio
+
+import pytest
+
+from unshared_vk import spy
+
+pytestmark = pytest.mark.skipif(spy.aiohttp is None,
+                                reason='нет пакета aiohttp')
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_async_find_unshared_groups(server, scan_params, expected_special,
+                                    batch):
+    found = []
+    result = asyncio.run(spy.async_find_unshared_groups(
+                                'many_groups', members_threshold=1,
+                                batch=batch, concurrency=4,
+                                sink=found.append, **scan_params))
+    assert {record['gid'] for record in found} \
+           == expected_special('many_groups', 1)
+    assert result == spy.save_special_groups(found, None)
+
+
+def test_async_deactivated_user(server, scan_params):
+    with pytest.raises(ValueError):
+        asyncio.run(spy.async_find_unshared_groups('deleted',
+                                                   **scan_params))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Тесты проверки нескольких групп в одном запросе execute (batch)"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('screen_name', ['many_groups', 'small',
+                                         'many_friends'])
+def test_special_groups(world, server, scan_params, expected_special,
+                        batch, screen_name):
+    records = list(spy.find_unshared_groups(screen_name, members_threshold=1,
+                                            strategy='groups', batch=batch,
+                                            stream=True, **scan_params))
+    assert {record['gid'] for record in records} \
+           == expected_special(screen_name, 1)
+    for record in records:
+        group_info = world.group_info(record['gid'])
+        assert record['name'] == group_info['name']
+        assert record['members_count'] == group_info['members_count']
+
+
+def test_fewer_requests(server, scan_params):
+    requests = {}
+    for batch in (False, True):
+        server.reset_stats()
+        list(spy.find_unshared_groups('small', strategy='groups',
+                                      batch=batch, stream=True,
+                                      **scan_params))
+        requests[batch] = server.stats()['requests']
+    assert requests[True] < requests[False]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Тесты замеров производительности модуля bench"""
+
+import io
+
+from unshared_vk import spy
+from unshared_vk.bench import legacy_count, print_report, run_benchmark
+
+
+def test_run_benchmark(server):
+    try:
+        results = run_benchmark(['sequential', 'batch'], friends=60,
+                                groups=20, latency=0, jitter=0, rate=0)
+    finally:
+        # run_benchmark восстанавливает адрес API ВК
+        spy.set_api_url(server.url)
+    assert [result['config'] for result in results] == ['sequential',
+                                                        'batch']
+    for result in results:
+        assert result['scans'] == 1
+        assert result['errors'] == 0
+        assert result['requests_per_scan'] >= 2
+    sequential, batch = results
+    assert batch['requests_per_scan'] < sequential['requests_per_scan']
+
+    report = io.StringIO()
+    print_report(results, file=report)
+    assert report.getvalue().count('\n') == 3
+
+
+def test_run_benchmark_reproducible(server):
+    try:
+        first, second = (run_benchmark(['batch'], friends=40, groups=15,
+                                       latency=0, jitter=0, rate=0)[0]
+                         for attempt in range(2))
+    finally:
+        spy.set_api_url(server.url)
+    for key in ('requests_per_scan', 'api_calls_per_scan',
+                'operations_per_call', 'payload_per_scan'):
+        assert first[key] == second[key]
+
+
+def test_legacy_count(server, scan_params, expected_special):
+    template = spy.CHECK_SPECIAL_GROUP_REQUEST_CODE
+    with legacy_count():
+        assert spy.CHECK_SPECIAL_GROUP_REQUEST_CODE != template
+        records = list(spy.find_unshared_groups('small', strategy='groups',
+                                                members_threshold=1,
+                                                stream=True, **scan_params))
+    assert spy.CHECK_SPECIAL_GROUP_REQUEST_CODE == template
+    assert {record['gid'] for record in records} \
+           == expected_special('small', 1)
+
+    try:
+        current, legacy = run_benchmark(['sequential', 'legacy_count'],
+                                        friends=60, groups=10, latency=0,
+                                        jitter=0, rate=0)
+    finally:
+        spy.set_api_url(server.url)
+    # Запросы те же, но прежнее выражение выполняет больше операций
+    assert legacy['requests_per_scan'] == current['requests_per_scan']
+    assert legacy['operations_per_call'] > current['operations_per_call']
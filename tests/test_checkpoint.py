@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Тесты контрольных точек долгого поиска особых групп"""
+
+import json
+
+from unshared_vk import spy
+
+
+def interrupt(checkpoint_file, scan_params, records=3):
+    """Поиск, прерванный после первых records особых групп"""
+    special_groups = spy.find_unshared_groups(
+                        'small', members_threshold=1, strategy='groups',
+                        checkpoint_file=checkpoint_file, checkpoint_every=5,
+                        stream=True, **scan_params)
+    found = [next(special_groups) for index in range(records)]
+    special_groups.close()
+    return found
+
+
+def test_resume(tmp_path, server, scan_params, expected_special):
+    server.reset_stats()
+    list(spy.find_unshared_groups('small', members_threshold=1,
+                                  strategy='groups', stream=True,
+                                  **scan_params))
+    fresh_requests = server.stats()['requests']
+
+    checkpoint_file = tmp_path / 'scan.checkpoint'
+    found = interrupt(checkpoint_file, scan_params)
+    with open(checkpoint_file, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    assert checkpoint['special_groups'] == found
+    assert checkpoint['params'] == dict(exact_counts=False,
+                                        strategy='groups')
+
+    server.reset_stats()
+    records = list(spy.find_unshared_groups(
+                        'small', members_threshold=1, strategy='groups',
+                        checkpoint_file=checkpoint_file, stream=True,
+                        **scan_params))
+    assert records[:len(found)] == found
+    assert {record['gid'] for record in records} \
+           == expected_special('small', 1)
+    # Проверенные до прерывания группы повторно не запрашиваются
+    assert server.stats()['requests'] < fresh_requests
+    assert not checkpoint_file.exists()
+
+
+def test_other_params_discard_checkpoint(tmp_path, server, scan_params):
+    # Контрольная точка с нижними оценками числа друзей не смешивается с
+    # точным подсчетом: поиск выполняется заново
+    params = dict(members_threshold=1, strategy='groups', exact_counts=True,
+                  stream=True)
+    server.reset_stats()
+    fresh = list(spy.find_unshared_groups('small', **params,
+                                          **scan_params))
+    fresh_requests = server.stats()['requests']
+
+    checkpoint_file = tmp_path / 'scan.checkpoint'
+    interrupt(checkpoint_file, scan_params)
+    server.reset_stats()
+    records = list(spy.find_unshared_groups('small',
+                                            checkpoint_file=checkpoint_file,
+                                            **params, **scan_params))
+    assert records == fresh
+    assert server.stats()['requests'] == fresh_requests
+
+
+def test_load_checkpoint_params(tmp_path):
+    checkpoint_file = tmp_path / 'scan.checkpoint'
+    params = dict(exact_counts=True, strategy='groups')
+    spy.save_checkpoint(checkpoint_file, 1, 0, [10, 20], [dict(gid=20)],
+                        params, {10: 3, 20: 0})
+    assert spy.load_checkpoint(checkpoint_file, 1, 0, params) \
+           == ([10, 20], [dict(gid=20)], {10: 3, 20: 0})
+    empty = ([], [], {})
+    assert spy.load_checkpoint(checkpoint_file, 1, 0,
+                               dict(params, exact_counts=False)) == empty
+    assert spy.load_checkpoint(checkpoint_file, 1, 1, params) == empty
+    assert spy.load_checkpoint(checkpoint_file, 2, 0, params) == empty
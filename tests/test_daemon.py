@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Тесты сервиса поиска особых групп модуля daemon"""
+
+import json
+
+import pytest
+
+from unshared_vk.daemon import DaemonServer, ScanDaemon
+
+
+@pytest.fixture
+def daemon(server):
+    daemon = ScanDaemon(workers=1, request_rate=0)
+    yield daemon
+    daemon.stop()
+
+
+def test_jobs(daemon, expected_special):
+    low = daemon.submit('small', members_threshold=1)
+    high = daemon.submit('many_groups', priority=5, thresholds=[0, 2],
+                         members_threshold=7, strategy='friends')
+    daemon.start()
+    assert daemon.wait(low.id, timeout=60)
+    assert daemon.wait(high.id, timeout=60)
+
+    # Задание с большим приоритетом выполняется первым
+    assert high.started < low.started
+
+    status = daemon.job_status(low.id, result=True)
+    assert status['status'] == 'done'
+    assert {record['gid'] for record in status['result']} \
+           == expected_special('small', 1)
+
+    result = daemon.job_status(high.id, result=True)['result']
+    for threshold, records in result['thresholds'].items():
+        assert {record['gid'] for record in records} \
+               == expected_special('many_groups', threshold)
+
+    stats = daemon.stats()
+    assert stats['jobs'] == dict(done=2)
+    assert stats['requests']['total']['requests'] > 0
+
+
+@pytest.mark.parametrize('params', [
+        dict(workers='2'), dict(workers=0), dict(members_threshold=True),
+        dict(thresholds=[]), dict(batch='yes'), dict(strategy='fast'),
+        dict(deadline=-1), dict(token='secret')])
+def test_invalid_params(daemon, params):
+    with pytest.raises(ValueError):
+        daemon.submit('small', **params)
+    assert daemon.jobs() == []
+
+
+def test_cancel(daemon):
+    job = daemon.submit('small')
+    assert daemon.cancel(job.id)
+    assert daemon.job_status(job.id)['status'] == 'cancelled'
+    assert not daemon.cancel(job.id)
+
+
+def test_http_handle(daemon):
+    http = DaemonServer(daemon, port=0)
+    try:
+        code, body = http.handle('POST', '/jobs', json.dumps(dict(
+                jobs=[dict(user_id='small'),
+                      dict(user_id='small', params=dict(workers='2'))])))
+        assert code == 400
+        # При ошибке в одном задании не ставится ни одно
+        assert daemon.jobs() == []
+
+        code, body = http.handle('POST', '/jobs', json.dumps(dict(
+                jobs=[dict(user_id='small'),
+                      dict(user_id='many_groups', priority=1,
+                           params=dict(strategy='friends'))])))
+        assert code == 202
+        job_ids = [job['id'] for job in body['jobs']]
+        code, body = http.handle('GET', '/jobs?status=queued', b'')
+        assert [job['id'] for job in body['jobs']] == job_ids
+
+        daemon.start()
+        assert all(daemon.wait(job_id, timeout=60) for job_id in job_ids)
+        code, body = http.handle('GET', f'/jobs/{job_ids[0]}/result', b'')
+        assert code == 200 and body['status'] == 'done'
+        assert http.handle('GET', '/jobs/unknown', b'')[0] == 404
+        code, body = http.handle('GET', '/metrics', b'')
+        assert '_request_seconds_bucket' in body
+    finally:
+        http.close()
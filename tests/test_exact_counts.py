@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Тесты прекращения проверки группы после превышения порога и точного
+подсчета друзей (exact_counts)"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_exact_counts(server, friend_counts, batch):
+    verdicts = list(spy.iter_unshared_groups('many_friends', batch=batch,
+                                             strategy='groups',
+                                             exact_counts=True,
+                                             request_rate=0))
+    assert all(verdict['exact'] for verdict in verdicts)
+    assert {verdict['gid']: verdict['friends_in_group']
+            for verdict in verdicts} == friend_counts('many_friends')
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_early_exit(server, friend_counts, batch):
+    counts = friend_counts('many_friends')
+    verdicts = list(spy.iter_unshared_groups('many_friends', batch=batch,
+                                             strategy='groups',
+                                             members_threshold=1,
+                                             request_rate=0))
+    for verdict in verdicts:
+        count = counts[verdict['gid']]
+        assert verdict['special'] == (count <= 1)
+        if verdict['exact']:
+            assert verdict['friends_in_group'] == count
+        else:
+            # Нижняя оценка, уже превысившая порог
+            assert 1 < verdict['friends_in_group'] <= count
+    # Для особых групп число друзей всегда точное
+    assert all(verdict['exact'] for verdict in verdicts
+               if verdict['special'])
+
+
+def test_early_exit_saves_calls(server):
+    api_calls = {}
+    for exact_counts in (False, True):
+        server.reset_stats()
+        list(spy.iter_unshared_groups('many_friends', strategy='groups',
+                                      members_threshold=0,
+                                      exact_counts=exact_counts,
+                                      request_rate=0))
+        api_calls[exact_counts] = server.stats()['api_calls']
+    # Обращений к groups.isMember меньше, когда проверка групп с друзьями
+    # прекращается после первых найденных
+    assert api_calls[False] < api_calls[True]
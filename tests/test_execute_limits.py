@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Тесты выбора размеров частей запросов и деления запросов execute при
+превышении ограничений"""
+
+import pytest
+
+from unshared_vk import spy
+from unshared_vk.fakevk import FakeVKServer
+
+
+@pytest.mark.parametrize('friends_count', [0, 1, 40, 499, 500, 501, 1500,
+                                           12500, 20000])
+def test_member_step(friends_count):
+    step = spy.member_step(friends_count)
+    assert 1 <= step <= spy.MAX_FRIEND_IS_MEMBER_STEP
+    slices = -(-friends_count // step)
+    # Проверка группы укладывается в ограничение обращений к API, если
+    # это позволяет максимальный шаг, а срезы почти равны
+    if friends_count <= spy.MAX_EXECUTE_CALLS \
+                        * spy.MAX_FRIEND_IS_MEMBER_STEP:
+        assert slices <= spy.MAX_EXECUTE_CALLS
+    if slices:
+        assert slices * step - friends_count < slices
+
+
+@pytest.mark.parametrize('friends_count', [1, 40, 1500, 12500])
+def test_groups_per_execute(friends_count):
+    step = spy.member_step(friends_count)
+    groups = spy.groups_per_execute(friends_count,
+                                    friend_is_member_step=step)
+    assert groups >= 1
+    assert groups * -(-friends_count // step) <= spy.MAX_EXECUTE_CALLS
+
+
+def test_execute_limit_split(world, scan_params, server, expected_special):
+    # Скрипты проверки групп не укладываются в ограничение обращений к
+    # API на сервере, запросы делятся на части
+    metrics = spy.get_step_metrics()
+    metrics.reset()
+    with FakeVKServer(world, rate=None, max_calls=4) as limited:
+        spy.set_api_url(limited.url)
+        try:
+            records = list(spy.find_unshared_groups(
+                                'small', strategy='groups', batch=True,
+                                stream=True, **scan_params))
+        finally:
+            spy.set_api_url(server.url)
+        assert limited.stats()['errors'].get(13)
+    assert metrics.stats()['splits'] > 0
+    assert {record['gid'] for record in records} == expected_special('small')
+
+
+def test_execute_limit_error():
+    message = 'Runtime error occurred during code invocation: '
+    assert spy.is_execute_limit_error(
+                dict(error_code=13, error_msg=message + 'Too many API calls'))
+    # Измененный текст сообщения о превышении не мешает делить запрос
+    assert spy.is_execute_limit_error(
+                dict(error_code=13, error_msg=message + 'Limit exceeded'))
+    assert not spy.is_execute_limit_error(
+                dict(error_code=13, error_msg=message + 'x is not defined'))
+    assert not spy.is_execute_limit_error(
+                dict(error_code=10, error_msg='Too many API calls'))
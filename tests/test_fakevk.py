@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Тесты интерпретатора VKScript и сервера модуля fakevk"""
+
+import pytest
+import requests
+
+from unshared_vk import spy
+from unshared_vk.fakevk import FakeVKServer, VKScriptError, run_vkscript
+
+
+def no_api(method, params):
+    raise AssertionError(f'Неожиданное обращение к API: {method}')
+
+
+def test_expressions():
+    code = '''
+        var items = [1, 2, 3];
+        var total = 0;
+        var i = 0;
+        while (i < items.length) {
+            total = total + items[i];
+            i = i + 1;
+        }
+        if (total > 5 && !(total == 7)) {
+            items.push(total);
+        }
+        return {"total": total, "items": items.slice(1),
+                "parts": "a,b".split(","), "number": parseInt("42")};
+    '''
+    result, errors = run_vkscript(code, no_api)
+    assert result == dict(total=6, items=[2, 3, 6], parts=['a', 'b'],
+                          number=42)
+    assert errors == []
+
+
+def test_args_and_api_calls():
+    calls = []
+
+    def api(method, params):
+        calls.append((method, params))
+        return [dict(id=1, name='a'), dict(id=2, name='b')]
+
+    result, errors = run_vkscript(
+            'return API.groups.getById({"group_ids": Args.ids})@.name;',
+            api, args=dict(ids='1,2'))
+    assert result == ['a', 'b']
+    assert calls == [('groups.getById', dict(group_ids='1,2'))]
+
+
+def test_call_limit():
+    counters = {}
+    with pytest.raises(VKScriptError) as info:
+        run_vkscript('var i = 0; while (i < 30) { API.users.get({}); '
+                     'i = i + 1; } return i;',
+                     lambda method, params: [], counters=counters)
+    assert info.value.error_code == 13
+    assert counters['calls'] == 25
+
+
+def test_script_errors():
+    with pytest.raises(VKScriptError) as info:
+        run_vkscript('return unknown_name;', no_api)
+    assert info.value.error_code == 13
+    with pytest.raises(VKScriptError) as info:
+        run_vkscript('return (1;', no_api)
+    assert info.value.error_code == 12
+
+
+def test_server_limits(world):
+    with FakeVKServer(world, rate=None, max_calls=2) as server:
+        response = requests.post(server.url, data=dict(
+                code='API.users.get({}); API.users.get({}); '
+                     'API.users.get({}); return 1;',
+                access_token='token', v=spy.API_VERSION)).json()
+        assert response['error']['error_code'] == 13
+        assert server.stats()['errors'] == {13: 1}
+
+
+def test_spy_scripts(world, server):
+    # Минифицированные скрипты spy выполняются интерпретатором сервера
+    user_info = spy.load_user_info('small', request_rate=0)
+    user = world.resolve('small')
+    assert list(user_info['friends']['items']) == world.user_friends(user)
+    assert sorted(user_info['groups']['items']) \
+           == sorted(world.user_groups(user))
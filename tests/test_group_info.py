@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Тесты запроса данных о группах пачками и только для особых групп"""
+
+from unshared_vk import spy
+
+
+def verdicts(specials, produced):
+    """Записи о результатах проверки групп 1, 2, … Номера выданных
+    записей добавляются в produced"""
+    for gid, special in enumerate(specials, 1):
+        produced.append(gid)
+        yield spy.group_verdict(gid, dict(special_group=special,
+                                          friends_in_group=int(special)))
+
+
+def cache_with_groups(world, groups):
+    cache = spy.ScanCache()
+    for group in groups:
+        cache.set_group(world.group_info(group))
+    return cache
+
+
+def test_fill_groups_info_holds_records(world):
+    specials = [False, True, False, True, False]
+    produced = []
+    records = spy._fill_groups_info(verdicts(specials, produced),
+                                    cache_with_groups(world, range(1, 6)))
+    # Записи до первой особой группы выдаются сразу
+    assert next(records)['gid'] == 1
+    assert produced == [1]
+    # Остальные ждут заполнения пачки или окончания проверки
+    second = next(records)
+    assert produced == [1, 2, 3, 4, 5]
+    assert second['name'] == world.group_info(2)['name']
+    rest = list(records)
+    assert [record['gid'] for record in rest] == [3, 4, 5]
+    assert [record['name'] is not None for record in rest] \
+           == [False, True, False]
+
+
+def test_fill_groups_info_hold(world):
+    produced = []
+    records = spy._fill_groups_info(verdicts([True, True, True], produced),
+                                    cache_with_groups(world, range(1, 4)),
+                                    hold=0)
+    # При hold=0 записи выдаются по мере проверки
+    assert next(records)['gid'] == 1
+    assert produced == [1]
+    assert [record['gid'] for record in records] == [2, 3]
+
+
+def test_early_stop_yields_group_info(server, scan_params, monkeypatch):
+    # Все группы особые: данные о них не должны ждать проверки всех групп
+    monkeypatch.setattr(spy, 'GROUP_INFO_HOLD', 0)
+    server.reset_stats()
+    records = spy.find_unshared_groups('many_groups', strategy='groups',
+                                       members_threshold=1000, stream=True,
+                                       workers=1, **scan_params)
+    first = next(records)
+    records.close()
+    assert first['name'] is not None
+    assert server.stats()['requests'] < 10
+
+
+def test_group_info_only_for_special(world, server):
+    cache = spy.ScanCache()
+    verdicts = list(spy.iter_unshared_groups('small', strategy='groups',
+                                             batch=True, cache=cache,
+                                             members_threshold=1,
+                                             request_rate=0))
+    special = {verdict['gid'] for verdict in verdicts if verdict['special']}
+    assert special and set(cache.groups) == special
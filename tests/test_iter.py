@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Тесты генератора результатов проверки групп iter_unshared_groups"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+def test_verdicts(world, server, friend_counts):
+    verdicts = list(spy.iter_unshared_groups('small', members_threshold=1,
+                                             strategy='groups',
+                                             request_rate=0))
+    # По одной записи на каждую группу в порядке групп пользователя
+    assert [verdict['gid'] for verdict in verdicts] \
+           == world.user_groups(world.resolve('small'))
+    counts = friend_counts('small')
+    for verdict in verdicts:
+        assert verdict['special'] == (counts[verdict['gid']] <= 1)
+        assert (verdict['name'] is not None) == verdict['special']
+
+
+def test_lazy(server):
+    server.reset_stats()
+    verdicts = spy.iter_unshared_groups('many_groups', strategy='groups',
+                                        workers=1, group_info_hold=0,
+                                        request_rate=0)
+    # Пока перебор не начат, запросы не выполняются
+    assert server.stats()['requests'] == 0
+    next(verdicts)
+    verdicts.close()
+    # Без пакетной проверки каждая группа проверяется своим запросом:
+    # после закрытия генератора остальные группы не запрашиваются
+    assert 0 < server.stats()['requests'] < 10
+
+
+def test_deactivated_user(server, scan_params):
+    with pytest.raises(ValueError):
+        list(spy.iter_unshared_groups('deleted', request_rate=0))
+    assert list(spy.iter_unshared_groups('deleted', raise_nouser=False,
+                                         request_rate=0)) == []
+    assert list(spy.find_unshared_groups('deleted', raise_nouser=False,
+                                         stream=True, **scan_params)) == []
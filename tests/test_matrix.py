@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Тесты матрицы членства модуля matrix"""
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from unshared_vk import spy
+from unshared_vk.matrix import MembershipMatrix
+
+
+def test_counts():
+    matrix = MembershipMatrix.from_friend_groups({1: [10, 20], 2: [20],
+                                                  3: [20, 30, 30]})
+    assert matrix.shape == (3, 3)
+    assert matrix.nnz == 5
+    assert matrix.counts() == {10: 1, 20: 3, 30: 1}
+    assert matrix.counts(friends=[1, 2], groups=[20, 30, 40]) \
+           == {20: 2, 30: 0, 40: 0}
+    assert matrix.special_groups(1) == [10, 30]
+    assert matrix.friend_overlap(groups=[20, 30]).tolist() == [1, 1, 2]
+    assert matrix.to_dense().sum() == matrix.nnz
+
+
+def test_unknown_pairs_ignored():
+    matrix = MembershipMatrix([1, 2], [10], [(1, 10), (3, 10), (2, 11),
+                                             (1, 10)])
+    assert matrix.counts() == {10: 1}
+
+
+def test_scan_cache_matches_python_engine(world, server, scan_params):
+    users = ['many_groups', 'small']
+    cache = spy.ScanCache()
+    spy.find_unshared_groups_batch(users, engine='python', cache=cache,
+                                   **scan_params)
+    matrix = MembershipMatrix.from_scan_cache(cache)
+    for screen_name in users:
+        user = world.resolve(screen_name)
+        friends = world.user_friends(user)
+        groups = world.user_groups(user)
+        assert matrix.counts(friends, groups) \
+               == {group: cache.count_members(group, friends)
+                   for group in groups}
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy'])
+def test_engines(server, scan_params, expected_special, engine):
+    records = spy.find_unshared_groups('many_groups', strategy='friends',
+                                       engine=engine, members_threshold=2,
+                                       stream=True, **scan_params)
+    assert {record['gid'] for record in records} \
+           == expected_special('many_groups', 2)
+    result = spy.find_unshared_groups_batch(['small'], engine=engine,
+                                            members_threshold=2,
+                                            **scan_params)
+    assert {record['gid'] for record in result['small']} \
+           == expected_special('small', 2)
+
+
+def test_use_matrix(monkeypatch):
+    assert spy.use_matrix('auto') and spy.use_matrix('numpy')
+    assert not spy.use_matrix('python')
+    with pytest.raises(ValueError):
+        spy.use_matrix('scipy')
+    monkeypatch.setattr(spy, 'numpy', None)
+    assert not spy.use_matrix('auto')
+    with pytest.raises(ImportError):
+        spy.use_matrix('numpy')
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Тесты статистики запросов RequestStats"""
+
+import json
+
+from unshared_vk import spy
+
+
+def record(script='group_check', elapsed=0.2, cached=False,
+           error_codes=()):
+    """Запись о запросе в формате on_request do_execute_request"""
+    return dict(script=script, payload_bytes=100, response_bytes=50,
+                latency=elapsed, elapsed=elapsed,
+                attempts=1 + len(error_codes), retries=len(error_codes),
+                error_code=error_codes[-1] if error_codes else None,
+                error_codes=list(error_codes), rate_wait=0.0,
+                retry_sleep=0.0, cached=cached)
+
+
+def test_stats():
+    forwarded = []
+    stats = spy.RequestStats(forwarded.append)
+    for elapsed in (0.01, 0.2, 0.2, 3.0):
+        stats(record(elapsed=elapsed))
+    stats(record(cached=True))
+    stats(record('user_info', error_codes=(10, 10)))
+    assert len(forwarded) == 6
+
+    result = stats.stats()
+    group_check = result['scripts']['group_check']
+    assert (group_check['requests'], group_check['cached']) == (5, 1)
+    # Ответы из кэша в гистограмму времени не попадают
+    histogram = group_check['histogram']
+    assert histogram['count'] == 4
+    assert histogram['buckets']['0.05'] == 1
+    assert histogram['buckets']['0.25'] == 3
+    assert histogram['buckets']['+Inf'] == 4
+    assert abs(histogram['sum'] - 3.41) < 1e-9
+    assert 0.1 < group_check['quantiles']['0.5'] <= 0.25
+    assert result['total']['requests'] == 6
+    assert result['total']['retries'] == 2
+    assert result['errors'] == {'10': 2}
+    assert json.loads(stats.to_json()) == result
+
+    stats.reset()
+    assert stats.stats() == dict(scripts={}, total={}, errors={})
+
+
+def test_to_prometheus():
+    stats = spy.RequestStats()
+    stats(record(elapsed=0.3))
+    stats(record('user_info', error_codes=('ReadTimeout',)))
+    text = stats.to_prometheus(prefix='vk')
+    lines = text.splitlines()
+    assert 'vk_requests_total{script="group_check"} 1' in lines
+    assert 'vk_request_seconds_bucket{script="group_check",le="0.5"} 1' \
+           in lines
+    assert 'vk_request_seconds_bucket{script="group_check",le="0.25"} 0' \
+           in lines
+    assert 'vk_request_seconds_count{script="user_info"} 1' in lines
+    assert 'vk_errors_total{code="ReadTimeout"} 1' in lines
+    assert '# TYPE vk_request_seconds histogram' in lines
+
+
+def test_prometheus_escapes_labels():
+    stats = spy.RequestStats()
+    stats(record('a\\b"c\nd'))
+    lines = stats.to_prometheus().splitlines()
+    assert 'unshared_vk_requests_total{script="a\\\\b\\"c\\nd"} 1' in lines
+    assert 'unshared_vk_request_seconds_count{script="a\\\\b\\"c\\nd"} 1' \
+           in lines
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Тесты политики повторов запросов RetryPolicy"""
+
+import pytest
+import requests
+
+from unshared_vk import spy
+from unshared_vk.fakevk import FakeVKServer
+
+
+def test_backoff():
+    policy = spy.RetryPolicy(5, 0.5, backoff=2, max_delay=3, jitter=0)
+    assert [policy.delay(attempt) for attempt in range(5)] \
+           == [0.5, 1.0, 2.0, 3, 3]
+
+
+def test_jitter():
+    policy = spy.RetryPolicy(5, 1.0, backoff=2, max_delay=30, jitter=0.5)
+    for attempt in range(4):
+        delays = [policy.delay(attempt) for index in range(50)]
+        assert all(2 ** attempt * 0.5 <= delay <= 2 ** attempt
+                   for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_permanent():
+    policy = spy.RetryPolicy()
+    assert policy.is_permanent(dict(error_code=5))
+    assert not policy.is_permanent(dict(error_code=10))
+    assert policy.is_permanent(requests.exceptions.MissingSchema())
+    assert not policy.is_permanent(requests.exceptions.ConnectionError())
+    assert spy.retry_pause(policy, dict(error=dict(error_code=5)), 0) \
+           is None
+    assert spy.retry_pause(policy, dict(error=dict(error_code=10)), 0) > 0
+    # Число попыток исчерпано
+    assert spy.retry_pause(policy, dict(error=dict(error_code=10)),
+                           policy.retries - 1) is None
+    with pytest.raises(spy.ExecuteLimitError):
+        spy.retry_pause(policy, dict(error=dict(
+                error_code=13, error_msg='Too many API calls')), 0)
+
+
+def test_deadline():
+    policy = spy.RetryPolicy(delay=10, jitter=0)
+    assert policy.remaining() is None
+    assert policy.with_deadline(None) is policy
+    limited = policy.with_deadline(5)
+    assert limited is not policy and policy.deadline_at is None
+    assert 0 < limited.remaining() <= 5
+    limited.check_deadline(1)
+    # Пауза перед повтором не укладывается в оставшееся время
+    with pytest.raises(spy.RetryDeadlineError):
+        spy.retry_pause(limited, dict(error=dict(error_code=10)), 0)
+    with pytest.raises(spy.RetryDeadlineError):
+        spy.RetryPolicy(deadline=1e-9).check_deadline()
+
+
+def test_retry_failures(world, server, scan_params, expected_special):
+    # Ответы с ошибками ВК и сбои HTTP повторяются
+    with FakeVKServer(world, rate=None, error_rate=0.2, drop_rate=0.1,
+                      seed=3) as failing:
+        spy.set_api_url(failing.url)
+        stats = spy.RequestStats()
+        try:
+            records = list(spy.find_unshared_groups(
+                    'small', strategy='groups', stream=True,
+                    retry_policy=spy.RetryPolicy(20, 0.001),
+                    on_request=stats, **scan_params))
+        finally:
+            spy.set_api_url(server.url)
+    assert stats.stats()['total']['retries'] > 0
+    assert {record['gid'] for record in records} == expected_special('small')
+
+
+def test_permanent_not_retried(world, server):
+    with FakeVKServer(world, rate=None, tokens=['valid']) as restricted:
+        spy.set_api_url(restricted.url)
+        try:
+            with pytest.raises(spy.VKRequestError) as error:
+                spy.do_execute_request('return 1;', token='invalid',
+                                       request_rate=0,
+                                       retry_policy=spy.RetryPolicy(5, 0))
+        finally:
+            spy.set_api_url(server.url)
+        assert restricted.stats()['requests'] == 1
+    assert error.value.error_code == 5
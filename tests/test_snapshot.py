@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Тесты инкрементального повторного поиска по снимку результатов"""
+
+import json
+
+from unshared_vk import spy
+
+
+def test_snapshot_and_rescan(tmp_path, server, scan_params, friend_counts,
+                             expected_special):
+    snapshot_file = tmp_path / 'small.snapshot'
+    params = dict(members_threshold=1, snapshot_file=snapshot_file,
+                  stream=True, **scan_params)
+    first = list(spy.find_unshared_groups('small', **params))
+    with open(snapshot_file, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert {int(group): count for group, count
+            in snapshot['counts'].items()} == friend_counts('small')
+
+    # Без изменений повторный поиск не проверяет членство друзей
+    server.reset_stats()
+    again = list(spy.find_unshared_groups('small', **params))
+    assert again == first
+    assert {record['gid'] for record in again} \
+           == expected_special('small', 1)
+    assert server.stats()['requests'] <= 2
+
+
+def test_removed_friend_left_group(world, server, friend_counts):
+    # Удаленный друг состоял в группе на момент снимка, а затем вышел из
+    # нее: число друзей в группе все равно должно уменьшиться
+    user = world.resolve('small')
+    user_info = spy.load_user_info('small', request_rate=0)
+    counts = friend_counts('small')
+    group = world.user_groups(user)[0]
+    friends = set(world.user_friends(user))
+    removed = next(other for other in range(1, world.user_count)
+                   if other != user and other not in friends
+                   and not world.is_member(group, other))
+    snapshot = dict(friends=world.user_friends(user) + [removed],
+                    counts=dict(counts))
+    snapshot['counts'][group] += 1
+    verdicts = spy.iter_rescan_groups(user_info, snapshot,
+                                      members_threshold=1, request_rate=0)
+    assert {verdict['gid']: verdict['friends_in_group']
+            for verdict in verdicts} == counts
+
+
+def test_added_friend(world, server, friend_counts):
+    user = world.resolve('small')
+    user_info = spy.load_user_info('small', request_rate=0)
+    counts = friend_counts('small')
+    added = world.user_friends(user)[0]
+    snapshot = dict(friends=world.user_friends(user)[1:],
+                    counts={group: count - world.is_member(group, added)
+                            for group, count in counts.items()})
+    verdicts = list(spy.iter_rescan_groups(user_info, snapshot,
+                                           members_threshold=1,
+                                           request_rate=0))
+    assert {verdict['gid']: verdict['friends_in_group']
+            for verdict in verdicts} == counts
+
+
+def test_snapshot_after_resume(tmp_path, server, scan_params, friend_counts):
+    snapshot_file = tmp_path / 'small.snapshot'
+    checkpoint_file = tmp_path / 'small.checkpoint'
+    params = dict(members_threshold=1, strategy='groups',
+                  snapshot_file=snapshot_file,
+                  checkpoint_file=checkpoint_file, checkpoint_every=5,
+                  stream=True, **scan_params)
+    records = spy.find_unshared_groups('small', **params)
+    next(records)
+    records.close()
+    assert checkpoint_file.exists()
+    assert not snapshot_file.exists()
+
+    list(spy.find_unshared_groups('small', **params))
+    # Снимок содержит и группы, проверенные до прерывания
+    with open(snapshot_file, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert {int(group): count for group, count
+            in snapshot['counts'].items()} == friend_counts('small')
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Тесты стратегий поиска особых групп и выбора стратегии по оценке
+числа запросов"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+# Стратегия 'groups' проверяется в test_batch_mode
+@pytest.mark.parametrize('strategy', ['friends', 'auto'])
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('screen_name', ['many_groups', 'small'])
+def test_strategies(world, server, scan_params, expected_special, strategy,
+                    batch, screen_name):
+    records = list(spy.find_unshared_groups(screen_name, members_threshold=1,
+                                            strategy=strategy, batch=batch,
+                                            stream=True, **scan_params))
+    assert {record['gid'] for record in records} \
+           == expected_special(screen_name, 1)
+    for record in records:
+        group_info = world.group_info(record['gid'])
+        assert record['name'] == group_info['name']
+        assert record['members_count'] == group_info['members_count']
+
+
+@pytest.mark.parametrize('strategy', ['groups', 'friends'])
+def test_many_friends(server, scan_params, expected_special, strategy):
+    # Друзей больше, чем проверяется одним обращением к groups.isMember
+    records = spy.find_unshared_groups('many_friends', strategy=strategy,
+                                       stream=True, **scan_params)
+    assert {record['gid'] for record in records} \
+           == expected_special('many_friends')
+
+
+def test_friends_exact_counts(server, friend_counts):
+    verdicts = list(spy.iter_unshared_groups('many_groups',
+                                             strategy='friends',
+                                             request_rate=0))
+    assert {verdict['gid']: verdict['friends_in_group']
+            for verdict in verdicts} == friend_counts('many_groups')
+
+
+def test_default_strategy_streams(server):
+    # По умолчанию группы проверяются по мере перебора даже у
+    # пользователя, для которого дешевле стратегия 'friends'
+    assert spy.STRATEGY == 'groups'
+    assert spy.plan_strategy(300, 120)['strategy'] == 'friends'
+    server.reset_stats()
+    verdicts = spy.iter_unshared_groups('many_groups', workers=1,
+                                        group_info_hold=0, request_rate=0)
+    next(verdicts)
+    verdicts.close()
+    assert server.stats()['requests'] < 10
+
+
+def test_unknown_strategy(server):
+    with pytest.raises(ValueError):
+        list(spy.iter_unshared_groups('small', strategy='members',
+                                      request_rate=0))
+
+
+@pytest.mark.parametrize('groups_count, friends_count, batch', [
+        (900, 120, True), (300, 120, False),
+        (15, 3000, False), (12, 1500, True)])
+def test_plan_strategy(groups_count, friends_count, batch):
+    plan = spy.plan_strategy(groups_count, friends_count, batch=batch)
+    cheapest = min(('groups', 'friends'),
+                   key=lambda name: (plan[name]['requests'],
+                                     plan[name]['api_calls']))
+    assert plan['strategy'] == cheapest
+    assert all(plan[name]['requests'] >= 1
+               for name in ('groups', 'friends'))
+
+
+def test_plan_strategy_prefers_groups_for_many_friends():
+    assert spy.plan_strategy(12, 1500)['strategy'] == 'groups'
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Тесты выдачи особых групп по мере нахождения: NDJSON файл, функция
+sink и генератор"""
+
+import json
+
+from unshared_vk import spy
+
+
+def test_ndjson_and_sink(tmp_path, server, scan_params, expected_special):
+    ndjson_file = tmp_path / 'groups.ndjson'
+    json_file = tmp_path / 'groups.json'
+    found = []
+    result = spy.find_unshared_groups('small', members_threshold=1,
+                                      ndjson_file=ndjson_file,
+                                      sink=found.append,
+                                      **dict(scan_params,
+                                             json_file=json_file))
+    with open(ndjson_file, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    with open(json_file, encoding='utf-8') as f:
+        saved = json.load(f)
+    assert lines == found == saved == json.loads(result)
+    assert {record['gid'] for record in found} \
+           == expected_special('small', 1)
+
+
+def test_ndjson_appends(tmp_path, server, scan_params):
+    ndjson_file = tmp_path / 'groups.ndjson'
+    for attempt in range(2):
+        spy.find_unshared_groups('small', members_threshold=1,
+                                 ndjson_file=ndjson_file, **scan_params)
+    with open(ndjson_file, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines and len(lines) % 2 == 0
+    assert lines[:len(lines) // 2] == lines[len(lines) // 2:]
+
+
+def test_sink_called_during_scan(server, scan_params):
+    # Запись передается в sink до того, как генератор выдаст следующую
+    found = []
+    records = spy.find_unshared_groups('small', members_threshold=1,
+                                       sink=found.append, stream=True,
+                                       **scan_params)
+    for index, record in enumerate(records):
+        assert found[index] == record
+        assert len(found) == index + 1
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Тесты поиска особых групп сразу для нескольких порогов"""
+
+import json
+from collections import Counter
+
+import pytest
+
+from unshared_vk import spy
+
+
+def test_thresholds(tmp_path, server, scan_params, friend_counts,
+                    expected_special):
+    json_file = tmp_path / 'thresholds.json'
+    result, stats = spy.find_unshared_groups_thresholds(
+                        'many_friends', [5, 0, 1, 1], members_threshold=3,
+                        exact_counts=False, return_stats=True,
+                        **dict(scan_params, json_file=json_file))
+    # Пороги упорядочены, повторы убраны, members_threshold и
+    # exact_counts игнорируются
+    assert list(result['thresholds']) == [0, 1, 5]
+    for threshold, records in result['thresholds'].items():
+        assert {record['gid'] for record in records} \
+               == expected_special('many_friends', threshold)
+        assert all(record['name'] is not None for record in records)
+    assert result['histogram'] \
+           == dict(sorted(Counter(friend_counts('many_friends')
+                                  .values()).items()))
+    assert stats.stats()['total']['requests'] > 0
+    with open(json_file, encoding='utf-8') as f:
+        saved = json.load(f)
+    assert saved['thresholds'] == {str(threshold): records
+                                   for threshold, records
+                                   in result['thresholds'].items()}
+
+
+def test_split_by_thresholds():
+    verdicts = [dict(gid=gid, name=f'Группа {gid}', members_count=10,
+                     friends_in_group=count)
+                for gid, count in ((1, 0), (2, 3), (3, 1), (4, 0))]
+    result = spy.split_by_thresholds(verdicts, [1, 0])
+    assert {threshold: [record['gid'] for record in records]
+            for threshold, records in result.items()} \
+           == {0: [1, 4], 1: [1, 3, 4]}
+    # Одна и та же запись для всех порогов
+    assert result[0][0] is result[1][0]
+    assert spy.friends_histogram(verdicts) == {0: 2, 1: 1, 3: 1}
+
+
+def test_no_thresholds(scan_params):
+    with pytest.raises(ValueError):
+        spy.find_unshared_groups_thresholds('small', [], **scan_params)
+
+
+def test_reject_unsupported(scan_params):
+    with pytest.raises(ValueError, match='ndjson_file'):
+        spy.find_unshared_groups_thresholds('small', [0],
+                                            ndjson_file='groups.ndjson',
+                                            **scan_params)
+    # Значение None допускается
+    with pytest.raises(ValueError, match='checkpoint_file'):
+        spy.find_unshared_groups_thresholds('small', [0],
+                                            ndjson_file=None,
+                                            checkpoint_file='scan.json',
+                                            **scan_params)
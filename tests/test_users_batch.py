@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Тесты поиска особых групп сразу для многих пользователей"""
+
+import pytest
+
+from unshared_vk import spy
+
+
+def test_find_unshared_groups_batch(world, server, scan_params,
+                                    expected_special):
+    users = ['many_groups', 'small', 'deleted']
+    cache = spy.ScanCache()
+    result = spy.find_unshared_groups_batch(users, members_threshold=1,
+                                            cache=cache, **scan_params)
+    assert list(result) == users
+    for screen_name in ('many_groups', 'small'):
+        assert {record['gid'] for record in result[screen_name]} \
+               == expected_special(screen_name, 1)
+        for record in result[screen_name]:
+            group_info = world.group_info(record['gid'])
+            assert record['name'] == group_info['name']
+    assert result['deleted'] == []
+
+    # Повторный поиск с тем же кэшем не проверяет членство заново
+    server.reset_stats()
+    again = spy.find_unshared_groups_batch(['small'], members_threshold=1,
+                                           cache=cache, **scan_params)
+    assert again['small'] == result['small']
+    assert server.stats()['requests'] == 1
+
+
+@pytest.mark.parametrize('name, value', [
+        ('batch', True), ('strategy', 'friends'), ('exact_counts', True),
+        ('stream', True), ('ndjson_file', 'groups.ndjson'),
+        ('checkpoint_file', 'scan.checkpoint')])
+def test_reject_unsupported(scan_params, name, value):
+    with pytest.raises(ValueError, match=name):
+        spy.find_unshared_groups_batch(['small'], **{name: value},
+                                       **scan_params)
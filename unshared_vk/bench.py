@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Автор: Роман Коптев <forest_software@mail.ru>
+"""Воспроизводимые замеры производительности поиска особых групп на
+локальном сервере fakevk.FakeVKServer.
+
+Для каждой конфигурации (набора параметров find_unshared_groups) поиск
+выполняется для синтетических пользователей заданное число раз, после
+чего выводятся:
+
+    scans/min   - число поисков в минуту
+    req/scan    - число запросов execute на один поиск
+    calls/scan  - число обращений к API внутри execute на один поиск
+    ops/call    - число операций VKScript на одно обращение к API
+    KB/scan     - объем отправленного кода VKScript на один поиск, КБ
+    errors      - число ответов с ошибками
+    scan p50/p99 - медиана и 99-й процентиль времени одного поиска, с
+    req p50/p99  - медиана и 99-й процентиль времени обработки запроса
+                   сервером (вместе с задержкой latency), мс
+
+Мир FakeWorld и задержки сервера строятся от одного seed, поэтому
+повторный запуск с теми же параметрами дает сравнимые результаты.
+
+Конфигурации legacy_count и legacy_count_batch выполняют поиск с прежним
+выражением подсчета друзей в группе в скриптах проверки групп
+(LEGACY_COUNT_EXPRESSION) для сравнения с текущим (COUNT_EXPRESSION,
+конфигурации sequential и batch).
+
+Пример запуска из командной строки:
+
+    python -m unshared_vk.bench --friends 1000 --groups 100 --repeat 3
+    python -m unshared_vk.bench --configs sequential batch --rate 0
+
+Из программы:
+
+    from unshared_vk.bench import run_benchmark, print_report
+    print_report(run_benchmark(['sequential', 'batch'], friends=1000))
+
+"""
+
+__all__ = [
+    'CONFIGS',
+    'run_benchmark',
+    'print_report',
+    'legacy_count'
+]
+
+import argparse
+import asyncio
+from contextlib import contextmanager, nullcontext
+import json
+import sys
+from time import monotonic
+
+from unshared_vk import spy
+from unshared_vk.fakevk import FakeVKServer, FakeWorld
+
+###################################
+# Константы
+###################################
+
+CONFIGS = {                  # Конфигурации замеров: параметры
+    'sequential': dict(strategy='groups'), # find_unshared_groups
+    'legacy_count': dict(strategy='groups', legacy_count=True),
+    'legacy_count_batch': dict(batch=True, strategy='groups',
+                               legacy_count=True),
+    'batch': dict(batch=True, strategy='groups'),
+    'exact': dict(exact_counts=True, strategy='groups'),
+    'workers': dict(workers=4, strategy='groups'),
+    'batch_workers': dict(batch=True, workers=4, strategy='groups'),
+    'friends': dict(strategy='friends'),
+    'auto': dict(batch=True, strategy='auto'),
+    'async': dict(concurrency=4)  # async_find_unshared_groups
+    }
+
+ASYNC_CONFIGS = {'async'}  # Конфигурации для async_find_unshared_groups
+
+COUNT_EXPRESSION = '(member_flags+"").split(1).length-1' # Подсчет друзей в
+                                                         # группе в скриптах
+                                                         # проверки групп
+LEGACY_COUNT_EXPRESSION = \
+    '((member_flags+"").split(0)+"").split(1).length-1' # Прежний подсчет
+                                                        # (legacy_count)
+
+FRIENDS = 500   # Число друзей синтетического пользователя
+GROUPS = 60     # Число групп синтетического пользователя
+USERS = 1       # Число синтетических пользователей
+REPEAT = 1      # Сколько раз выполнять поиск для каждого пользователя
+LATENCY = 0.05  # Задержка ответа сервера в секундах
+JITTER = 0.02   # Случайная добавка к задержке
+TOKENS = 4      # Число ключей доступа
+SEED = 0        # Начальное значение генераторов случайных чисел
+
+###################################
+# Объявления функций
+###################################
+
+def percentile(values, q):
+    """Процентиль q (от 0 до 100) списка values методом ближайшего
+    ранга. Для пустого списка - None"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+@contextmanager
+def legacy_count():
+    """Контекст, в котором скрипты проверки групп spy подсчитывают
+    друзей в группе прежним выражением LEGACY_COUNT_EXPRESSION"""
+    names = ('CHECK_SPECIAL_GROUP_REQUEST_CODE',
+             'CHECK_SPECIAL_GROUPS_BATCH_REQUEST_CODE')
+    templates = {name: getattr(spy, name) for name in names}
+    for name, template in templates.items():
+        if COUNT_EXPRESSION not in template:
+            raise ValueError(f'В {name} нет выражения подсчета друзей')
+        setattr(spy, name, template.replace(COUNT_EXPRESSION,
+                                            LEGACY_COUNT_EXPRESSION))
+    try:
+        yield
+    finally:
+        for name, template in templates.items():
+            setattr(spy, name, template)
+
+
+def run_benchmark(configs=None, *,
+                  friends=FRIENDS,
+                  groups=GROUPS,
+                  users=USERS,
+                  repeat=REPEAT,
+                  latency=LATENCY,
+                  jitter=JITTER,
+                  error_rate=0.0,
+                  drop_rate=0.0,
+                  rate=spy.REQUEST_RATE,
+                  tokens=TOKENS,
+                  members_threshold=spy.MEMBERS_THRESHOLD,
+                  seed=SEED):
+    """Замеры производительности поиска особых групп
+
+    Входные параметры:
+        configs:    список имен конфигураций из CONFIGS или словарь
+                    {имя: параметры find_unshared_groups}. Параметр
+                    legacy_count=True включает прежний подсчет друзей в
+                    группе (см. legacy_count). По умолчанию - все
+                    конфигурации
+        friends:    число друзей синтетического пользователя
+        groups:     число групп синтетического пользователя
+        users:      число синтетических пользователей
+        repeat:     сколько раз выполнять поиск для каждого пользователя
+        latency:    задержка ответа сервера в секундах
+        jitter:     случайная добавка к задержке
+        error_rate: вероятность ответа ошибкой ВК 10
+        drop_rate:  вероятность ответа HTTP 502
+        rate:       ограничение числа запросов в секунду на ключ доступа
+                    (и на сервере, и в поиске). None или 0 - без
+                    ограничения
+        tokens:     число ключей доступа, между которыми распределяются
+                    запросы
+        members_threshold: порог специфичности
+        seed:       начальное значение генераторов случайных чисел
+
+    Выход:
+        Список словарей с результатами по конфигурациям (ключи config,
+        scans, seconds, scans_per_min, requests_per_scan,
+        api_calls_per_scan, operations_per_call, payload_per_scan, errors,
+        scan_p50, scan_p99, request_p50, request_p99; времена в секундах,
+        объем в байтах)
+
+    """
+    if configs is None:
+        configs = CONFIGS
+    if not isinstance(configs, dict):
+        configs = {name: CONFIGS[name] for name in configs}
+
+    world = FakeWorld(seed)
+    screen_names = [f'bench{index}' for index in range(users)]
+    for screen_name in screen_names:
+        world.add_user(screen_name, friends=friends, groups=groups)
+    token_list = [f'token{index}' for index in range(max(1, tokens))]
+
+    results = []
+    with FakeVKServer(world, latency=latency, latency_jitter=jitter,
+                      error_rate=error_rate, drop_rate=drop_rate,
+                      rate=rate, tokens=token_list, seed=seed) as server:
+        spy.set_api_url(server.url)
+        try:
+            for name, params in configs.items():
+                if name in ASYNC_CONFIGS and spy.aiohttp is None:
+                    print(f'{name}: пропущено, нет пакета aiohttp',
+                          file=sys.stderr)
+                    continue
+                server.reset_stats()
+                kwarg = dict(json_file=None,
+                             silent=True,
+                             progress=lambda status: None,
+                             members_threshold=members_threshold,
+                             request_rate=rate,
+                             request_delay=0.1,
+                             tokens=token_list)
+                kwarg.update(params)
+                legacy = kwarg.pop('legacy_count', False)
+                if kwarg.get('workers', 1) > spy.POOL_SIZE:
+                    spy.set_default_session(
+                            spy.make_session(pool_size=kwarg['workers']))
+
+                request_stats = spy.RequestStats()
+                kwarg['on_request'] = request_stats
+                durations = []
+                started = monotonic()
+                with legacy_count() if legacy else nullcontext():
+                    for attempt in range(repeat):
+                        for screen_name in screen_names:
+                            scan_started = monotonic()
+                            if name in ASYNC_CONFIGS:
+                                asyncio.run(spy.async_find_unshared_groups(
+                                                screen_name, **kwarg))
+                            else:
+                                spy.find_unshared_groups(screen_name,
+                                                         **kwarg)
+                            durations.append(monotonic() - scan_started)
+                seconds = monotonic() - started
+
+                stats = server.stats()
+                payload = request_stats.stats()['total']['payload_bytes']
+                scans = len(durations)
+                results.append(dict(
+                        config=name,
+                        scans=scans,
+                        seconds=seconds,
+                        scans_per_min=60 * scans / seconds,
+                        requests_per_scan=stats['requests'] / scans,
+                        api_calls_per_scan=stats['api_calls'] / scans,
+                        operations_per_call=stats['operations']
+                                            / max(1, stats['api_calls']),
+                        payload_per_scan=payload / scans,
+                        errors=sum(stats['errors'].values()),
+                        scan_p50=percentile(durations, 50),
+                        scan_p99=percentile(durations, 99),
+                        request_p50=percentile(stats['latencies'], 50),
+                        request_p99=percentile(stats['latencies'], 99)))
+        finally:
+            spy.set_api_url()
+
+    return results
+
+
+def print_report(results, file=None):
+    """Вывод результатов run_benchmark в виде таблицы"""
+    file = file or sys.stdout
+    print(f'{"config":<20}{"scans/min":>10}{"req/scan":>10}'
+          f'{"calls/scan":>11}{"ops/call":>9}{"KB/scan":>9}{"errors":>8}'
+          f'{"scan p50/p99, с":>18}{"req p50/p99, мс":>18}', file=file)
+    for result in results:
+        scan = f'{result["scan_p50"]:.2f}/{result["scan_p99"]:.2f}'
+        request = f'{result["request_p50"] * 1000:.0f}/' \
+                  f'{result["request_p99"] * 1000:.0f}'
+        print(f'{result["config"]:<20}'
+              f'{result["scans_per_min"]:>10.1f}'
+              f'{result["requests_per_scan"]:>10.1f}'
+              f'{result["api_calls_per_scan"]:>11.1f}'
+              f'{result["operations_per_call"]:>9.0f}'
+              f'{result["payload_per_scan"] / 1024:>9.1f}'
+              f'{result["errors"]:>8}'
+              f'{scan:>18}{request:>18}', file=file)
+
+
+###################################
+# Выполнение из командной строки
+###################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+                description='Замеры производительности поиска особых групп '
+                            'на локальном сервере, заменяющем API ВК',
+                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS),
+                        default=list(CONFIGS), help='конфигурации замеров')
+    parser.add_argument('--friends', type=int, default=FRIENDS,
+                        help='число друзей пользователя')
+    parser.add_argument('--groups', type=int, default=GROUPS,
+                        help='число групп пользователя')
+    parser.add_argument('--users', type=int, default=USERS,
+                        help='число пользователей')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='число повторов поиска')
+    parser.add_argument('--latency', type=float, default=LATENCY,
+                        help='задержка ответа сервера, с')
+    parser.add_argument('--jitter', type=float, default=JITTER,
+                        help='случайная добавка к задержке, с')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='вероятность ошибки ВК 10')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='вероятность ответа HTTP 502')
+    parser.add_argument('--rate', type=float, default=spy.REQUEST_RATE,
+                        help='запросов в секунду на ключ доступа '
+                             '(0 - без ограничения)')
+    parser.add_argument('--tokens', type=int, default=TOKENS,
+                        help='число ключей доступа')
+    parser.add_argument('--members-threshold', type=int,
+                        default=spy.MEMBERS_THRESHOLD,
+                        help='порог специфичности')
+    parser.add_argument('--seed', type=int, default=SEED,
+                        help='начальное значение генераторов случайных '
+                             'чисел')
+    parser.add_argument('--json-file', default=None,
+                        help='сохранить результаты в json файл')
+
+    args = vars(parser.parse_args())
+    json_file = args.pop('json_file')
+    configs = args.pop('configs')
+
+    report = run_benchmark(configs, **args)
+    print_report(report)
+
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
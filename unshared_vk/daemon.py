@@ -0,0 +1,724 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Автор: Роман Коптев <forest_software@mail.ru>
+"""Долго работающий сервис поиска особых групп с очередью заданий.
+
+Каждый запуск spy.py из командной строки заново запускает интерпретатор,
+импортирует модули, открывает соединения с серверами ВК и начинает без
+данных об ограничении частоты запросов. Сервис запускается один раз и
+выполняет задания поиска, сохраняя между ними:
+
+    * сессию requests с пулом открытых соединений (spy.make_session)
+    * ограничители частоты запросов ключей доступа (spy.get_rate_limiter)
+    * кэш данных о группах в памяти (spy.ScanCache) и, если указан,
+      постоянный кэш ответов ВК на диске (spy.ApiCache)
+    * сводную статистику запросов (spy.RequestStats)
+
+Задания принимаются по HTTP на локальном адресе или через Unix сокет и
+выполняются несколькими потоками в порядке приоритета (при равном
+приоритете - в порядке поступления). Тела запросов и ответов - json:
+
+    POST   /jobs             - поставить задание (или список заданий
+                               {"jobs": [...]}) в очередь:
+                               {"user_id": "id1", "priority": 0,
+                                "params": {"members_threshold": 1}}
+    GET    /jobs             - состояния всех заданий (?status=queued -
+                               только с указанным состоянием)
+    GET    /jobs/<id>        - состояние задания
+    GET    /jobs/<id>/result - состояние и результат завершенного задания
+    DELETE /jobs/<id>        - отменить задание, ожидающее в очереди
+    GET    /stats            - статистика сервиса и запросов к ВК
+                               (DELETE /stats - обнулить статистику
+                               запросов)
+    GET    /metrics          - статистика запросов в формате Prometheus
+    GET    /health           - проверка работы сервиса
+
+Допустимые параметры заданий перечислены в JOB_PARAMS. Если указан
+параметр thresholds, поиск выполняется для нескольких порогов сразу
+(spy.find_unshared_groups_thresholds), иначе результат - список особых
+групп в формате spy.find_unshared_groups.
+
+Пример запуска из командной строки:
+
+    python -m unshared_vk.daemon --port 8765 --workers 4 \\
+        --tokens TOKEN1 TOKEN2 --cache-file vk_cache.sqlite
+    python -m unshared_vk.daemon --unix-socket /run/unshared_vk.sock
+
+    curl -d '{"user_id": "a_medvedev_01", "priority": 5}' \\
+        http://127.0.0.1:8765/jobs
+    curl http://127.0.0.1:8765/jobs/<id>/result
+
+Из программы:
+
+    from unshared_vk.daemon import ScanDaemon
+
+    with ScanDaemon(workers=2) as daemon:
+        job = daemon.submit('a_medvedev_01', members_threshold=1)
+        daemon.wait(job.id)
+        print(daemon.job_status(job.id, result=True))
+
+"""
+
+__all__ = [
+    'ScanJob',
+    'ScanDaemon',
+    'DaemonServer',
+    'JOB_PARAMS'
+]
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, time
+from urllib.parse import parse_qs, urlsplit
+
+from unshared_vk import spy
+
+###################################
+# Константы
+###################################
+
+HOST = '127.0.0.1' # Адрес и порт HTTP сервера по умолчанию. Сервис не
+PORT = 8765        # проверяет права доступа, поэтому слушает только
+                   # локальный адрес
+
+WORKERS = 2 # Число одновременно выполняемых заданий
+
+MAX_JOB_WORKERS = 4 # Максимальное значение параметра workers задания
+
+MAX_FINISHED = 10000 # Сколько завершенных заданий хранить вместе с
+                     # результатами. Более старые удаляются
+
+CACHE_TTL = spy.CACHE_TTL['groups_info'] # Через сколько секунд очищать
+                                         # кэш данных о группах в памяти
+CACHE_MAX_GROUPS = 200000 # Очищать кэш в памяти, если в нем больше групп
+
+JOB_PARAMS = ('members_threshold', # Параметры поиска, которые можно
+              'thresholds',        # передавать в заданиях. Остальные
+              'lang',              # (ключи доступа, сессия, кэши,
+              'batch',             # частота запросов) задаются при
+              'exact_counts',      # запуске сервиса
+              'strategy',
+              'engine',
+              'workers',
+              'deadline',
+              'friend_is_member_step')
+
+###################################
+# Объявления классов
+###################################
+
+class ScanJob:
+    """Задание поиска особых групп одного пользователя
+
+    Атрибуты:
+        id:        идентификатор задания (строка)
+        user_id:   идентификатор пользователя ВК
+        priority:  приоритет. Задания с большим приоритетом выполняются
+                   раньше
+        params:    параметры поиска (см. JOB_PARAMS)
+        status:    'queued', 'running', 'done', 'failed' или 'cancelled'
+        progress:  степень завершенности поиска от 0 до 100
+        submitted, started, finished: время постановки в очередь, начала
+                   и окончания выполнения (time.time) или None
+        result:    результат поиска (после успешного выполнения)
+        error:     описание ошибки (после неудачного выполнения)
+
+    """
+
+    def __init__(self, user_id, priority=0, params=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.priority = priority
+        self.params = dict(params or {})
+        self.status = 'queued'
+        self.progress = 0.0
+        self.submitted = time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def set_progress(self, status):
+        """Функция progress для поиска (см. spy.find_unshared_groups)"""
+        self.progress = min(100.0, max(0.0, float(status)))
+
+    def to_dict(self, result=False):
+        """Состояние задания в виде словаря для json. При result=True -
+        вместе с результатом"""
+        state = dict(id=self.id,
+                     user_id=self.user_id,
+                     priority=self.priority,
+                     params=self.params,
+                     status=self.status,
+                     progress=round(self.progress, 1),
+                     submitted=self.submitted,
+                     started=self.started,
+                     finished=self.finished,
+                     error=self.error)
+        if result:
+            state['result'] = self.result
+        return state
+
+
+class ScanDaemon:
+    """Очередь заданий поиска особых групп и потоки, выполняющие их с
+    общими сессией, ограничителями частоты запросов и кэшами.
+
+    Входные параметры:
+        workers:      число одновременно выполняемых заданий
+        token:        ключ доступа API ВК
+        tokens:       список ключей доступа. Если указан, используется
+                      вместо token, запросы распределяются между ключами
+        request_rate: максимальное число запросов в секунду на ключ
+                      доступа (общее для всех заданий)
+        api_cache:    объект spy.ApiCache - постоянный кэш ответов ВК
+        session:      объект requests.Session. По умолчанию создается
+                      сессия с пулом соединений на все потоки заданий
+        max_finished: сколько завершенных заданий хранить
+        cache_ttl:    через сколько секунд очищать кэш данных о группах
+                      в памяти (данные о группах меняются со временем)
+        cache_max_groups: очищать кэш в памяти, если в нем больше групп
+
+    Потоки запускаются методом start и останавливаются методом stop.
+    Объект можно использовать как контекстный менеджер. Потокобезопасен.
+
+    """
+
+    def __init__(self, *, workers=WORKERS,
+                 token=spy.TOKEN,
+                 tokens=None,
+                 request_rate=spy.REQUEST_RATE,
+                 api_cache=None,
+                 session=None,
+                 max_finished=MAX_FINISHED,
+                 cache_ttl=CACHE_TTL,
+                 cache_max_groups=CACHE_MAX_GROUPS):
+        self.workers = workers
+        self.tokens = list(tokens) if tokens else [token]
+        self.request_rate = request_rate
+        self.api_cache = api_cache
+        if session is None:
+            session = spy.make_session(
+                    pool_size=max(spy.POOL_SIZE, workers * MAX_JOB_WORKERS))
+        self.session = session
+        self.max_finished = max_finished
+        self.cache_ttl = cache_ttl
+        self.cache_max_groups = cache_max_groups
+        self.request_stats = spy.RequestStats()
+        self.started = None
+
+        self._cache = spy.ScanCache()
+        self._cache_created = monotonic()
+        self._jobs = {}             # идентификатор задания -> задание
+        self._queue = []            # куча (-приоритет, номер, задание)
+        self._order = itertools.count()
+        self._finished = deque()    # завершенные задания по порядку
+        self._running = 0
+        self._stopping = False
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def start(self):
+        """Запуск потоков, выполняющих задания"""
+        with self._condition:
+            if self._threads:
+                return self
+            self._stopping = False
+            self.started = time()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker,
+                                          name=f'scan-worker-{index}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self, wait=True):
+        """Остановка потоков. Выполняемые задания завершаются (при
+        wait=True - с ожиданием), задания в очереди остаются
+        невыполненными"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            threads, self._threads = self._threads, []
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, user_id, *, priority=0, **params):
+        """Постановка задания в очередь
+
+        Входные параметры:
+            user_id:  идентификатор пользователя ВК
+            priority: приоритет задания (целое число, больше - раньше)
+            params:   параметры поиска из JOB_PARAMS
+
+        Выход:
+            Объект ScanJob
+
+        Если параметры недопустимы, генерируется исключительная ситуация
+        ValueError.
+
+        """
+        return self.submit_many([dict(user_id=user_id, priority=priority,
+                                      params=params)])[0]
+
+    def submit_many(self, specs):
+        """Постановка в очередь нескольких заданий сразу. Сначала
+        проверяются все задания, затем они ставятся в очередь вместе:
+        если хотя бы одно задание недопустимо, генерируется
+        исключительная ситуация ValueError и в очередь не ставится ни
+        одно
+
+        Входные параметры:
+            specs: список словарей с ключами user_id, priority
+                   (необязательно, по умолчанию 0) и params
+                   (необязательно), как у submit
+
+        Выход:
+            Список объектов ScanJob в порядке specs
+
+        """
+        jobs = []
+        for spec in specs:
+            user_id = spec.get('user_id')
+            priority = spec.get('priority', 0)
+            params = spec.get('params', {})
+            if not isinstance(user_id, (str, int)) \
+               or isinstance(user_id, bool) or not str(user_id).strip():
+                raise ValueError('Не указан идентификатор пользователя')
+            if not isinstance(priority, int) or isinstance(priority, bool):
+                raise ValueError('Приоритет должен быть целым числом')
+            if not isinstance(params, dict):
+                raise ValueError('Параметры задания должны быть словарем')
+            self._check_params(params)
+            jobs.append(ScanJob(user_id, priority, params))
+
+        with self._condition:
+            for job in jobs:
+                self._jobs[job.id] = job
+                heapq.heappush(self._queue,
+                               (-job.priority, next(self._order), job))
+            self._condition.notify(len(jobs))
+        return jobs
+
+    @staticmethod
+    def _check_params(params):
+        """Проверка имен, типов и значений параметров поиска params (см.
+        JOB_PARAMS). Если параметр недопустим, генерируется
+        исключительная ситуация ValueError"""
+        unknown = sorted(set(params).difference(JOB_PARAMS))
+        if unknown:
+            raise ValueError(f'Недопустимые параметры задания: '
+                             f'{", ".join(unknown)}')
+
+        def is_int(value, low, high=None):
+            return isinstance(value, int) and not isinstance(value, bool) \
+                   and low <= value and (high is None or value <= high)
+
+        for name, value in params.items():
+            if name == 'members_threshold':
+                valid = is_int(value, 0)
+                text = 'целым числом не меньше 0'
+            elif name == 'thresholds':
+                valid = isinstance(value, list) and value \
+                        and all(is_int(item, 0) for item in value)
+                text = 'непустым списком целых чисел не меньше 0'
+            elif name == 'lang':
+                valid = isinstance(value, str) and value.strip()
+                text = 'непустой строкой'
+            elif name in ('batch', 'exact_counts'):
+                valid = isinstance(value, bool)
+                text = 'логическим значением'
+            elif name == 'strategy':
+                valid = value in ('groups', 'friends', 'auto')
+                text = "одним из 'groups', 'friends', 'auto'"
+            elif name == 'engine':
+                valid = value in ('python', 'numpy', 'auto')
+                text = "одним из 'python', 'numpy', 'auto'"
+            elif name == 'workers':
+                valid = is_int(value, 1, MAX_JOB_WORKERS)
+                text = f'целым числом от 1 до {MAX_JOB_WORKERS}'
+            elif name == 'deadline':
+                valid = value is None \
+                        or isinstance(value, (int, float)) \
+                           and not isinstance(value, bool) and value > 0
+                text = 'положительным числом или null'
+            else: # friend_is_member_step
+                valid = is_int(value, 1, spy.MAX_FRIEND_IS_MEMBER_STEP)
+                text = (f'целым числом от 1 до '
+                        f'{spy.MAX_FRIEND_IS_MEMBER_STEP}')
+            if not valid:
+                raise ValueError(f'Параметр {name} должен быть {text}')
+
+    def cancel(self, job_id):
+        """Отмена задания, ожидающего в очереди
+
+        Выход:
+            True, если задание отменено. False, если оно уже выполняется
+            или завершено. KeyError, если задания нет
+
+        """
+        with self._condition:
+            job = self._jobs[job_id]
+            if job.status != 'queued':
+                return False
+            # Задание остается в куче и пропускается при извлечении
+            self._finish(job, 'cancelled')
+            return True
+
+    def job(self, job_id):
+        """Задание по идентификатору (KeyError, если задания нет)"""
+        with self._condition:
+            return self._jobs[job_id]
+
+    def job_status(self, job_id, result=False):
+        """Состояние задания в виде словаря (см. ScanJob.to_dict)"""
+        with self._condition:
+            return self._jobs[job_id].to_dict(result)
+
+    def jobs(self, status=None):
+        """Состояния всех хранимых заданий (или только заданий с
+        состоянием status) в порядке поступления"""
+        with self._condition:
+            return [job.to_dict() for job in self._jobs.values()
+                    if status is None or job.status == status]
+
+    def wait(self, job_id, timeout=None):
+        """Ожидание завершения задания. True, если задание завершено"""
+        return self.job(job_id).done.wait(timeout)
+
+    def stats(self):
+        """Статистика сервиса: число заданий по состояниям, длина
+        очереди, данные кэшей и сводная статистика запросов к ВК"""
+        with self._condition:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            cache = self._cache
+            stats = dict(workers=self.workers,
+                         uptime=time() - self.started
+                                if self.started else 0.0,
+                         queued=statuses.get('queued', 0),
+                         running=self._running,
+                         jobs=statuses,
+                         cache=dict(groups=len(cache.groups),
+                                    member_groups=len(cache.members),
+                                    hits=cache.hits,
+                                    misses=cache.misses,
+                                    age=monotonic() - self._cache_created))
+        if self.api_cache is not None:
+            stats['api_cache'] = self.api_cache.stats()
+        stats['steps'] = spy.get_step_metrics().stats()
+        stats['requests'] = self.request_stats.stats()
+        return stats
+
+    def _scan_cache(self):
+        """Кэш данных о группах для очередного задания. Устаревший или
+        переполненный кэш заменяется новым"""
+        with self._condition:
+            if monotonic() - self._cache_created > self.cache_ttl \
+               or len(self._cache.groups) + len(self._cache.members) \
+                  > self.cache_max_groups:
+                self._cache = spy.ScanCache()
+                self._cache_created = monotonic()
+            return self._cache
+
+    def _next_job(self):
+        """Очередное задание из очереди или None при остановке"""
+        with self._condition:
+            while True:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return None
+                job = heapq.heappop(self._queue)[2]
+                if job.status == 'queued':
+                    job.status = 'running'
+                    job.started = time()
+                    self._running += 1
+                    return job
+
+    def _finish(self, job, status):
+        """Перевод задания в завершенное состояние status и удаление
+        самых старых завершенных заданий. Вызывается с блокировкой"""
+        job.status = status
+        job.finished = time()
+        job.done.set()
+        self._finished.append(job.id)
+        while len(self._finished) > self.max_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _worker(self):
+        """Поток, выполняющий задания из очереди"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job.result = self._run(job)
+                status = 'done'
+            except Exception as error:
+                job.error = f'{type(error).__name__}: {error}'
+                status = 'failed'
+            with self._condition:
+                self._running -= 1
+                self._finish(job, status)
+
+    def _run(self, job):
+        """Выполнение поиска по заданию job"""
+        params = dict(job.params)
+        thresholds = params.pop('thresholds', None)
+        kwarg = dict(json_file=None,
+                     silent=True,
+                     progress=job.set_progress,
+                     tokens=self.tokens,
+                     request_rate=self.request_rate,
+                     on_request=self.request_stats,
+                     session=self.session,
+                     api_cache=self.api_cache,
+                     cache=self._scan_cache(),
+                     **params)
+        if thresholds is not None:
+            return spy.find_unshared_groups_thresholds(job.user_id,
+                                                       thresholds, **kwarg)
+        return list(spy.find_unshared_groups(job.user_id, stream=True,
+                                             **kwarg))
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    """HTTP сервер на Unix сокете"""
+
+    daemon_threads = True
+
+
+class DaemonServer:
+    """HTTP сервер, принимающий задания для ScanDaemon (см. описание
+    модуля)
+
+    Входные параметры:
+        daemon:      объект ScanDaemon
+        host, port:  адрес сервера. port=0 - выбрать свободный порт
+        unix_socket: путь Unix сокета. Если указан, используется вместо
+                     host и port
+
+    Сервер можно использовать как контекстный менеджер: при входе
+    запускаются потоки daemon и сервер в фоновом потоке, при выходе они
+    останавливаются. Адрес сервера - атрибут url (для Unix сокета - путь
+    сокета).
+
+    """
+
+    def __init__(self, daemon, *, host=HOST, port=PORT, unix_socket=None):
+        self.daemon = daemon
+        self.unix_socket = unix_socket
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.respond(*server.handle('GET', self.path, None))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(*server.handle('POST', self.path,
+                                            self.rfile.read(length)))
+
+            def do_DELETE(self):
+                self.respond(*server.handle('DELETE', self.path, None))
+
+            def respond(self, status, body):
+                self.send_response(status)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    body = json.dumps(body, ensure_ascii=False) \
+                               .encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self._httpd = _UnixHTTPServer(unix_socket, Handler)
+            self.url = unix_socket
+        else:
+            self._httpd = ThreadingHTTPServer((host, port), Handler)
+            self._httpd.daemon_threads = True
+            self.url = f'http://{host}:{self._httpd.server_address[1]}'
+        self._thread = None
+
+    def start(self):
+        """Запуск потоков daemon и сервера в фоновом потоке"""
+        self.daemon.start()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Запуск потоков daemon и обработка запросов в текущем потоке до
+        прерывания (KeyboardInterrupt, SIGTERM в командной строке)"""
+        self.daemon.start()
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.close()
+
+    def stop(self):
+        """Остановка сервера и потоков daemon"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+    def close(self):
+        """Закрытие сокета сервера и остановка потоков daemon"""
+        self._httpd.server_close()
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+        self.daemon.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method, path, body):
+        """Обработка запроса. Возвращает кортеж (код HTTP, тело ответа:
+        объект для json или строка текста)"""
+        url = urlsplit(path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values
+                 in parse_qs(url.query).items()}
+        try:
+            if parts == ['health'] and method == 'GET':
+                return 200, dict(status='ok')
+            if parts == ['stats'] and method == 'GET':
+                return 200, self.daemon.stats()
+            if parts == ['stats'] and method == 'DELETE':
+                self.daemon.request_stats.reset()
+                return 200, dict(status='ok')
+            if parts == ['metrics'] and method == 'GET':
+                return 200, self.daemon.request_stats.to_prometheus()
+            if parts == ['jobs'] and method == 'GET':
+                return 200, dict(jobs=self.daemon.jobs(query.get('status')))
+            if parts == ['jobs'] and method == 'POST':
+                return self.submit(body)
+            if len(parts) == 2 and parts[0] == 'jobs':
+                if method == 'GET':
+                    return 200, self.daemon.job_status(parts[1])
+                if method == 'DELETE':
+                    if not self.daemon.cancel(parts[1]):
+                        return 409, self.daemon.job_status(parts[1])
+                    return 200, self.daemon.job_status(parts[1])
+            if len(parts) == 3 and parts[0] == 'jobs' \
+               and parts[2] == 'result' and method == 'GET':
+                job = self.daemon.job(parts[1])
+                if not job.done.is_set():
+                    return 409, job.to_dict()
+                return 200, job.to_dict(result=True)
+        except KeyError:
+            return 404, dict(error='Задание не найдено')
+        return 404, dict(error='Неизвестный запрос')
+
+    def submit(self, body):
+        """Постановка в очередь одного задания или списка заданий
+        {"jobs": [...]} из тела запроса POST /jobs"""
+        try:
+            request = json.loads(body or b'null')
+            if not isinstance(request, dict):
+                raise ValueError('Ожидался объект json')
+            specs = request['jobs'] if 'jobs' in request else [request]
+            if not isinstance(specs, list) \
+               or not all(isinstance(spec, dict) for spec in specs):
+                raise ValueError('Ожидался список заданий')
+            jobs = self.daemon.submit_many(specs)
+        except ValueError as error:
+            return 400, dict(error=str(error))
+        if 'jobs' in request:
+            return 202, dict(jobs=[job.to_dict() for job in jobs])
+        return 202, jobs[0].to_dict()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+                description='Сервис поиска особых групп пользователей ВК '
+                            'с очередью заданий',
+                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', default=HOST, help='адрес HTTP сервера')
+    parser.add_argument('--port', type=int, default=PORT,
+                        help='порт HTTP сервера')
+    parser.add_argument('--unix-socket', default=None,
+                        help='принимать запросы через Unix сокет вместо '
+                             'HTTP порта')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='число одновременно выполняемых заданий')
+    parser.add_argument('-t', '--token', default=spy.TOKEN,
+                        help='ВК token')
+    parser.add_argument('--tokens', nargs='+', default=None,
+                        help='несколько ключей доступа ВК для '
+                             'распределения запросов (заменяет --token)')
+    parser.add_argument('--request-rate', type=float,
+                        default=spy.REQUEST_RATE,
+                        help='максимальное число запросов в секунду на '
+                             'ключ доступа')
+    parser.add_argument('--cache-file', default=None,
+                        help='использовать постоянный кэш ответов ВК в '
+                             'указанном файле')
+    parser.add_argument('--max-finished', type=int, default=MAX_FINISHED,
+                        help='сколько завершенных заданий хранить')
+
+    args = parser.parse_args()
+
+    api_cache = spy.ApiCache(args.cache_file) if args.cache_file else None
+    daemon = ScanDaemon(workers=args.workers,
+                        token=args.token,
+                        tokens=args.tokens,
+                        request_rate=args.request_rate,
+                        api_cache=api_cache,
+                        max_finished=args.max_finished)
+    server = DaemonServer(daemon, host=args.host, port=args.port,
+                          unix_socket=args.unix_socket)
+
+    # SIGTERM завершает сервис так же, как Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f'Сервис поиска особых групп: {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if api_cache is not None:
+            api_cache.close()
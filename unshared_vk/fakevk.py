@@ -0,0 +1,1069 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Автор: Роман Коптев <forest_software@mail.ru>
+"""Локальная замена API ВК для проверки и замеров производительности
+модуля spy без обращения к настоящим серверам ВК.
+
+Модуль содержит:
+
+    * FakeWorld - синтетическую социальную сеть: пользователей, их друзей
+      и группы. Членство в группах вычисляется детерминированно по
+      идентификаторам, поэтому мир из миллионов пар группа-пользователь не
+      занимает памяти. Пользователи, для которых ищутся особые группы,
+      добавляются методом add_user (до 10 000 друзей и 5 000 групп)
+    * run_vkscript - интерпретатор подмножества VKScript, которое
+      используется в запросах execute модуля spy: переменные, while, if,
+      return, арифметика и сравнения, массивы и объекты, методы slice,
+      push, split, свойство length, функции parseInt и parseDouble,
+      параметры запроса Args, оператор @. и обращения к API
+      (users.get, groups.get, friends.get, groups.isMember,
+      groups.getById) с ограничением в 25 обращений на запрос
+    * FakeVKServer - HTTP сервер, принимающий запросы execute так же, как
+      REQUEST_EXECUTE_PATH ВК. Поддерживает задержку ответов, внедрение
+      ошибок и ограничение 3 запросов в секунду на ключ доступа
+
+Пример использования:
+
+    from unshared_vk import spy
+    from unshared_vk.fakevk import FakeWorld, FakeVKServer
+
+    world = FakeWorld(seed=1)
+    world.add_user('user1', friends=500, groups=100)
+    with FakeVKServer(world, latency=0.05) as server:
+        spy.set_api_url(server.url)
+        spy.find_unshared_groups('user1')
+        spy.set_api_url()
+        print(server.stats())
+
+Замеры производительности выполняет модуль bench.
+
+"""
+
+__all__ = [
+    'FakeWorld',
+    'FakeVKServer',
+    'VKScriptError',
+    'run_vkscript'
+]
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+from time import monotonic, sleep
+from urllib.parse import parse_qs
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Необязателен, ускоряет вычисление списков групп
+
+###################################
+# Константы
+###################################
+
+MAX_API_CALLS = 25 # Максимальное число обращений к API в одном execute
+MAX_OPERATIONS = 1000000 # Максимальное число операций в одном execute.
+                         # Операции над массивами (преобразование в
+                         # строку, split, slice, @.) стоят по одной на
+                         # элемент
+MAX_RESPONSE_SIZE = 5 * 1024 * 1024 # Максимальный размер ответа в байтах
+REQUEST_RATE = 3 # Максимальное число запросов в секунду для одного ключа
+
+MAX_GROUPS_GET = 1000 # Ограничения методов API ВК на число групп в
+MAX_FRIENDS_GET = 5000 #   groups.get, друзей в friends.get, пользователей
+MAX_IS_MEMBER = 500 #      в groups.isMember и групп в groups.getById
+MAX_GET_BY_ID = 500
+
+USER_COUNT = 100000 # Число пользователей синтетического мира
+GROUP_COUNT = 20000 # Число групп синтетического мира
+NICHE_GROUPS = 0.3 # Доля малопопулярных групп
+NICHE_DENSITY = 0.0005 # Доля пользователей в малопопулярной группе
+DENSITY_RANGE = (0.002, 0.05) # Доля пользователей в остальных группах
+
+###################################
+# Синтетическая социальная сеть
+###################################
+
+class FakeWorld:
+    """Синтетическая социальная сеть для FakeVKServer.
+
+    Пользователи имеют идентификаторы от 1 до users, группы - от 1 до
+    groups. Пользователь состоит в группе с вероятностью, равной
+    "плотности" группы: малопопулярные группы (доля NICHE_GROUPS) имеют
+    плотность NICHE_DENSITY, остальные - случайную из DENSITY_RANGE.
+    Результат для пары группа-пользователь определяется хэшем и не
+    меняется между вызовами.
+
+    Для пользователей, добавленных методом add_user, списки друзей и групп
+    хранятся явно.
+
+    Входные параметры:
+        seed:         начальное значение генератора случайных чисел
+        users:        число пользователей
+        groups:       число групп
+        private_rate: доля пользователей с закрытым профилем (groups.get и
+                      friends.get для них возвращают ошибку 30)
+
+    """
+
+    def __init__(self, seed=0, *, users=USER_COUNT, groups=GROUP_COUNT,
+                 private_rate=0.0):
+        self.seed = seed
+        self.user_count = users
+        self.group_count = groups
+        self.private_rate = private_rate
+        self._random = random.Random(seed)
+        # Плотность группы хранится как порог 32-битного хэша
+        self._thresholds = [0] + [
+                int(2 ** 32 * (NICHE_DENSITY
+                               if self._random.random() < NICHE_GROUPS
+                               else self._random.uniform(*DENSITY_RANGE)))
+                for group in range(groups)]
+        self.screen_names = {} # короткое имя -> идентификатор пользователя
+        self.friends = {}      # идентификатор -> список друзей
+        self.groups = {}       # идентификатор -> список групп
+        self.deactivated = {}  # идентификатор -> причина деактивации
+        self._group_members = {} # группа -> явные участники из add_user
+        self._user_groups = {} # пользователь -> вычисленный список групп
+        self._lock = threading.Lock()
+
+    def _hash(self, group, user):
+        """32-битный хэш пары группа-пользователь"""
+        value = (group * 0x9E3779B1 ^ user * 0x85EBCA77 ^ self.seed) \
+                & 0xFFFFFFFF
+        value = (value ^ value >> 16) * 0x7FEB352D & 0xFFFFFFFF
+        value = (value ^ value >> 15) * 0x846CA68B & 0xFFFFFFFF
+        return value ^ value >> 16
+
+    def add_user(self, screen_name, *, friends=100, groups=50,
+                 deactivated=None):
+        """Добавление пользователя с явными списками друзей и групп
+
+        Входные параметры:
+            screen_name: короткое имя пользователя
+            friends:     число друзей (не более users - 1)
+            groups:      число групп (не более groups)
+            deactivated: None или причина деактивации ('deleted',
+                         'banned')
+
+        Выход:
+            Числовой идентификатор пользователя
+
+        """
+        uid = self._random.randint(1, self.user_count)
+        while uid in self.friends:
+            uid = self._random.randint(1, self.user_count)
+        others = self._random.sample(range(1, self.user_count), friends)
+        self.screen_names[screen_name] = uid
+        self.friends[uid] = sorted(other if other < uid else other + 1
+                                   for other in others)
+        self.groups[uid] = self._random.sample(
+                range(1, self.group_count + 1), groups)
+        for group in self.groups[uid]:
+            self._group_members.setdefault(group, set()).add(uid)
+        if deactivated:
+            self.deactivated[uid] = deactivated
+        return uid
+
+    def resolve(self, user_id):
+        """Числовой идентификатор пользователя по строке вида '123',
+        'id123' или короткому имени. None, если пользователя нет"""
+        user_id = str(user_id).strip()
+        if user_id in self.screen_names:
+            return self.screen_names[user_id]
+        match = re.fullmatch(r'(?:id)?(\d+)', user_id)
+        if match and 0 < int(match.group(1)) <= self.user_count:
+            return int(match.group(1))
+        return None
+
+    def is_private(self, user):
+        """Закрыт ли профиль пользователя"""
+        if user in self.friends:
+            return False
+        return self._hash(0, user) < 2 ** 32 * self.private_rate
+
+    def is_member(self, group, user):
+        """Состоит ли пользователь в группе"""
+        if user in self.groups:
+            return user in self._group_members.get(group, ())
+        if not 0 < group <= self.group_count:
+            return False
+        return self._hash(group, user) < self._thresholds[group]
+
+    def user_groups(self, user):
+        """Список групп пользователя. Для пользователей не из add_user
+        вычисляется перебором всех групп и запоминается"""
+        if user in self.groups:
+            return self.groups[user]
+        with self._lock:
+            groups = self._user_groups.get(user)
+        if groups is None:
+            if numpy is not None:
+                groups = self._numpy_user_groups(user)
+            else:
+                groups = [group for group in range(1, self.group_count + 1)
+                          if self._hash(group, user) < self._thresholds[group]]
+            with self._lock:
+                self._user_groups[user] = groups
+        return groups
+
+    def _numpy_user_groups(self, user):
+        """user_groups с вычислением хэшей (см. _hash) сразу для всех
+        групп средствами numpy"""
+        mask = numpy.uint64(0xFFFFFFFF)
+        groups = numpy.arange(1, self.group_count + 1, dtype=numpy.uint64)
+        value = (groups * numpy.uint64(0x9E3779B1)
+                 ^ numpy.uint64(user * 0x85EBCA77 ^ self.seed)) & mask
+        value = ((value ^ value >> numpy.uint64(16))
+                 * numpy.uint64(0x7FEB352D)) & mask
+        value = ((value ^ value >> numpy.uint64(15))
+                 * numpy.uint64(0x846CA68B)) & mask
+        value = value ^ value >> numpy.uint64(16)
+        thresholds = numpy.array(self._thresholds[1:], dtype=numpy.uint64)
+        return (numpy.flatnonzero(value < thresholds) + 1).tolist()
+
+    def user_friends(self, user):
+        """Список друзей пользователя (только для пользователей из
+        add_user, у остальных друзей нет)"""
+        return self.friends.get(user, [])
+
+    def group_info(self, group):
+        """Данные группы в формате groups.getById"""
+        return dict(id=group,
+                    name=f'Группа {group}',
+                    screen_name=f'club{group}',
+                    is_closed=0,
+                    type='group',
+                    members_count=int(self.user_count
+                                      * self._thresholds[group] / 2 ** 32)
+                                  + len(self._group_members.get(group, ())))
+
+###################################
+# Интерпретатор подмножества VKScript
+###################################
+
+class VKScriptError(Exception):
+    """Ошибка выполнения кода execute. Атрибуты error_code и error_msg -
+    код и сообщение ошибки в формате ответа API ВК"""
+
+    def __init__(self, error_code, error_msg):
+        super().__init__(f'{error_code}: {error_msg}')
+        self.error_code = error_code
+        self.error_msg = error_msg
+
+
+class _ApiError(Exception):
+    """Ошибка одного обращения к API внутри execute"""
+
+    def __init__(self, error_code, error_msg):
+        super().__init__(error_msg)
+        self.error_code = error_code
+        self.error_msg = error_msg
+
+
+_TOKEN_RE = re.compile(r'''
+    \s*(?:
+      (?P<number>\d+(?:\.\d+)?)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<name>[A-Za-z_$][A-Za-z0-9_$]*)
+    | (?P<op>@\.|&&|\|\||===|!==|==|!=|<=|>=|[-+*/%<>!=(){}\[\],.;:])
+    )''', re.VERBOSE)
+
+_BINARY_PRIORITY = {
+    '||': 1, '&&': 2,
+    '==': 3, '!=': 3, '===': 3, '!==': 3,
+    '<': 4, '<=': 4, '>': 4, '>=': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6, '%': 6
+    }
+
+
+def _tokenize(code):
+    """Разбиение кода на лексемы (тип, значение)"""
+    tokens = []
+    position = 0
+    code = code.rstrip()
+    while position < len(code):
+        match = _TOKEN_RE.match(code, position)
+        if match is None or match.end() == position:
+            raise VKScriptError(12, f'Unable to compile code: unexpected '
+                                    f'symbol at {position}')
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string' and value[0] == '"':
+            value = json.loads(value)
+        elif kind == 'string':
+            value = json.loads('"' + value[1:-1].replace("\\'", "'")
+                                                .replace('"', '\\"') + '"')
+        tokens.append((kind, value))
+        position = match.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser:
+    """Разбор лексем VKScript в дерево из кортежей"""
+
+    def __init__(self, code):
+        self.tokens = _tokenize(code)
+        self.position = 0
+
+    def peek(self, value=None):
+        kind, token = self.tokens[self.position]
+        if value is None:
+            return kind, token
+        return kind in ('op', 'name') and token == value
+
+    def take(self, value=None):
+        kind, token = self.tokens[self.position]
+        if value is not None and not self.peek(value):
+            raise VKScriptError(12, f'Unable to compile code: expected '
+                                    f'{value!r}, got {token!r}')
+        self.position += 1
+        return kind, token
+
+    def skip(self, value):
+        if self.peek(value):
+            self.position += 1
+            return True
+        return False
+
+    def program(self):
+        statements = []
+        while self.peek()[0] != 'end':
+            statements.append(self.statement())
+        return ('block', statements)
+
+    def block(self):
+        if self.skip('{'):
+            statements = []
+            while not self.skip('}'):
+                statements.append(self.statement())
+            return ('block', statements)
+        return self.statement()
+
+    def statement(self):
+        if self.skip(';'):
+            return ('block', [])
+        if self.skip('var'):
+            declarations = []
+            while True:
+                kind, name = self.take()
+                value = self.expression() if self.skip('=') else None
+                declarations.append(('assign', ('name', name), value))
+                if not self.skip(','):
+                    break
+            self.skip(';')
+            return ('block', declarations)
+        if self.skip('while'):
+            self.take('(')
+            condition = self.expression()
+            self.take(')')
+            return ('while', condition, self.block())
+        if self.skip('if'):
+            self.take('(')
+            condition = self.expression()
+            self.take(')')
+            body = self.block()
+            otherwise = self.block() if self.skip('else') else None
+            return ('if', condition, body, otherwise)
+        if self.skip('return'):
+            value = self.expression()
+            self.skip(';')
+            return ('return', value)
+        if self.peek('{'):
+            return self.block()
+        target = self.expression()
+        if self.skip('='):
+            if target[0] not in ('name', 'member', 'index'):
+                raise VKScriptError(12, 'Unable to compile code: '
+                                        'invalid assignment')
+            statement = ('assign', target, self.expression())
+        else:
+            statement = ('expression', target)
+        self.skip(';')
+        return statement
+
+    def expression(self, priority=1):
+        left = self.unary()
+        while True:
+            kind, token = self.peek()
+            if kind != 'op' or _BINARY_PRIORITY.get(token, 0) < priority:
+                return left
+            self.take()
+            right = self.expression(_BINARY_PRIORITY[token] + 1)
+            left = ('binary', token, left, right)
+
+    def unary(self):
+        if self.skip('!'):
+            return ('not', self.unary())
+        if self.skip('-'):
+            return ('binary', '-', ('const', 0), self.unary())
+        return self.postfix(self.primary())
+
+    def postfix(self, node):
+        while True:
+            if self.skip('.'):
+                node = ('member', node, self.take()[1])
+            elif self.skip('@.'):
+                node = ('collect', node, self.take()[1])
+            elif self.skip('['):
+                node = ('index', node, self.expression())
+                self.take(']')
+            elif self.skip('('):
+                arguments = []
+                while not self.skip(')'):
+                    arguments.append(self.expression())
+                    self.skip(',')
+                node = ('call', node, arguments)
+            else:
+                return node
+
+    def primary(self):
+        kind, token = self.take()
+        if kind in ('number', 'string'):
+            return ('const', token)
+        if kind == 'name':
+            if token in ('true', 'false'):
+                return ('const', token == 'true')
+            if token == 'null':
+                return ('const', None)
+            return ('name', token)
+        if token == '(':
+            node = self.expression()
+            self.take(')')
+            return node
+        if token == '[':
+            items = []
+            while not self.skip(']'):
+                items.append(self.expression())
+                self.skip(',')
+            return ('array', items)
+        if token == '{':
+            items = []
+            while not self.skip('}'):
+                key = self.take()[1]
+                self.take(':')
+                items.append((str(key), self.expression()))
+                self.skip(',')
+            return ('object', items)
+        raise VKScriptError(12, f'Unable to compile code: unexpected '
+                                f'{token!r}')
+
+
+class _Return(Exception):
+    """Выход из кода по return"""
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def _to_string(value):
+    """Приведение значения к строке по правилам VKScript"""
+    if value is None:
+        return ''
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        return ','.join(_to_string(item) for item in value)
+    if isinstance(value, dict):
+        return '[object Object]'
+    return str(value)
+
+
+def _to_number(value):
+    """Приведение значения к числу"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(_to_string(value) or 0)
+    except ValueError:
+        return 0
+
+
+def _parse_number(value, integer):
+    """Функции parseInt и parseDouble: число из начала строки или
+    None, если строка не начинается с числа"""
+    pattern = r'\s*[+-]?\d+' if integer \
+              else r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?'
+    match = re.match(pattern, _to_string(value))
+    if match is None:
+        return None
+    return int(match.group()) if integer else float(match.group())
+
+
+def _add(left, right):
+    """Оператор +: сложение чисел, объединение массивов или строк"""
+    if isinstance(left, list) and isinstance(right, list):
+        return left + right
+    if isinstance(left, str) or isinstance(right, str) \
+       or isinstance(left, list) or isinstance(right, list):
+        return _to_string(left) + _to_string(right)
+    return _to_number(left) + _to_number(right)
+
+
+class _Interpreter:
+    """Выполнение дерева VKScript с подсчетом операций и обращений к API"""
+
+    def __init__(self, api, args, max_calls, max_operations):
+        self.api = api
+        self.variables = {'Args': dict(args)}
+        self.max_calls = max_calls
+        self.max_operations = max_operations
+        self.calls = 0
+        self.operations = 0
+        self.errors = []
+
+    def tick(self, count=1):
+        self.operations += count
+        if self.operations > self.max_operations:
+            raise VKScriptError(13, 'Runtime error occurred during code '
+                                    'invocation: Too many operations')
+
+    def run(self, node):
+        kind = node[0]
+        self.tick()
+        if kind == 'block':
+            for statement in node[1]:
+                self.run(statement)
+        elif kind == 'assign':
+            self.assign(node[1], None if node[2] is None
+                                 else self.eval(node[2]))
+        elif kind == 'expression':
+            self.eval(node[1])
+        elif kind == 'while':
+            while self.truth(self.eval(node[1])):
+                self.run(node[2])
+        elif kind == 'if':
+            if self.truth(self.eval(node[1])):
+                self.run(node[2])
+            elif node[3] is not None:
+                self.run(node[3])
+        elif kind == 'return':
+            raise _Return(self.eval(node[1]))
+
+    def assign(self, target, value):
+        if target[0] == 'name':
+            self.variables[target[1]] = value
+        elif target[0] == 'member':
+            self.eval(target[1])[target[2]] = value
+        else:
+            container = self.eval(target[1])
+            index = self.eval(target[2])
+            if isinstance(container, list):
+                index = int(_to_number(index))
+                container.extend([None] * (index + 1 - len(container)))
+            container[index] = value
+
+    @staticmethod
+    def truth(value):
+        return value not in (None, False, 0, '') \
+               and not (isinstance(value, float) and value != value)
+
+    def eval(self, node):
+        kind = node[0]
+        self.tick()
+        if kind == 'const':
+            return node[1]
+        if kind == 'name':
+            if node[1] == 'API':
+                return ('api',)
+            if node[1] not in self.variables:
+                raise VKScriptError(13, f'Runtime error occurred during '
+                                        f'code invocation: {node[1]} is '
+                                        f'not defined')
+            return self.variables[node[1]]
+        if kind == 'array':
+            return [self.eval(item) for item in node[1]]
+        if kind == 'object':
+            return {key: self.eval(value) for key, value in node[1]}
+        if kind == 'not':
+            return not self.truth(self.eval(node[1]))
+        if kind == 'binary':
+            return self.binary(node[1], node[2], node[3])
+        if kind == 'member':
+            return self.member(self.eval(node[1]), node[2])
+        if kind == 'collect':
+            value = self.eval(node[1])
+            if isinstance(value, list):
+                self.tick(len(value))
+                return [item.get(node[2]) if isinstance(item, dict)
+                        else None for item in value]
+            return self.member(value, node[2])
+        if kind == 'index':
+            container = self.eval(node[1])
+            index = self.eval(node[2])
+            if isinstance(container, (list, str)):
+                index = int(_to_number(index))
+                if 0 <= index < len(container):
+                    return container[index]
+                return None
+            if isinstance(container, dict):
+                return container.get(_to_string(index))
+            return None
+        if kind == 'call':
+            return self.call(node[1], [self.eval(argument)
+                                       for argument in node[2]])
+        raise VKScriptError(12, f'Unable to compile code: {kind}')
+
+    def binary(self, operator, left_node, right_node):
+        left = self.eval(left_node)
+        if operator == '&&':
+            return self.eval(right_node) if self.truth(left) else left
+        if operator == '||':
+            return left if self.truth(left) else self.eval(right_node)
+        right = self.eval(right_node)
+        if operator == '+':
+            for operand in (left, right):
+                if isinstance(operand, list):
+                    self.tick(len(operand))
+            return _add(left, right)
+        if operator in ('==', '==='):
+            return left == right
+        if operator in ('!=', '!=='):
+            return left != right
+        if isinstance(left, str) and isinstance(right, str) \
+           and operator in ('<', '<=', '>', '>='):
+            pass
+        else:
+            left, right = _to_number(left), _to_number(right)
+        if operator == '-':
+            return left - right
+        if operator == '*':
+            return left * right
+        if operator == '/':
+            return left / right if right else float('inf')
+        if operator == '%':
+            return left % right if right else float('nan')
+        if operator == '<':
+            return left < right
+        if operator == '<=':
+            return left <= right
+        if operator == '>':
+            return left > right
+        return left >= right
+
+    def member(self, value, name):
+        if isinstance(value, tuple) and value[:1] == ('api',):
+            return value + (name,)
+        if name == 'length' and isinstance(value, (list, str)):
+            return len(value)
+        if isinstance(value, dict):
+            return value.get(name)
+        if isinstance(value, (list, str)):
+            return ('method', value, name)
+        return None
+
+    def call(self, function, arguments):
+        if function[0] == 'name' and function[1] in ('parseInt',
+                                                     'parseDouble'):
+            return _parse_number(arguments[0] if arguments else None,
+                                 function[1] == 'parseInt')
+        if function[0] == 'member':
+            target = self.eval(function[1])
+            name = function[2]
+        else:
+            raise VKScriptError(13, 'Runtime error occurred during code '
+                                    'invocation: not a function')
+        if isinstance(target, tuple) and target[:1] == ('api',):
+            return self.api_call('.'.join(target[1:] + (name,)),
+                                 arguments[0] if arguments else {})
+        if isinstance(target, list):
+            if name == 'slice':
+                start = int(_to_number(arguments[0])) if arguments else 0
+                end = int(_to_number(arguments[1])) \
+                      if len(arguments) > 1 else len(target)
+                self.tick(len(target[start:end]))
+                return target[start:end]
+            if name == 'push':
+                target.extend(arguments)
+                return len(target)
+            if name == 'pop':
+                return target.pop() if target else None
+        if isinstance(target, (list, str, int, float)) and name == 'split':
+            if isinstance(target, list):
+                self.tick(len(target))
+            items = _to_string(target).split(_to_string(arguments[0]))
+            self.tick(len(items))
+            return items
+        if isinstance(target, (list, str)) and name == 'slice':
+            text = _to_string(target)
+            start = int(_to_number(arguments[0])) if arguments else 0
+            end = int(_to_number(arguments[1])) \
+                  if len(arguments) > 1 else len(text)
+            return text[start:end]
+        if isinstance(target, str) and name == 'substr':
+            start = int(_to_number(arguments[0]))
+            length = int(_to_number(arguments[1])) \
+                     if len(arguments) > 1 else len(target)
+            return target[start:start + length]
+        raise VKScriptError(13, f'Runtime error occurred during code '
+                                f'invocation: {name} is not a function')
+
+    def api_call(self, method, params):
+        self.calls += 1
+        if self.calls > self.max_calls:
+            raise VKScriptError(13, 'Runtime error occurred during code '
+                                    'invocation: Too many API calls')
+        try:
+            return self.api(method, params if isinstance(params, dict)
+                                    else {})
+        except _ApiError as e:
+            self.errors.append(dict(method=method,
+                                    error_code=e.error_code,
+                                    error_msg=e.error_msg))
+            return False
+
+
+def run_vkscript(code, api, *, args=None, max_calls=MAX_API_CALLS,
+                 max_operations=MAX_OPERATIONS, counters=None):
+    """Выполнение кода VKScript
+
+    Входные параметры:
+        code:           текст VKScript
+        api:            функция api(method, params), выполняющая обращение
+                        к API. При ошибке генерирует _ApiError, после чего
+                        обращение возвращает false, а ошибка добавляется в
+                        execute_errors
+        args:           словарь параметров запроса, доступный в коде как
+                        Args
+        max_calls:      максимальное число обращений к API
+        max_operations: максимальное число операций
+        counters:       словарь, в который по завершении (успешном или
+                        нет) записываются число обращений к API (calls)
+                        и выполненных операций (operations)
+
+    Выход:
+        Кортеж (результат return, список execute_errors)
+
+    Ошибки компиляции и выполнения генерируют VKScriptError
+
+    """
+    tree = _Parser(code).program()
+    interpreter = _Interpreter(api, args or {}, max_calls, max_operations)
+    try:
+        interpreter.run(tree)
+    except _Return as result:
+        return result.value, interpreter.errors
+    except RecursionError:
+        raise VKScriptError(13, 'Runtime error occurred during code '
+                                'invocation: Too many operations')
+    finally:
+        if counters is not None:
+            counters.update(calls=min(interpreter.calls, max_calls),
+                            operations=interpreter.operations)
+    return None, interpreter.errors
+
+###################################
+# Методы API
+###################################
+
+def _ids(value):
+    """Список идентификаторов из массива, числа или строки через
+    запятую"""
+    if isinstance(value, list):
+        return [int(_to_number(item)) for item in value]
+    if isinstance(value, (int, float)):
+        return [int(value)]
+    return [int(item) for item in str(value or '').split(',')
+            if item.strip()]
+
+
+def _positive(value, default):
+    """Целое значение параметра count/offset"""
+    if value is None:
+        return default
+    return max(0, int(_to_number(value)))
+
+
+class _Api:
+    """Методы API ВК, используемые модулем spy, над FakeWorld"""
+
+    def __init__(self, world):
+        self.world = world
+
+    def __call__(self, method, params):
+        handler = getattr(self, method.replace('.', '_'), None)
+        if handler is None:
+            raise _ApiError(3, 'Unknown method passed')
+        return handler(params)
+
+    def _user(self, user_id):
+        user = self.world.resolve(user_id)
+        if user is None:
+            raise _ApiError(113, 'Invalid user id')
+        if user in self.world.deactivated:
+            raise _ApiError(18, 'User was deleted or banned')
+        if self.world.is_private(user):
+            raise _ApiError(30, 'This profile is private')
+        return user
+
+    def users_get(self, params):
+        result = []
+        for user_id in str(params.get('user_ids', '')).split(','):
+            user = self.world.resolve(user_id)
+            if user is None:
+                continue
+            info = dict(id=user, first_name=f'Имя{user}',
+                        last_name=f'Фамилия{user}')
+            if user in self.world.deactivated:
+                info['deactivated'] = self.world.deactivated[user]
+            result.append(info)
+        return result
+
+    def groups_get(self, params):
+        groups = self.world.user_groups(self._user(params.get('user_id')))
+        offset = _positive(params.get('offset'), 0)
+        count = min(_positive(params.get('count'), MAX_GROUPS_GET),
+                    MAX_GROUPS_GET)
+        return dict(count=len(groups), items=groups[offset:offset + count])
+
+    def friends_get(self, params):
+        friends = self.world.user_friends(
+                        self._user(params.get('user_id')))
+        offset = _positive(params.get('offset'), 0)
+        count = min(_positive(params.get('count'), MAX_FRIENDS_GET),
+                    MAX_FRIENDS_GET)
+        return dict(count=len(friends),
+                    items=friends[offset:offset + count])
+
+    def groups_isMember(self, params):
+        group = int(_to_number(params.get('group_id')))
+        if not 0 < group <= self.world.group_count:
+            raise _ApiError(100, 'One of the parameters specified was '
+                                 'missing or invalid: group_id')
+        if 'user_ids' not in params:
+            return int(self.world.is_member(
+                            group, int(_to_number(params.get('user_id')))))
+        users = _ids(params['user_ids'])
+        if len(users) > MAX_IS_MEMBER:
+            raise _ApiError(100, 'One of the parameters specified was '
+                                 'missing or invalid: too many user_ids')
+        if str(params.get('extended', 0)) == '1':
+            return [dict(member=int(self.world.is_member(group, user)),
+                         request=0, invitation=0, user_id=user)
+                    for user in users]
+        return [dict(member=int(self.world.is_member(group, user)),
+                     user_id=user)
+                for user in users]
+
+    def groups_getById(self, params):
+        groups = _ids(params.get('group_ids') or params.get('group_id'))
+        if len(groups) > MAX_GET_BY_ID:
+            raise _ApiError(100, 'One of the parameters specified was '
+                                 'missing or invalid: too many group_ids')
+        return [self.world.group_info(group) for group in groups
+                if 0 < group <= self.world.group_count]
+
+###################################
+# HTTP сервер
+###################################
+
+class FakeVKServer:
+    """HTTP сервер, выполняющий запросы execute над FakeWorld.
+
+    Входные параметры:
+        world:          объект FakeWorld. По умолчанию создается мир с
+                        seed=0
+        host, port:     адрес сервера. port=0 - выбрать свободный порт
+        latency:        задержка ответа в секундах
+        latency_jitter: случайная добавка к задержке (от 0 до значения)
+        error_rate:     вероятность ответа ошибкой ВК 10 (Internal server
+                        error)
+        drop_rate:      вероятность ответа HTTP 502 с телом не в формате
+                        json
+        rate:           максимальное число запросов в секунду на ключ
+                        доступа. При превышении возвращается ошибка ВК 6.
+                        None или 0 - не ограничивать
+        tokens:         допустимые ключи доступа. None - любые. Для
+                        остальных возвращается ошибка ВК 5
+        max_calls, max_operations, max_response_size: ограничения
+                        execute
+        seed:           начальное значение генератора случайных чисел для
+                        задержек и ошибок
+
+    Сервер можно использовать как контекстный менеджер. Адрес для
+    spy.set_api_url - атрибут url. Статистику возвращает метод stats.
+
+    """
+
+    def __init__(self, world=None, *, host='127.0.0.1', port=0,
+                 latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, drop_rate=0.0,
+                 rate=REQUEST_RATE, tokens=None,
+                 max_calls=MAX_API_CALLS,
+                 max_operations=MAX_OPERATIONS,
+                 max_response_size=MAX_RESPONSE_SIZE,
+                 seed=None):
+        self.world = world if world is not None else FakeWorld()
+        self.api = _Api(self.world)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.rate = rate
+        self.tokens = set(tokens) if tokens is not None else None
+        self.max_calls = max_calls
+        self.max_operations = max_operations
+        self.max_response_size = max_response_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._token_times = {}
+        self.reset_stats()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                params = {key: values[-1] for key, values in
+                          parse_qs(self.rfile.read(length).decode('utf-8'),
+                                   keep_blank_values=True).items()}
+                status, body = server.handle(self.path, params)
+                self.send_response(status)
+                self.send_header('Content-Type',
+                                 'application/json; charset=utf-8'
+                                 if status == 200 else 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self.url = (f'http://{host}:{self._httpd.server_address[1]}'
+                    f'/method/execute')
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_stats(self):
+        """Обнуление статистики"""
+        with self._lock:
+            self.requests = 0
+            self.api_calls = 0
+            self.operations = 0
+            self.errors = {}
+            self.latencies = []
+
+    def stats(self):
+        """Статистика сервера: число запросов, обращений к API и
+        операций VKScript внутри execute, ошибок по кодам и времена
+        обработки запросов в секундах"""
+        with self._lock:
+            return dict(requests=self.requests,
+                        api_calls=self.api_calls,
+                        operations=self.operations,
+                        errors=dict(self.errors),
+                        latencies=list(self.latencies))
+
+    def _rate_exceeded(self, token):
+        """Учет запроса для ключа доступа. True, если за последнюю
+        секунду запросов было больше rate"""
+        if not self.rate:
+            return False
+        now = monotonic()
+        with self._lock:
+            times = self._token_times.setdefault(token, deque())
+            while times and now - times[0] >= 1:
+                times.popleft()
+            if len(times) >= self.rate:
+                return True
+            times.append(now)
+            return False
+
+    def handle(self, path, params):
+        """Обработка запроса. Возвращает кортеж (код HTTP, тело ответа)"""
+        started = monotonic()
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(
+                                            0, self.latency_jitter)
+            drop = self._random.random() < self.drop_rate
+            fail = self._random.random() < self.error_rate
+        if delay:
+            sleep(delay)
+
+        counters = {}
+        if drop:
+            status, body = 502, b'<html>502 Bad Gateway</html>'
+            error_code = 'http_502'
+        else:
+            try:
+                if not path.rstrip('/').endswith('/execute'):
+                    raise VKScriptError(3, 'Unknown method passed')
+                token = params.get('access_token', '')
+                if self.tokens is not None and token not in self.tokens:
+                    raise VKScriptError(5, 'User authorization failed: '
+                                           'invalid access_token')
+                if self._rate_exceeded(token):
+                    raise VKScriptError(6, 'Too many requests per second')
+                if fail:
+                    raise VKScriptError(10, 'Internal server error')
+                args = {key: value for key, value in params.items()
+                        if key not in ('code', 'access_token', 'v', 'lang')}
+                value, errors = run_vkscript(
+                        params.get('code', ''), self.api, args=args,
+                        max_calls=self.max_calls,
+                        max_operations=self.max_operations,
+                        counters=counters)
+                response = dict(response=value)
+                if errors:
+                    response['execute_errors'] = errors
+                body = json.dumps(response, ensure_ascii=False,
+                                  separators=(',', ':')).encode('utf-8')
+                if len(body) > self.max_response_size:
+                    raise VKScriptError(13, 'Runtime error occurred during '
+                                            'code invocation: Response '
+                                            'size is too big')
+                error_code = None
+            except VKScriptError as e:
+                body = json.dumps(dict(error=dict(
+                                       error_code=e.error_code,
+                                       error_msg=e.error_msg,
+                                       request_params=[])),
+                                  ensure_ascii=False).encode('utf-8')
+                error_code = e.error_code
+            status = 200
+
+        with self._lock:
+            self.api_calls += counters.get('calls', 0)
+            self.operations += counters.get('operations', 0)
+            if error_code is not None:
+                self.errors[error_code] = self.errors.get(error_code, 0) + 1
+            self.latencies.append(monotonic() - started)
+        return status, body
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Автор: Роман Коптев <forest_software@mail.ru>
+"""Разреженная булева матрица членства друзей в группах на основе NumPy.
+
+Результаты проверки членства (groups.isMember) и списки групп друзей
+(groups.get), полученные модулем spy, собираются в матрицу друзья x
+группы. Число друзей в группах, число групп пользователя у каждого друга
+и списки особых групп вычисляются векторными операциями над всей
+матрицей, без циклов Python по словарям, поэтому анализ данных тысяч
+пользователей после загрузки занимает миллисекунды.
+
+Матрица хранится в сжатом построчном виде (CSR): отсортированные
+идентификаторы друзей (строки) и групп (столбцы), номера столбцов
+ненулевых элементов по строкам и начала строк. Для хранения нужен только
+NumPy, SciPy не используется.
+
+Пример использования:
+
+    from unshared_vk.spy import ScanCache, find_unshared_groups_batch
+    from unshared_vk.matrix import MembershipMatrix
+
+    cache = ScanCache()
+    find_unshared_groups_batch(['id1', 'id2'], cache=cache)
+    matrix = MembershipMatrix.from_scan_cache(cache)
+    matrix.group_counts()                # число друзей в каждой группе
+    matrix.friend_overlap()              # число групп у каждого друга
+    matrix.special_groups(5, friends=[...], groups=[...])
+
+"""
+
+__all__ = [
+    'MembershipMatrix'
+]
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Необязателен, без него матрица недоступна
+
+###################################
+# Объявления функций
+###################################
+
+def _sorted_unique(values):
+    """Отсортированный массив int64 различных значений values. Сортировка
+    с удалением соседних повторов быстрее numpy.unique на больших
+    массивах"""
+    values = numpy.sort(numpy.asarray(values, dtype=numpy.int64))
+    if len(values) < 2:
+        return values
+    return values[numpy.concatenate(([True], values[1:] != values[:-1]))]
+
+###################################
+# Объявления классов
+###################################
+
+class MembershipMatrix:
+    """Разреженная булева матрица членства друзей (строки) в группах
+    (столбцы). Неизменяема после создания.
+
+    Входные параметры:
+        friends: идентификаторы друзей (строки матрицы)
+        groups:  идентификаторы групп (столбцы матрицы)
+        pairs:   пары (друг, группа), в которых друг состоит в группе.
+                 Пары с друзьями или группами не из friends и groups
+                 отбрасываются, повторы учитываются один раз
+
+    Атрибуты friends и groups - отсортированные массивы идентификаторов
+    строк и столбцов.
+
+    Если пакет numpy не установлен, генерируется исключительная ситуация
+    ImportError.
+
+    """
+
+    def __init__(self, friends, groups, pairs=()):
+        if numpy is None:
+            raise ImportError('Для матрицы членства необходим пакет numpy')
+
+        self.friends = _sorted_unique(list(friends))
+        self.groups = _sorted_unique(list(groups))
+
+        if not isinstance(pairs, numpy.ndarray):
+            pairs = list(pairs)
+        pairs = numpy.asarray(pairs, dtype=numpy.int64).reshape(-1, 2)
+        rows = self._index(self.friends, pairs[:, 0])
+        cols = self._index(self.groups, pairs[:, 1])
+        known = (rows >= 0) & (cols >= 0)
+        keys = _sorted_unique(rows[known] * len(self.groups) + cols[known])
+
+        self._rows = keys // max(1, len(self.groups))
+        self._cols = keys % max(1, len(self.groups))
+        self._indptr = numpy.searchsorted(
+                self._rows, numpy.arange(len(self.friends) + 1))
+
+    @classmethod
+    def from_friend_groups(cls, friend_groups, groups=None):
+        """Матрица по спискам групп друзей
+
+        Входные параметры:
+            friend_groups: словарь {друг: список групп} или пары (друг,
+                           список групп)
+            groups:        группы-столбцы матрицы. По умолчанию - все
+                           группы из списков
+
+        """
+        if numpy is None:
+            raise ImportError('Для матрицы членства необходим пакет numpy')
+
+        if isinstance(friend_groups, dict):
+            friend_groups = friend_groups.items()
+        friend_groups = [(friend, items) for friend, items in friend_groups]
+
+        friends = [friend for friend, items in friend_groups]
+        lengths = [len(items) for friend, items in friend_groups]
+        rows = numpy.repeat(numpy.asarray(friends, dtype=numpy.int64),
+                            lengths)
+        cols = numpy.fromiter((group for friend, items in friend_groups
+                               for group in items),
+                              dtype=numpy.int64, count=sum(lengths))
+        if groups is None:
+            groups = _sorted_unique(cols)
+        return cls(friends, groups, numpy.column_stack((rows, cols)))
+
+    @classmethod
+    def from_scan_cache(cls, cache, friends=None, groups=None):
+        """Матрица по результатам проверки членства в кэше cache (объект
+        spy.ScanCache). По умолчанию строки и столбцы - все друзья и
+        группы, для которых в кэше есть результаты. Друзья, членство
+        которых в группе не проверялось, считаются не состоящими в ней"""
+        members = cache.members_copy()
+        if groups is None:
+            groups = list(members)
+        if friends is None:
+            friends = {friend for known in members.values()
+                       for friend in known}
+        pairs = [(friend, group) for group, known in members.items()
+                 for friend, flag in known.items() if flag]
+        return cls(friends, groups, pairs)
+
+    @staticmethod
+    def _index(labels, values):
+        """Номера значений values в отсортированном массиве labels или -1
+        для отсутствующих"""
+        values = numpy.asarray(values, dtype=numpy.int64)
+        if not len(labels):
+            return numpy.full(len(values), -1, dtype=numpy.int64)
+        index = numpy.searchsorted(labels, values)
+        index[index >= len(labels)] = 0
+        return numpy.where(labels[index] == values, index, -1)
+
+    @staticmethod
+    def _take(values, index):
+        """Элементы values по номерам index, 0 для номеров -1"""
+        result = numpy.zeros(len(index), dtype=values.dtype)
+        result[index >= 0] = values[index[index >= 0]]
+        return result
+
+    @property
+    def shape(self):
+        """Размеры матрицы (число друзей, число групп)"""
+        return len(self.friends), len(self.groups)
+
+    @property
+    def nnz(self):
+        """Число пар друг-группа, в которых друг состоит в группе"""
+        return len(self._cols)
+
+    def _row_entries(self, friends):
+        """Номера ненулевых элементов строк друзей friends (None - все
+        строки)"""
+        if friends is None:
+            return slice(None)
+        rows = self._index(self.friends, list(friends))
+        rows = numpy.unique(rows[rows >= 0])
+        starts = self._indptr[rows]
+        lengths = self._indptr[rows + 1] - starts
+        offsets = numpy.cumsum(lengths) - lengths
+        return numpy.arange(lengths.sum()) \
+               - numpy.repeat(offsets, lengths) \
+               + numpy.repeat(starts, lengths)
+
+    def group_counts(self, friends=None, groups=None):
+        """Число друзей в группах
+
+        Входные параметры:
+            friends: учитываемые друзья (например, друзья одного
+                     пользователя). По умолчанию - все строки матрицы
+            groups:  группы, для которых нужен результат. По умолчанию -
+                     все столбцы матрицы
+
+        Выход:
+            Массив numpy чисел друзей в порядке groups (для групп не из
+            матрицы - 0)
+
+        """
+        counts = numpy.bincount(self._cols[self._row_entries(friends)],
+                                minlength=len(self.groups))
+        if groups is None:
+            return counts
+        return self._take(counts, self._index(self.groups, list(groups)))
+
+    def friend_overlap(self, friends=None, groups=None):
+        """Число групп, в которых состоит каждый друг
+
+        Входные параметры:
+            friends: друзья, для которых нужен результат. По умолчанию -
+                     все строки матрицы
+            groups:  учитываемые группы (например, группы одного
+                     пользователя). По умолчанию - все столбцы матрицы
+
+        Выход:
+            Массив numpy чисел групп в порядке friends
+
+        """
+        if groups is None:
+            overlap = numpy.diff(self._indptr)
+        else:
+            mask = numpy.zeros(len(self.groups), dtype=bool)
+            cols = self._index(self.groups, list(groups))
+            mask[cols[cols >= 0]] = True
+            overlap = numpy.bincount(self._rows[mask[self._cols]],
+                                     minlength=len(self.friends))
+        if friends is None:
+            return overlap
+        return self._take(overlap, self._index(self.friends, list(friends)))
+
+    def special_mask(self, members_threshold=0, friends=None, groups=None):
+        """Маска особых групп: в группе не больше members_threshold друзей.
+        Параметры friends и groups - как у group_counts"""
+        return self.group_counts(friends, groups) <= members_threshold
+
+    def special_groups(self, members_threshold=0, friends=None,
+                       groups=None):
+        """Список идентификаторов особых групп в порядке groups (по
+        умолчанию - в порядке столбцов матрицы). Параметры friends и
+        groups - как у group_counts"""
+        labels = self.groups if groups is None \
+                 else numpy.asarray(list(groups), dtype=numpy.int64)
+        return labels[self.special_mask(members_threshold, friends,
+                                        groups)].tolist()
+
+    def counts(self, friends=None, groups=None):
+        """Словарь {группа: число друзей в группе}. Параметры friends и
+        groups - как у group_counts"""
+        labels = self.groups if groups is None else list(groups)
+        return dict(zip((int(group) for group in labels),
+                        self.group_counts(friends, groups).tolist()))
+
+    def to_dense(self):
+        """Плотная булева матрица numpy размером shape"""
+        dense = numpy.zeros(self.shape, dtype=bool)
+        dense[self._rows, self._cols] = True
+        return dense
@@ -62,11 +62,29 @@
 Кроме того, можно указать не использовать выходной файл, передав None в
 качестве значения параметра json_file
 
+Особые группы можно получать и по мере их нахождения: построчно в NDJSON
+файле (параметр ndjson_file), через функцию sink или из генератора:
+    
+    for group in find_unshared_groups('a_medvedev_01', stream=True):
+        ...
+
 Та же самая выходная информация возвращается функцией как json объект
 и может быть использована в программе:
     
     special_groups = find_unshared_groups('a_medvedev_01')
     
+Для программной обработки удобнее генератор iter_unshared_groups, который
+выдает запись о каждой проверенной группе (идентификатор, название, число
+участников, число друзей в группе и признак особой группы) по мере получения
+ответов ВК. Перебор можно прекратить в любой момент, и оставшиеся группы
+не будут запрашиваться:
+    
+    from itertools import islice
+    from unshared_vk.spy import iter_unshared_groups
+    special = (g for g in iter_unshared_groups('a_medvedev_01')
+               if g['special'])
+    first_ten = list(islice(special, 10))
+
 Кроме того, в процессе выполнения функция может выводить дополнительную
 более подробную информацию на экран, что можно отключить, использовав
 параметр silent=True:
@@ -100,6 +118,97 @@
     * Можно задать задержки таймаутов при соединении и получении данных,
       задержки при повторах в случае ответов сервера с ошибкой и количество
       повторов (параметры request_delay, request_repeat, request_timeout)
+    * Запросы к API ВК с одним ключом доступа отправляются не чаще
+      3 раз в секунду (параметр request_rate), ограничение общее для всех
+      потоков программы. Это позволяет не получать ошибку ВК 6
+      ("Too many requests per second") и не тратить на нее повторы
+    * Можно проверять несколько групп в одном запросе execute (параметр
+      batch). Число групп в запросе подбирается по количеству друзей
+      пользователя так, чтобы уложиться в ограничение 25 обращений к API.
+      Для пользователей с несколькими сотнями друзей это сокращает число
+      запросов к API примерно на порядок
+    * Размеры частей запросов подбираются по числу друзей и групп так,
+      чтобы уложиться в ограничения execute. Если ВК все же сообщает о
+      превышении числа обращений к API, числа операций или размера
+      ответа, запрос делится на части и повторяется автоматически.
+      Статистику выбранных размеров возвращает get_step_metrics
+    * Проверка группы прекращается, как только число друзей в ней
+      превысит порог специфичности: при пороге 0 для большинства групп
+      хватает одного обращения к groups.isMember. Точный подсчет для всех
+      групп включается параметром exact_counts
+    * Скрипты проверки групп обращаются только к groups.isMember. Данные
+      о группах (название, короткое имя, число участников) запрашиваются
+      после проверки и только для особых групп, пачками до
+      GROUP_INFO_STEP групп в одном обращении к groups.getById. Их можно
+      сохранять между поисками в кэше ScanCache (параметр cache). При
+      выдаче результатов по мере нахождения (stream, sink, NDJSON файл,
+      контрольные точки) записи ждут пачку не дольше GROUP_INFO_HOLD
+      секунд
+    * Особые группы для нескольких порогов сразу (например, 0, 1, 5 и
+      10) находит функция find_unshared_groups_thresholds (в командной
+      строке - опция --thresholds). Точное число друзей во всех группах
+      подсчитывается за один проход, списки для каждого порога и
+      распределение групп по числу друзей (friends_histogram) строятся
+      локально, без повторного поиска
+    * Если групп у пользователя много, а друзей мало, дешевле получить
+      списки групп друзей (groups.get) и подсчитать друзей в группах
+      локально. Стратегию можно выбрать по оценке числа запросов
+      (параметр strategy='auto', функция plan_strategy)
+    * Можно проверять группы в нескольких потоках (параметр workers) и
+      распределять запросы между несколькими ключами доступа (параметр
+      tokens). Каждый ключ ограничен своими 3 запросами в секунду, поэтому
+      пропускная способность растет с числом ключей
+    * Для многих пользователей сразу поиск выполняет функция
+      find_unshared_groups_batch (в командной строке - опция --users-file).
+      Проверки членства друзей в группах планируются по группам, общие
+      группы и друзья разных пользователей запрашиваются один раз, данные
+      сохраняются в кэше ScanCache, который можно использовать повторно.
+      Результат - словарь со списками особых групп каждого пользователя
+    * Ответы API ВК можно сохранять в постоянном кэше на диске (класс
+      ApiCache, параметр api_cache). Время хранения задается для каждого
+      типа данных, размер кэша ограничен, при переполнении удаляются
+      давно не использованные записи
+    * Долгий поиск можно продолжить после сбоя или прерывания, указав
+      файл контрольной точки (параметр checkpoint_file). Уже проверенные
+      группы повторно не запрашиваются
+    * Регулярный повторный поиск для того же пользователя можно выполнять
+      в инкрементальном режиме, указав файл снимка результатов (параметр
+      snapshot_file). Проверяются только новые группы и членство
+      добавленных друзей, число друзей в остальных группах берется из
+      снимка. Если кто-то из друзей удален, группы проверяются заново
+    * Соединения с серверами API ВК сохраняются между запросами и между
+      вызовами функций (общая сессия requests с пулом соединений, см.
+      make_session, get_session, set_default_session). Можно передать
+      свою сессию параметром session
+    * Ответы API ВК разбираются один раз. Если установлен пакет orjson,
+      он используется для ускорения разбора (параметр fast_json), списки
+      друзей и групп хранятся в компактных массивах array
+    * Тексты VKScript постоянны и минифицируются один раз, а изменяемые
+      данные (идентификаторы, списки друзей, пороги) передаются
+      параметрами запроса execute (Args, см. vkscript_request)
+    * Для программ на asyncio есть асинхронные версии функций
+      async_find_unshared_groups и async_do_execute_request (нужен пакет
+      aiohttp). Число одновременных запросов одного поиска ограничивается
+      параметром concurrency, а ограничение частоты запросов для ключа
+      доступа общее для всех поисков
+    * Повторы запросов после ошибок выполняются с экспоненциально
+      растущей задержкой со случайной составляющей (класс RetryPolicy,
+      параметр retry_policy). Постоянные ошибки ВК (неверный ключ доступа,
+      нет доступа, приватный профиль) не повторяются. Общее время поиска
+      можно ограничить параметром deadline
+    * Для проверки и замеров производительности без обращения к ВК есть
+      локальный сервер, выполняющий используемое подмножество VKScript
+      над синтетическими пользователями (модуль fakevk), и набор замеров
+      на нем (модуль bench). Адрес запросов меняет функция set_api_url
+    * Для поиска по очень многим пользователям есть сервис с очередью
+      заданий (модуль daemon): он запускается один раз, сохраняет между
+      заданиями сессию, ограничители частоты запросов и кэши и принимает
+      задания по HTTP или через Unix сокет
+    * Каждый запрос execute можно отслеживать функцией on_request (имя
+      скрипта, размеры запроса и ответа, время, повторы, ошибки, ожидание
+      ограничителя частоты). Класс RequestStats собирает из этих записей
+      статистику и выгружает ее в json или в формате Prometheus; при
+      return_stats=True поиск возвращает ее вместе с результатом
     * Можно также изменить ряд настроек запросов к API ВК, но не рекомендуется
       этого делать, т.к. в таком случае с большой вероятностью будут
       происходить разные ошибки, связанные с ограничениями сети ВК и API ВК.
@@ -152,6 +261,8 @@
 Использование: spy.py [-v] [-h] [-t [TOKEN]]
                       [--request-repeat [REQUEST_REPEAT]]
                       [--request-delay [REQUEST_DELAY]]
+                      [--request-rate [REQUEST_RATE]]
+                      [--deadline [DEADLINE]]
                       [--request-timeout1 [REQUEST_TIMEOUT1]]
                       [--request-timeout2 [REQUEST_TIMEOUT2]]
                       [--output-json-file [OUTPUT_JSON_FILE]]
@@ -160,6 +271,19 @@
                       [--friend-load-step [FRIEND_LOAD_STEP]]
                       [--friend-is-member-step [FRIEND_IS_MEMBER_STEP]]
                       [--members-threshold [MEMBERS_THRESHOLD]]
+                      [--thresholds THRESHOLDS [THRESHOLDS ...]]
+                      [--batch [BATCH]]
+                      [--exact-counts [EXACT_COUNTS]]
+                      [--strategy [{groups,friends,auto}]]
+                      [--engine [{python,numpy,auto}]]
+                      [--tokens TOKENS [TOKENS ...]]
+                      [--workers [WORKERS]]
+                      [--checkpoint-file [CHECKPOINT_FILE]]
+                      [--checkpoint-every [CHECKPOINT_EVERY]]
+                      [--ndjson-file [NDJSON_FILE]]
+                      [--snapshot-file [SNAPSHOT_FILE]]
+                      [--users-file [USERS_FILE]]
+                      [--cache-file [CACHE_FILE]]
                       [-i [INTERACTIVE]] [--silent [SILENT]]
                       [user_id]
 
@@ -177,7 +301,12 @@
   --request-repeat [REQUEST_REPEAT]
                         число повторений запросов (По умолч.: 10)
   --request-delay [REQUEST_DELAY]
-                        задержка между запросами при ошибках (По умолч.: 0.5)
+                        задержка перед первым повтором запроса при ошибках
+                        (По умолч.: 0.5)
+  --request-rate [REQUEST_RATE]
+                        максимальное число запросов в секунду (По умолч.: 3)
+  --deadline [DEADLINE]
+                        общее время поиска в секундах (По умолч.: None)
   --request-timeout1 [REQUEST_TIMEOUT1]
                         connection timeout (По умолч.: 7)
   --request-timeout2 [REQUEST_TIMEOUT2]
@@ -199,6 +328,45 @@
                         для метода ismember(рек. 500) (По умолч.: 500)
   --members-threshold [MEMBERS_THRESHOLD]
                         порог специфичности (По умолч.: 0)
+  --thresholds THRESHOLDS [THRESHOLDS ...]
+                        несколько порогов специфичности: один проход с
+                        точным подсчетом друзей во всех группах, списки
+                        особых групп для каждого порога и распределение
+                        групп по числу друзей (По умолч.: None)
+  --batch [BATCH]       проверять несколько групп в одном запросе (По умолч.:
+                        False)
+  --exact-counts [EXACT_COUNTS]
+                        считать точное число друзей в группах, не прекращая
+                        проверку после превышения порога (По умолч.: False)
+  --strategy [{groups,friends,auto}]
+                        стратегия поиска: проверка групп, списки групп
+                        друзей или выбор по оценке числа запросов (По
+                        умолч.: groups)
+  --engine [{python,numpy,auto}]
+                        способ подсчета друзей в группах по полученным
+                        данным о членстве (По умолч.: auto)
+  --tokens TOKENS [TOKENS ...]
+                        несколько ключей доступа ВК для распределения
+                        запросов (заменяет --token) (По умолч.: None)
+  --workers [WORKERS]   число потоков проверки групп (По умолч.: 1)
+  --checkpoint-file [CHECKPOINT_FILE]
+                        файл контрольной точки для продолжения прерванного
+                        поиска (По умолч.: None)
+  --checkpoint-every [CHECKPOINT_EVERY]
+                        через сколько групп сохранять контрольную точку (По
+                        умолч.: 100)
+  --ndjson-file [NDJSON_FILE]
+                        выходной NDJSON файл, пополняемый по мере нахождения
+                        особых групп (По умолч.: None)
+  --snapshot-file [SNAPSHOT_FILE]
+                        файл снимка результатов для инкрементального
+                        повторного поиска (По умолч.: None)
+  --users-file [USERS_FILE]
+                        файл со списком пользователей (по одному в строке)
+                        для поиска по многим пользователям (По умолч.: None)
+  --cache-file [CACHE_FILE]
+                        использовать постоянный кэш ответов ВК в указанном
+                        файле (По умолч.: None)
   -i [INTERACTIVE], --interactive [INTERACTIVE]
                         Интерактивный ввод данных (По умолч.: False)
   --silent [SILENT]     Интерактивный ввод данных (По умолч.: False)
@@ -226,15 +394,77 @@ __version__ = '1.0'
 __all__ = [
     'find_unshared_groups',
     'do_execute_request',
+    'iter_unshared_groups',
+    'find_unshared_groups_batch',
+    'find_unshared_groups_thresholds',
+    'split_by_thresholds',
+    'friends_histogram',
+    'iter_rescan_groups',
+    'ScanCache',
+    'async_find_unshared_groups',
+    'async_iter_unshared_groups',
+    'async_do_execute_request',
+    'groups_per_execute',
+    'member_step',
+    'StepMetrics',
+    'get_step_metrics',
+    'ExecuteLimitError',
+    'VKRequestError',
+    'RetryDeadlineError',
+    'RetryPolicy',
+    'RequestStats',
+    'RateLimiter',
+    'get_rate_limiter',
+    'ApiCache',
+    'make_session',
+    'get_session',
+    'set_default_session',
+    'set_api_url',
+    'minify_vkscript',
+    'vkscript_request',
+    'plan_strategy',
+    'iter_friends_groups',
+    'iter_groups_by_friends',
+    'use_matrix',
+    'friend_slices',
+    'ExecuteRequest',
     'simple_progress'
 ]
 
+from array import array
+import asyncio
+from bisect import bisect_left
+from collections import deque, namedtuple
 import colorama
 from colorama import Fore, Style
+from concurrent.futures import ThreadPoolExecutor
+import copy
+from functools import lru_cache
+import hashlib
 import json
+import os
+import random
+import re
 import requests
+import sqlite3
 import sys
-from time import sleep
+import threading
+from time import monotonic, sleep, time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None # Необязателен, нужен только для асинхронных функций
+    
+try:
+    import orjson
+except ImportError:
+    orjson = None # Необязателен, ускоряет разбор больших ответов
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Необязателен, ускоряет подсчет друзей в группах
 
 ##########################
 # Значения по умолчанию:
@@ -250,7 +480,31 @@ API_VERSION = '5.80' # Изменение данного параметра мо
 MAX_REPEAT_REQUESTS = 10 # Количество повторов запросов при сбоях и ошибках
                          # по умолчанию
                          
-REQUEST_DELAY = 0.5      # Задержка после ошибок
+REQUEST_DELAY = 0.5      # Задержка после первой ошибки
+
+RETRY_BACKOFF = 2        # Во сколько раз растет задержка с каждым повтором
+RETRY_MAX_DELAY = 30     # Максимальная задержка между повторами
+RETRY_JITTER = 0.5       # Случайная доля задержки (0 - задержка постоянна,
+                         # 1 - от нуля до расчетной)
+
+PERMANENT_ERROR_CODES = frozenset({ # Коды ошибок ВК, при которых запрос
+    5,   # авторизация не удалась    # не повторяется
+    7,   # нет прав для выполнения действия
+    12,  # ошибка компиляции кода execute
+    15,  # доступ запрещен
+    17,  # требуется валидация пользователя
+    18,  # страница удалена или заблокирована
+    30,  # профиль является приватным
+    100, # неверный параметр
+    113, # неверный идентификатор пользователя
+    203  # доступ к группе запрещен
+    })
+
+REQUEST_RATE = 3         # Максимальное число запросов в секунду для одного
+                         # ключа доступа. None или 0 - не ограничивать
+                         
+REQUEST_BURST = 1        # Сколько запросов подряд можно отправить без
+                         # задержки после простоя
 
 REQUEST_TIMEOUT = (7, 7) # None, integer или tuple of integer
                          # Задержки timeout
@@ -259,6 +513,32 @@ REQUEST_TIMEOUT = (7, 7) # None, integer или tuple of integer
                          # Кортеж двух чисел - задержка соединения и чтения
                          # Рекомендуется задать не менее 3
 
+POOL_SIZE = 10           # Число соединений с серверами API ВК, которые
+                         # держатся открытыми в сессии по умолчанию
+                         
+POOL_MAX_RETRIES = 0     # Повторы на уровне соединения (urllib3) в сессии
+                         # по умолчанию. Число или urllib3.util.Retry.
+                         # Повторы запросов выполняет do_execute_request
+
+CACHE_FILE = os.path.join('.vk_cache', 'api.sqlite3') # Файл кэша по умолчанию
+
+CACHE_TTL = {                # Время хранения ответов в кэше по типам данных
+    'execute': 3600,         #   (в секундах): прочие запросы,
+    'user_info': 3600,       #   профиль, группы и друзья пользователя,
+    'group_check': 3600,     #   результаты проверки групп,
+    'membership': 6 * 3600,  #   членство друзей в группах,
+    'friends_groups': 6 * 3600, # списки групп друзей,
+    'groups_info': 24 * 3600 #   данные о группах
+    }
+
+CACHE_MAX_SIZE = 256 * 1024 * 1024 # Максимальный размер кэша в байтах
+
+CACHE_EXPIRE_INTERVAL = 60 # Как часто (в секундах) удалять из кэша
+                           # устаревшие записи
+
+FAST_JSON = True         # Разбирать ответы с помощью orjson, если он
+                         # установлен
+
 REQUEST_BASE_PATH = 'https://api.vk.com/method'
 REQUEST_EXECUTE_PATH = f'{REQUEST_BASE_PATH}/execute' # Адреса запросов API ВК
 
@@ -269,14 +549,78 @@ FRIEND_STEP = 5000  # Число друзей в запросе friends.get пр
                     #   данных о пользователе
                     
 FRIEND_LOAD_STEP = 5000 # Число друзей в запросе friends.get при получении
-                        # данных по группе
+                        # данных по группе. Не используется: список друзей
+                        # загружается один раз вместе с общими данными
                         
 FRIEND_IS_MEMBER_STEP = 500 # Число друзей в запросе groups.isMember
 
+MAX_GROUP_STEP = 1000 # Ограничения API ВК на число групп в groups.get,
+MAX_FRIEND_STEP = 5000 #   друзей в friends.get и пользователей в
+MAX_FRIEND_IS_MEMBER_STEP = 500 # groups.isMember
+
+EXECUTE_RUNTIME_ERROR = 13 # Код ошибки ВК при выполнении кода execute.
+                           # Так ВК сообщает и о превышении ограничений
+                           # execute: такие запросы не повторяются, а
+                           # делятся на части
+
+EXECUTE_LIMIT_ERRORS = ('too many api calls', # Сообщения ошибок с кодом
+                        'too many operations', # EXECUTE_RUNTIME_ERROR о
+                        'response size')       # превышении ограничений
+                                               # execute
+
+EXECUTE_SCRIPT_ERRORS = ('is not defined', # Сообщения ошибок с кодом
+                         'not a function') # EXECUTE_RUNTIME_ERROR об
+                                           # ошибках в самом коде execute.
+                                           # Остальные ошибки с этим кодом
+                                           # считаются превышением
+                                           # ограничений
+
+GROUP_INFO_STEP = 500 # Число групп в запросе groups.getById
+
+GROUP_INFO_HOLD = 1.0 # Сколько секунд записи об особых группах могут ждать
+                      # заполнения пачки GROUP_INFO_STEP групп для запроса
+                      # данных о них при выдаче результатов по мере
+                      # нахождения. None - ждать заполнения пачки
+
 MEMBERS_THRESHOLD = 0 # Порог друзей, когда группа еще считается "особой"
 
+THRESHOLDS = (0, 1, 5, 10) # Пороги специфичности по умолчанию для поиска
+                           # сразу по нескольким порогам
+
+MAX_EXECUTE_CALLS = 25 # Максимальное число обращений к API в одном execute
+
+BATCH = False # Проверять несколько групп в одном запросе execute
+
+EXACT_COUNTS = False # Всегда считать точное число друзей в группе. Иначе
+                     # проверка группы прекращается, как только число друзей
+                     # превысит порог специфичности
+
+STRATEGY = 'groups' # Стратегия поиска: 'groups' - проверка членства
+                    # друзей в каждой группе (groups.isMember), 'friends' -
+                    # списки групп друзей (groups.get), 'auto' - более
+                    # дешевая по оценке plan_strategy. 'friends' выполняет
+                    # все запросы до выдачи первой записи, поэтому выбор
+                    # по оценке включается явно
+
+ENGINE = 'auto' # Подсчет друзей в группах по полученным данным о членстве:
+                # 'python' - циклами по словарям, 'numpy' - векторными
+                # операциями над матрицей членства (модуль matrix),
+                # 'auto' - 'numpy', если numpy установлен
+
+HIDDEN_FRIENDS_SHARE = 0.2 # Ожидаемая доля друзей, чьи группы недоступны
+                           # (закрытый профиль, скрытый список групп), для
+                           # оценки стоимости стратегии 'friends'
+
 DEFAULT_LANG = 'ru' # Язык интерфейса
 
+ASYNC_CONCURRENCY = 10 # Число одновременных запросов проверки групп
+                       # в асинхронном режиме
+
+CHECKPOINT_EVERY = 100 # Через сколько проверенных групп сохранять
+                       # контрольную точку
+
+WORKERS = 1 # Число потоков, одновременно выполняющих проверку групп
+
 SILENT = False # "Молчаливый" режим: не выводить дополнительных данных
                # в стандартный поток вывода
 
@@ -284,94 +628,194 @@ SILENT = False # "Молчаливый" режим: не выводить доп
 # Шаблоны VKScript для запросов execute:
 ##########################################
 
-# VKScript запроса на получение общих данных о пользователе
+# Тексты скриптов постоянны: изменяемые данные передаются параметрами
+# запроса execute и доступны в скрипте как Args.<имя> (строки). Перед
+# отправкой тексты один раз минифицируются (см. minify_vkscript,
+# vkscript_request)
+
+# VKScript запроса на получение общих данных о пользователе.
+# Параметры: user_id, group_step, friend_step
 GET_MAIN_USER_INFO_REQUEST_CODE = """
-    var user_id = "{user_id}";
-    var group_step = {group_step};
-    var friend_step = {friend_step};
+    var user_id = Args.user_id;
+    var group_step = parseInt(Args.group_step);
+    var friend_step = parseInt(Args.friend_step);
     
-    var user = API.users.get({{user_ids: user_id}});
+    var user = API.users.get({user_ids: user_id});
     var uid = user[0].id;
     
-    var groups = API.groups.get({{user_id: uid, count: group_step}});
+    var groups = API.groups.get({user_id: uid, count: group_step});
     
     var i = group_step;
     var count = groups.count;
     
     while(i < count)
-    {{
+    {
       groups.items = groups.items
-        + API.groups.get({{user_id:uid, count: group_step, offset: i}})
+        + API.groups.get({user_id:uid, count: group_step, offset: i})
           .items;
       i = i + group_step;
-    }}
+    }
     
-    var friends = API.friends.get({{user_id:uid, count: friend_step}});
+    var friends = API.friends.get({user_id:uid, count: friend_step});
     
     i = friend_step;
     count = friends.count;
     
     while(i < count)
-    {{
+    {
       friends.items = friends.items
-        + API.friends.get({{user_id:uid, count: friend_step, offset: i}})
+        + API.friends.get({user_id:uid, count: friend_step, offset: i})
           .items;
       i = i + friend_step;
-    }}
+    }
     
-    return {{user: user, groups: groups, friends: friends}};
+    return {user: user, groups: groups, friends: friends};
 """
 
-# VKScript запроса на проверку особенности группы:
+# VKScript запроса на проверку особенности группы.
+# Идентификаторы друзей передаются в скрипт готовым списком, полученным
+# запросом GET_MAIN_USER_INFO_REQUEST_CODE, поэтому все обращения к API
+# внутри execute расходуются только на groups.isMember. Данные о группах
+# запрашиваются после проверки и только для особых групп (см.
+# load_groups_info).
+# Друзья заранее разбиты на срезы для groups.isMember (см. friend_slices),
+# поэтому скрипт не делит и не копирует массивы. Число друзей в группе -
+# число единиц в строке флагов членства "0,1,0,...", т.е. число частей
+# после split(1) без одной.
+# Параметры: group_id, friends (срезы через ";", друзья в срезе через
+# запятую), members_threshold, exact (1 или 0)
 CHECK_SPECIAL_GROUP_REQUEST_CODE = """
-    var user_id = "{user_id}";
-    var group_id = "{group_id}";
-    var members_threshold = {members_threshold};
-    var friend_load_step = {friend_load_step};
-    var friend_is_member_step = {friend_is_member_step};
+    var group_id = Args.group_id;
+    var slices = [];
+    if(Args.friends)
+    {
+      slices = Args.friends.split(";");
+    }
+    var members_threshold = parseInt(Args.members_threshold);
+    var exact = parseInt(Args.exact);
     
-    var user = API.users.get({{user_ids: user_id}});
-    var uid = user[0].id;
+    var sum = 0;
+    var slice = 0;
+    var count = slices.length;
     
-    var friends = API.friends.get({{user_id:uid, count: friend_load_step}});
+    while(slice < count && (exact || sum <= members_threshold))
+    {
+      var member_flags =
+        API.groups.isMember({group_id: group_id,
+                             user_ids: slices[slice]})@.member;
+      
+      sum = sum + (member_flags+"").split(1).length-1;
+      
+      slice = slice + 1;
+    }
     
-    var i = friend_load_step;
-    var count = friends.count;
     
-    while(i < count)
-    {{
-      friends.items = friends.items
-        + API.friends.get({{user_id:uid, count: friend_load_step, offset: i}})
-          .items;
-      i = i + friend_load_step;
-    }}
+    return {special_group: (sum <= members_threshold),
+            friends_in_group: sum,
+            exact_count: (slice >= count)};
+"""
+
+# VKScript запроса на проверку особенности нескольких групп сразу.
+# Результат - список ответов в том же порядке, что и group_ids.
+# Параметры те же, что у CHECK_SPECIAL_GROUP_REQUEST_CODE, но вместо
+# group_id - group_ids (через запятую)
+CHECK_SPECIAL_GROUPS_BATCH_REQUEST_CODE = """
+    var group_ids = Args.group_ids.split(",");
+    var slices = [];
+    if(Args.friends)
+    {
+      slices = Args.friends.split(";");
+    }
+    var members_threshold = parseInt(Args.members_threshold);
+    var exact = parseInt(Args.exact);
     
-    var sum = 0;
-    var slice = 0;
-    count = friends.length;
+    var count = slices.length;
+    var results = [];
+    var g = 0;
     
-    while(slice < count)
-    {{
-      var member_flags =
-        API.groups.isMember({{group_id: group_id,
-                             user_ids:
-                                 friends.items.slice(slice,
-                                   slice + friend_is_member_step)
-                             }}
-                           )@.member;
-    
-      sum = sum + ((member_flags+"").split(0)+"").split(1).length-1;
+    while(g < group_ids.length)
+    {
+      var sum = 0;
+      var slice = 0;
+      
+      while(slice < count && (exact || sum <= members_threshold))
+      {
+        var member_flags =
+          API.groups.isMember({group_id: group_ids[g],
+                               user_ids: slices[slice]})@.member;
+        
+        sum = sum + (member_flags+"").split(1).length-1;
+        
+        slice = slice + 1;
+      }
       
-      slice = slice + friend_is_member_step;
-    }}
+      results.push({special_group: (sum <= members_threshold),
+                    friends_in_group: sum,
+                    exact_count: (slice >= count)});
+      g = g + 1;
+    }
+    
+    return results;
+"""
+
+# VKScript запроса на проверку членства в группах для поиска по многим
+# пользователям. Параметр checks - проверки через ";", каждая вида
+# "идентификатор группы:друзья через запятую" и выполняется одним
+# обращением к groups.isMember. Результат - список пар [идентификаторы
+# пользователей, флаги членства]
+CHECK_MEMBERSHIP_REQUEST_CODE = """
+    var checks = Args.checks.split(";");
+    var result = [];
+    var i = 0;
+    
+    while(i < checks.length)
+    {
+      var check = checks[i].split(":");
+      var members = API.groups.isMember({group_id: check[0],
+                                         user_ids: check[1]});
+      result.push([members@.user_id, members@.member]);
+      i = i + 1;
+    }
     
+    return result;
+"""
+
+# VKScript запроса на получение списков групп друзей для поиска по
+# спискам групп друзей (STRATEGY = 'friends'). Параметры: friends - друзья
+# через запятую (не более MAX_EXECUTE_CALLS), count - число групп в
+# groups.get. Результат - ответы groups.get в порядке друзей, false для
+# друзей, чьи группы недоступны
+GET_FRIENDS_GROUPS_REQUEST_CODE = """
+    var friends = Args.friends.split(",");
+    var count = parseInt(Args.count);
+    var result = [];
+    var i = 0;
+    
+    while(i < friends.length)
+    {
+      result.push(API.groups.get({user_id: friends[i], count: count}));
+      i = i + 1;
+    }
+    
+    return result;
+"""
+
+# VKScript запроса на получение данных о группах. Параметр group_ids -
+# части через ";", в каждой не более GROUP_INFO_STEP идентификаторов
+# групп через запятую; каждая часть - одно обращение к groups.getById
+GET_GROUPS_INFO_REQUEST_CODE = """
+    var group_ids = Args.group_ids.split(";");
+    var result = [];
+    var i = 0;
     
-    return {{user: user,
-             special_group: (sum <= members_threshold),
-             friends_in_group: sum,
-             group: API.groups.getById({{group_id: group_id,
-               fields: ["members_count"]}})
-             }};
+    while(i < group_ids.length)
+    {
+      result = result + API.groups.getById({group_ids: group_ids[i],
+                                            fields: "members_count"});
+      i = i + 1;
+    }
+    
+    return result;
 """
 
 ###################################
@@ -422,282 +866,3570 @@ def simple_progress(status):
             write('\n\n')
 
 
-def do_execute_request(code, lang=DEFAULT_LANG, *,
-                       token=TOKEN,
-                       request_delay=REQUEST_DELAY,
-                       request_repeat=MAX_REPEAT_REQUESTS,
-                       request_timeout=REQUEST_TIMEOUT,
-                       **kwarg):
-    """Выполнить запрос к методу execute API ВК
+def groups_per_execute(friends_count, *,
+                       friend_is_member_step=FRIEND_IS_MEMBER_STEP):
+    """Расчет числа групп, которые можно проверить в одном запросе
+    CHECK_SPECIAL_GROUPS_BATCH_REQUEST_CODE, не выходя за ограничение
+    на число обращений к API внутри execute (MAX_EXECUTE_CALLS)
     
     Входные параметры:
-        code:   Текст VKScript для выполнения
-        lang:   Язык, на котором выдавать выходную информацию
-        token:  Ключ доступа API ВК
-        request_delay:  Задержка между запросами при ошибках и сбоях
-        request_repeat: Число повторений запросов при ошибках и сбоях
-        request_timeout: Задержки timeout
-                         None - ждать неограниченно
-                         Одно число - одинаковая задержка соединения/чтения
-                         Кортеж двух чисел - задержка соединения и чтения
-                         Рекомендуется задать не менее 3
-                         
+        friends_count:    число друзей пользователя
+        friend_is_member_step: число друзей в запросе groups.isMember
+        
     Выход:
-        Часть ответа request внутри секции response
+        Число групп в одном запросе (не меньше 1)
         
-    В случае ошибок могут генерироваться исключительные ситуации
-    requests.RequestException
-    
     """
-    response = None
-    for i in range(request_repeat):
-        try:
-            response = requests.post(
-                REQUEST_EXECUTE_PATH,
-                data=dict(
-                        access_token=token,
-                        v=API_VERSION,
-                        lang=lang,
-                        code=code
-                        ),
-                timeout=request_timeout
-                )
-#        except requests.exceptions.ReadTimeout as e:
-#            print('Произошел таймаут при чтении', file=sys.stderr)
-#            response = e
-#        except requests.exceptions.ConnectTimeout as e:
-#            print('Произошел таймаут при соединении', file=sys.stderr)
-#            response = e
-#        except requests.exceptions.ConnectionError as e:
-#            print('Произошла ошибка DNS lookup', file=sys.stderr)
-#            response = e
-        except requests.RequestException as e:
-            print(f'{type(e).__name__}: {e}', file=sys.stderr)
-            response = e
-        if not isinstance(response, Exception) \
-           and not 'error' in response.json():
-               break
-        sleep(request_delay)
-        
-    if isinstance(response, Exception):
-        raise response
-    if 'error' in response.json():
-        raise requests.RequestException(
-                f'VK request error: {response.json()["error"]["error_code"]}. '
-                f'Message: {response.json()["error"]["error_msg"]}'
-                )
+    # groups.isMember по срезам друзей
+    group_calls = max(1, -(-friends_count // friend_is_member_step))
     
-    return response.json()['response']
+    return max(1, MAX_EXECUTE_CALLS // group_calls)
 
 
-def find_unshared_groups(user_id, *,                        
-                         members_threshold=MEMBERS_THRESHOLD,
-                         json_file=DEFAULT_OUTPUT_JSON_FILE,
-                         lang=DEFAULT_LANG,
-                         token=TOKEN,
-                         silent=SILENT,
-                         raise_nouser=True,
-                         progress=simple_progress,                         
-                         group_step=GROUP_STEP,
-                         friend_step=FRIEND_STEP,
-                         friend_load_step=FRIEND_LOAD_STEP,
-                         friend_is_member_step=FRIEND_IS_MEMBER_STEP,
-                         request_delay=REQUEST_DELAY,
-                         request_repeat=MAX_REPEAT_REQUESTS,
-                         request_timeout=REQUEST_TIMEOUT,
-                         **kwarg):
-    """Поиск "особых" групп указанного пользователя. Групп,
-    в которых состоит ограниченное количество его друзей.
+def member_step(friends_count, friend_is_member_step=FRIEND_IS_MEMBER_STEP):
+    """Выбор числа друзей в запросе groups.isMember для проверки группы
+    
+    friend_is_member_step - желаемое число друзей в запросе. Оно
+    увеличивается (но не больше MAX_FRIEND_IS_MEMBER_STEP), если иначе
+    проверка одной группы не укладывается в MAX_EXECUTE_CALLS обращений
+    к API. Затем друзья делятся на срезы равного размера, чтобы последний
+    срез не был почти пустым.
     
     Входные параметры:
-        user_id:           идентификатор пользователя в виде строки/числа
-                           Например: 'eshmargunov', 'id171691064',
-                                     '171691064', 171691064
-        members_threshold: Максимально число пользователей, для которого группа
-                           еще считается особой
-        json_file:         файл для сохранения списка данных об особых группах
-                           Формат json, кодировка utf-8
-                           Если указано значение None выходной файл не
-                           формируется
-        lang:              язык вывода выходных данных
-                           (см. https://vk.com/dev/api_requests)
-        token:             ключ доступа API ВК
-        silent:            "молчаливый" режим - True означает не выводить
-                           дополнительную информацию в стандартный поток вывода
-        raise_nouser:      при значении True, если пользователя с указанным
-                           идентификатором не существует, будет сгенерирована
-                           исключительная ситуация ValueError. При значении
-                           False будет выведено сообщение об ошибке в
-                           стандартный поток ошибок и функция вернет пустой
-                           список групп. В выходной файл также будет сохранен
-                           пустой списко групп.
-        request_delay:     задержка между запросами при ошибках и сбоях
-        request_repeat:    максимальное число повторений запросов при
-                           ошибках и сбоях
-        request_timeout:   задержки timeout
-                           None - ждать неограниченно
-                           Одно число - одинаковая задержка соединения/чтения
-                           Кортеж двух чисел - задержка соединения и чтения
-                           Рекомендуется задать не менее 3
-                         
-            Следующие параметры не рекомендуется изменять:
-        group_step:       число групп читать в запросе groups.get
-        friend_step:      число друзей в запросе friends.get при получении
-                          общих данных о пользователе
-        friend_load_step: число друзей в запросе friends.get при получении
-                          данных по группе
-        friend_is_member_step: число друзей в запросе groups.isMember
-        
-    Возвращаемое значение:
-        
-        Объект json со списком особых групп в кодировке utf-8:
-            
-            [
-                {
-                    "name": "Название группы", 
-                    "gid": "идентификатор группы", 
-                    "members_count": количество_участников_собщества
-                },
-                {
-                …
-                }
-            ]
-            
-        Файл такого же формата может сохраняться на носитель информации в
-        соответствии с установкой параметра json_file
+        friends_count:         число друзей для проверки
+        friend_is_member_step: желаемое число друзей в запросе
         
-    Функция может генерировать исключительные ситуации:
-        - При отсутсвии пользователя с указанным идентификатором и
-          соответсвующей установке параметра raise_nouser (ValueError)
-        - Исключительные ситуации Request при повторах ошибочных ответов
-          серверов ВК или сбоях передачи данных, ошибках DNS lookup.
+    Выход:
+        Число друзей в запросе groups.isMember (не меньше 1)
         
     """
+    if friends_count <= 0:
+        return max(1, min(friend_is_member_step, MAX_FRIEND_IS_MEMBER_STEP))
     
-    if not(is_in_ipython() or is_a_tty()): silent = True
+    step = min(max(friend_is_member_step,
+                   -(-friends_count // MAX_EXECUTE_CALLS)),
+               MAX_FRIEND_IS_MEMBER_STEP)
+    slices = -(-friends_count // step)
     
-    progress(0)
+    return -(-friends_count // slices)
+
+
+class StepMetrics:
+    """Статистика выбранных размеров частей запросов: числа друзей в
+    запросе groups.isMember, числа групп в запросе execute и числа
+    делений запросов после ошибок превышения ограничений execute (см.
+    ExecuteLimitError). Потокобезопасен.
     
-    code = GET_MAIN_USER_INFO_REQUEST_CODE.format(
-                user_id=user_id,
-                group_step=group_step,
-                friend_step=friend_step
-                )
-    user_info = do_execute_request(code, lang, token=token,
-                                   request_delay=request_delay,
-                                   request_repeat=request_repeat,
-                                   request_timeout=request_timeout)
+    Общий для модуля объект возвращает get_step_metrics.
     
-    special_groups = []
+    """
     
-    if not user_info['user']:
-        progress(100)
-        if(raise_nouser):
-            raise ValueError(f'Пользователя {user_id} не существует')
-        else:
-            print(f'Пользователя {user_id} не существует', file=sys.stderr) 
-    elif 'deactivated' in user_info['user'][0]:
-        progress(100)
-        if(raise_nouser):
-            raise ValueError(f'Пользователь {user_id} деактивирован '
-                             f'({user_info["user"][0]["deactivated"]})')
-        else:
-            print(f'Пользователь {user_id} деактивирован '
-                  f'({user_info["user"][0]["deactivated"]})',
-                  file=sys.stderr) 
-    else:
-        
-        progress_status = (user_info['groups']['count'] + 1) / 100
-        progress_step = 1 / progress_status
-        progress(progress_status)
-
-        if not silent:
-            print(f'\n{Fore.RED}Пользователь {user_id}:{Style.RESET_ALL}\n'
-                  f'\t{user_info["user"][0]["last_name"]}, '
-                  f'{user_info["user"][0]["first_name"]}\n'
-                  f'\t(id: {user_info["user"][0]["id"]})\n'
-                  f'Состоит в {user_info["groups"]["count"]} группах, '
-                  f'{user_info["friends"]["count"]} друзей\n',
-                  flush=True)
-        
-        for group in user_info['groups']['items']:
-            code = CHECK_SPECIAL_GROUP_REQUEST_CODE.format(
-                        user_id=user_id,
-                        group_id=group,
-                        members_threshold=members_threshold,
-                        friend_load_step=friend_load_step,
-                        friend_is_member_step=friend_is_member_step
-                        )
-            group_info = do_execute_request(code, lang,
-                                            token=token,
-                                            request_delay=request_delay,
-                                            request_repeat=request_repeat,
-                                            request_timeout=request_timeout)
-            
-            progress_status += progress_step
-            progress(progress_status)
-            
-            if(group_info['special_group']):
-                special_groups.append(dict(
-                        name = group_info['group'][0]['name'],
-                        gid = group_info['group'][0]['id'],
-                        members_count = group_info['group'][0]['members_count']
-                        ))
-                if not silent:
-                    print(f'\n{Fore.CYAN}Группа:{Style.RESET_ALL}\n'
-                          f'{Fore.GREEN}'
-                          f'\t{group_info["group"][0]["name"]}\n'
-                          f'{Fore.YELLOW}'
-                          f'\t{group_info["group"][0]["screen_name"]} '
-                          f'{Fore.RED}'
-                          f'(id: {group_info["group"][0]["id"]})\n'
-                          f'{Style.RESET_ALL}'
-                          f'\t{group_info["group"][0]["members_count"]}'
-                          f' членов\n'
-                          f'\t{group_info["friends_in_group"]} друзей\n',
-                          flush=True)
-                    
-        progress(100)
-                
-        if not silent:
-            print(f'{Fore.RED}Всего групп: '
-                  f'{user_info["groups"]["count"]}{Style.RESET_ALL}')
-            print(f'{Fore.RED}Из них особых групп: '
-                  f'{len(special_groups)}{Style.RESET_ALL}')
-            
-    if json_file:
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(special_groups, f,
-                      indent=4, ensure_ascii=False)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Обнуление статистики"""
+        with self._lock:
+            self.member_steps = {}  # число друзей в isMember -> число групп
+            self.chunk_sizes = {}   # число групп в execute -> число запросов
+            self.splits = 0         # число делений запросов на части
+            self.step_fallbacks = 0 # повторы с максимальными шагами
     
-    return json.dumps(special_groups, indent=4, ensure_ascii=False)
+    def record_member_step(self, step, groups=1):
+        """Учет выбранного числа друзей в запросе groups.isMember"""
+        with self._lock:
+            self.member_steps[step] = self.member_steps.get(step, 0) + groups
+    
+    def record_chunk(self, size):
+        """Учет числа групп, проверяемых одним запросом execute"""
+        with self._lock:
+            self.chunk_sizes[size] = self.chunk_sizes.get(size, 0) + 1
+    
+    def record_split(self):
+        """Учет деления запроса на части"""
+        with self._lock:
+            self.splits += 1
+    
+    def record_fallback(self):
+        """Учет повтора запроса с максимальными шагами"""
+        with self._lock:
+            self.step_fallbacks += 1
+    
+    def stats(self):
+        """Статистика в виде словаря"""
+        with self._lock:
+            return dict(member_steps=dict(self.member_steps),
+                        chunk_sizes=dict(self.chunk_sizes),
+                        splits=self.splits,
+                        step_fallbacks=self.step_fallbacks)
 
-# Инициализация colorama, которая используется 
-# для управления выводом эскейп последоваетльностей управления терминалом
-# и перенаправлением их в Windows Api вызовы. Чтобы не заниматься этим вручну.
-# Используется для цветного вывода
-if is_in_ipython():
-    colorama.init(convert=False, strip=False)
-else:
-    colorama.init()
 
+_step_metrics = StepMetrics()
 
-if __name__ == '__main__':
+
+def get_step_metrics():
+    """Общий для модуля объект StepMetrics"""
+    return _step_metrics
+
+
+class RateLimiter:
+    """Потокобезопасный ограничитель частоты запросов по алгоритму
+    token bucket. Запросы не отправляются чаще, чем rate раз в секунду,
+    после простоя допускается до burst запросов подряд.
     
-    # Разбор командной строки
+    Место в очереди резервируется сразу при вызове reserve, поэтому
+    одновременно ожидающие потоки получают последовательные интервалы,
+    а не просыпаются все вместе.
     
-    import argparse
+    """
     
-    def str2bool(value):
-        """Форматирование булевых значений командной строки"""
-        if value.lower() in \
-            ('yes', 'true', 't', 'y', '1', 'д', 'да', 'истина'):
-            return True
-        elif value.lower() in \
-            ('no', 'false', 'f', 'n', '0', 'н', 'нет', 'ложь'):
-            return False
-        else:
-            raise argparse.ArgumentTypeError('Ожидалось логическое значение')
+    def __init__(self, rate=REQUEST_RATE, burst=REQUEST_BURST):
+        """Входные параметры:
+            rate:  максимальное число запросов в секунду
+            burst: емкость "ведра" - число запросов, которые можно
+                   отправить подряд без задержки
+                   
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._time = monotonic()
+        self._lock = threading.Lock()
+        
+    def reserve(self):
+        """Зарезервировать право на один запрос.
+        
+        Выход:
+            Время в секундах, которое нужно выждать перед отправкой запроса
+            
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._time) * self.rate)
+            self._time = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+        
+    def acquire(self):
+        """Дождаться возможности отправить запрос"""
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(token, rate=REQUEST_RATE):
+    """Получить общий для всех вызывающих ограничитель частоты запросов
+    для ключа доступа token. При первом обращении ограничитель создается,
+    при последующих - возвращается тот же объект с обновленной частотой.
+    
+    Входные параметры:
+        token: ключ доступа API ВК
+        rate:  максимальное число запросов в секунду
+        
+    Выход:
+        Объект RateLimiter или None, если rate равно None или 0
+        
+    """
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(token)
+        if limiter is None:
+            limiter = _rate_limiters[token] = RateLimiter(rate)
+        elif limiter.rate != rate:
+            with limiter._lock:
+                limiter.rate = rate
+        return limiter
+
+
+def json_loads(data, fast=FAST_JSON):
+    """Разбор json из строки или байтов. При fast=True используется
+    orjson, если он установлен, иначе стандартный модуль json"""
+    if fast and orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compact_id_arrays(response):
+    """Замена в ответе API ВК списков целочисленных идентификаторов
+    в полях items на массивы array('q'). Массив хранит числа подряд
+    и занимает в несколько раз меньше памяти, чем список объектов int
+    (актуально для списков из тысяч друзей и групп). Обрабатываются
+    словари любой вложенности, списки объектов не просматриваются.
+    
+    Выход:
+        Тот же объект response
+        
+    """
+    if isinstance(response, dict):
+        for key, value in response.items():
+            if key == 'items' and isinstance(value, list) \
+               and all(type(item) is int for item in value):
+                response[key] = array('q', value)
+            else:
+                compact_id_arrays(value)
+    return response
+
+
+class ApiCache:
+    """Постоянный кэш ответов API ВК в базе SQLite на диске.
+    
+    Записи хранятся по ключу, построенному из метода и параметров запроса
+    и ключа доступа, и устаревают по истечении времени, заданного для типа
+    данных (см. CACHE_TTL). Общий размер хранимых ответов ограничен
+    max_size байт: при превышении удаляются записи, к которым дольше всего
+    не обращались (LRU). Устаревшие записи удаляются не чаще раза в
+    CACHE_EXPIRE_INTERVAL секунд. Потокобезопасен.
+    
+    Атрибуты hits и misses - число найденных и не найденных в кэше
+    записей (по типам данных - в словарях type_hits и type_misses).
+    
+    """
+    
+    def __init__(self, path=CACHE_FILE, *, ttl=None, max_size=CACHE_MAX_SIZE):
+        """Входные параметры:
+            path:     файл базы данных кэша. Каталог создается при
+                      необходимости
+            ttl:      словарь {тип данных: время хранения в секундах},
+                      дополняющий и переопределяющий CACHE_TTL
+            max_size: максимальный общий размер ответов в кэше в байтах
+            
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.ttl = dict(CACHE_TTL, **(ttl or {}))
+        self.max_size = max_size
+        self.hits = self.misses = 0
+        self.type_hits = {}
+        self.type_misses = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, type TEXT, value BLOB, '
+                         'size INTEGER, created REAL, accessed REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed '
+                         'ON entries (accessed)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_created '
+                         'ON entries (type, created)')
+        self._size = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        self._expire_time = 0
+    
+    @staticmethod
+    def key(method, *params):
+        """Ключ записи по методу и параметрам запроса"""
+        return hashlib.sha1(json.dumps([method, *params], ensure_ascii=False)
+                            .encode('utf-8')).hexdigest()
+    
+    def get(self, key, data_type='execute'):
+        """Получение записи из кэша
+        
+        Выход:
+            Сохраненный ответ или None, если записи нет или она устарела
+            
+        """
+        now = time()
+        with self._lock:
+            row = self._db.execute(
+                    'SELECT value, created FROM entries WHERE key = ?',
+                    (key,)).fetchone()
+            if row is not None and now - row[1] > self._ttl(data_type):
+                self._delete(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                self.type_misses[data_type] = \
+                    self.type_misses.get(data_type, 0) + 1
+                return None
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                             (now, key))
+            self.hits += 1
+            self.type_hits[data_type] = self.type_hits.get(data_type, 0) + 1
+        return json_loads(row[0])
+    
+    def put(self, key, data_type, value):
+        """Сохранение ответа value в кэше"""
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.max_size:
+            return
+        now = time()
+        with self._lock:
+            self._delete(key)
+            self._db.execute('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, data_type, data, len(data), now, now))
+            self._size += len(data)
+            if now >= self._expire_time:
+                self._expire(now)
+            if self._size > self.max_size:
+                self._evict()
+    
+    def clear(self):
+        """Удаление всех записей"""
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+            self._size = 0
+    
+    def close(self):
+        """Закрытие базы данных кэша"""
+        with self._lock:
+            self._db.close()
+    
+    def stats(self):
+        """Статистика использования кэша в виде словаря"""
+        with self._lock:
+            entries = self._db.execute(
+                    'SELECT COUNT(*) FROM entries').fetchone()[0]
+            return dict(hits=self.hits, misses=self.misses,
+                        type_hits=dict(self.type_hits),
+                        type_misses=dict(self.type_misses),
+                        entries=entries, size=self._size,
+                        max_size=self.max_size)
+    
+    def _ttl(self, data_type):
+        return self.ttl.get(data_type, self.ttl['execute'])
+    
+    def _delete(self, key):
+        row = self._db.execute('SELECT size FROM entries WHERE key = ?',
+                               (key,)).fetchone()
+        if row is not None:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._size -= row[0]
+    
+    def _delete_where(self, condition, params):
+        """Удаление записей, удовлетворяющих условию SQL condition"""
+        size = self._db.execute(
+                f'SELECT COALESCE(SUM(size), 0) FROM entries '
+                f'WHERE {condition}', params).fetchone()[0]
+        if size:
+            self._db.execute(f'DELETE FROM entries WHERE {condition}',
+                             params)
+            self._size -= size
+    
+    def _expire(self, now):
+        """Удаление устаревших записей всех типов данных по индексу
+        (type, created)"""
+        for data_type, ttl in self.ttl.items():
+            self._delete_where('type = ? AND created < ?',
+                               (data_type, now - ttl))
+        types = list(self.ttl)
+        self._delete_where(
+                f'type NOT IN ({", ".join("?" * len(types))}) '
+                f'AND created < ?',
+                (*types, now - self._ttl('execute')))
+        self._expire_time = now + CACHE_EXPIRE_INTERVAL
+    
+    def _evict(self):
+        """Удаление давно не использованных записей, пока размер кэша
+        превышает max_size"""
+        while self._size > self.max_size:
+            rows = self._db.execute(
+                    'SELECT key, size FROM entries ORDER BY accessed '
+                    'LIMIT 100').fetchall()
+            if not rows:
+                break
+            keys = []
+            size = self._size
+            for key, row_size in rows:
+                keys.append(key)
+                size -= row_size
+                if size <= self.max_size:
+                    break
+            self._delete_where(
+                    f'key IN ({", ".join("?" * len(keys))})', keys)
+
+
+def make_session(pool_size=POOL_SIZE, max_retries=POOL_MAX_RETRIES):
+    """Создать сессию requests для обращений к API ВК. Сессия держит
+    соединения открытыми (keep-alive) и повторно использует их для
+    следующих запросов, не тратя время на установку TCP и TLS соединения.
+    
+    Входные параметры:
+        pool_size:   максимальное число одновременно открытых соединений.
+                     Должно быть не меньше числа потоков, выполняющих
+                     запросы через сессию
+        max_retries: повторы на уровне соединения (число или объект
+                     urllib3.util.Retry)
+                     
+    Выход:
+        Объект requests.Session
+        
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=pool_size,
+                                            max_retries=max_retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Получить сессию requests по умолчанию, общую для всех запросов
+    модуля. Создается при первом обращении функцией make_session"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def set_default_session(session):
+    """Заменить сессию requests по умолчанию, например, сессией с другими
+    настройками make_session. Предыдущая сессия закрывается"""
+    global _session
+    with _session_lock:
+        if _session is not None and _session is not session:
+            _session.close()
+        _session = session
+
+
+def set_api_url(url=None):
+    """Заменить адрес запросов execute, например, адресом локального
+    сервера fakevk.FakeVKServer для проверки и замеров. None -
+    восстановить адрес API ВК"""
+    global REQUEST_EXECUTE_PATH
+    REQUEST_EXECUTE_PATH = url or f'{REQUEST_BASE_PATH}/execute'
+
+
+class VKRequestError(requests.RequestException):
+    """Ошибка, которую вернул API ВК. Атрибут error_code - код ошибки
+    ВК"""
+    
+    def __init__(self, error):
+        self.error_code = error.get('error_code')
+        super().__init__(f'VK request error: {self.error_code}. '
+                         f'Message: {error.get("error_msg")}')
+
+
+class RetryDeadlineError(requests.RequestException):
+    """Запрос не выполнен до истечения общего времени поиска (см.
+    RetryPolicy)"""
+
+
+class ExecuteLimitError(VKRequestError):
+    """Ошибка ВК о превышении ограничений запроса execute: числа
+    обращений к API, числа операций или размера ответа (см.
+    is_execute_limit_error). Повтор того же запроса бесполезен, его нужно
+    разделить на части"""
+
+
+class RetryPolicy:
+    """Политика повторов запросов к API ВК при ошибках и сбоях.
+    
+    Постоянные ошибки (неверный ключ доступа, нет доступа, приватный
+    профиль и т.п., см. PERMANENT_ERROR_CODES, а также неверный адрес
+    запроса) не повторяются. Остальные ошибки повторяются не более
+    retries раз с экспоненциально растущей задержкой со случайной
+    составляющей, чтобы многие потоки не повторяли запросы одновременно.
+    
+    Если задан deadline, то запросы, которые не успевают выполниться до
+    истечения deadline секунд с момента создания политики, прерываются
+    исключительной ситуацией RetryDeadlineError. Одну политику с общим
+    сроком можно использовать для всех запросов одного поиска (см.
+    with_deadline).
+    
+    Для изменения политики можно переопределить методы is_permanent и
+    delay в наследнике.
+    
+    """
+    
+    # Сбои запросов, повтор которых бесполезен
+    PERMANENT_EXCEPTIONS = (requests.exceptions.InvalidURL,
+                            requests.exceptions.InvalidSchema,
+                            requests.exceptions.MissingSchema,
+                            requests.exceptions.InvalidHeader)
+    
+    def __init__(self, retries=MAX_REPEAT_REQUESTS, delay=REQUEST_DELAY, *,
+                 backoff=RETRY_BACKOFF,
+                 max_delay=RETRY_MAX_DELAY,
+                 jitter=RETRY_JITTER,
+                 permanent_codes=PERMANENT_ERROR_CODES,
+                 deadline=None):
+        self.retries = retries
+        self.base_delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.permanent_codes = frozenset(permanent_codes)
+        self.deadline_at = None
+        if deadline:
+            self.deadline_at = monotonic() + deadline
+    
+    def with_deadline(self, deadline):
+        """Копия политики с общим сроком выполнения deadline секунд,
+        отсчитываемым с текущего момента. При deadline=None возвращается
+        сама политика"""
+        if not deadline:
+            return self
+        policy = copy.copy(self)
+        policy.deadline_at = monotonic() + deadline
+        return policy
+    
+    def is_permanent(self, error):
+        """Является ли ошибка постоянной. error - словарь error из
+        ответа ВК или исключительная ситуация"""
+        if isinstance(error, Exception):
+            return isinstance(error, self.PERMANENT_EXCEPTIONS)
+        return error.get('error_code') in self.permanent_codes
+    
+    def delay(self, attempt):
+        """Задержка перед повтором после неудачной попытки attempt
+        (считая с 0)"""
+        delay = min(self.max_delay,
+                    self.base_delay * self.backoff ** attempt)
+        return delay * (1 - self.jitter) \
+               + random.uniform(0, delay * self.jitter)
+    
+    def remaining(self):
+        """Оставшееся до истечения срока время в секундах или None,
+        если срок не задан"""
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - monotonic()
+    
+    def check_deadline(self, pause=0):
+        """Генерирует RetryDeadlineError, если после паузы pause срок
+        будет исчерпан"""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= pause:
+            raise RetryDeadlineError('Scan deadline exceeded')
+
+
+def is_execute_limit_error(error):
+    """Проверка, является ли ошибка из ответа ВК ошибкой превышения
+    ограничений execute. Решает код ошибки EXECUTE_RUNTIME_ERROR, текст
+    сообщения только уточняет его: ошибка с известным сообщением об
+    ошибке в коде (EXECUTE_SCRIPT_ERRORS) не считается превышением, если
+    в нем нет и сообщения о превышении (EXECUTE_LIMIT_ERRORS). Поэтому
+    измененный текст сообщения о превышении не мешает делить запрос"""
+    if error.get('error_code') != EXECUTE_RUNTIME_ERROR:
+        return False
+    message = str(error.get('error_msg', '')).lower()
+    if any(text in message for text in EXECUTE_LIMIT_ERRORS):
+        return True
+    return not any(text in message for text in EXECUTE_SCRIPT_ERRORS)
+
+
+class RequestStats:
+    """Сводная статистика запросов execute. Объект можно передать как
+    функцию on_request: каждый вызов учитывает запись о запросе (см.
+    do_execute_request). Потокобезопасен.
+    
+    Входные параметры:
+        on_request: функция, которой дополнительно передаются записи о
+                    запросах после учета
+                    
+    Статистику в виде словаря возвращает stats, в формате json - to_json,
+    в текстовом формате Prometheus - to_prometheus.
+    
+    Полное время выполнения запросов учитывается гистограммой с
+    постоянными границами LATENCY_BUCKETS, поэтому память не растет с
+    числом запросов, а квантили оцениваются по гистограмме.
+    
+    """
+    
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, # Верхние границы
+                       1.0, 1.5, 2.5, 5.0, 10.0,   # интервалов гистограммы
+                       30.0, 60.0)                 # времени выполнения
+                                                   # запросов, секунды
+    QUANTILES = (0.5, 0.9, 0.99) # Квантили времени выполнения запросов
+    
+    def __init__(self, on_request=None):
+        self.on_request = on_request
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Обнуление статистики"""
+        with self._lock:
+            self.scripts = {} # тип запроса -> сводные данные
+            self.errors = {}  # код ошибки -> число неудачных попыток
+            self.histograms = {} # тип запроса -> [числа запросов по
+                                 # интервалам LATENCY_BUCKETS и выше
+                                 # последней границы, сумма времени]
+    
+    def __call__(self, record):
+        with self._lock:
+            script = self.scripts.setdefault(record['script'], dict(
+                        requests=0, cached=0, failed=0, attempts=0,
+                        retries=0, payload_bytes=0, response_bytes=0,
+                        latency=0.0, elapsed=0.0, rate_wait=0.0,
+                        retry_sleep=0.0))
+            script['requests'] += 1
+            script['cached'] += record['cached']
+            script['failed'] += record['error_code'] is not None
+            for key in ('attempts', 'retries', 'payload_bytes',
+                        'response_bytes', 'latency', 'elapsed',
+                        'rate_wait', 'retry_sleep'):
+                script[key] += record[key]
+            if not record['cached']:
+                histogram = self.histograms.setdefault(
+                        record['script'],
+                        [[0] * (len(self.LATENCY_BUCKETS) + 1), 0.0])
+                histogram[0][bisect_left(self.LATENCY_BUCKETS,
+                                         record['elapsed'])] += 1
+                histogram[1] += record['elapsed']
+            for code in record['error_codes']:
+                self.errors[code] = self.errors.get(code, 0) + 1
+        if self.on_request is not None:
+            self.on_request(record)
+    
+    def _quantile(self, counts, q):
+        """Оценка квантиля q по числам запросов counts в интервалах
+        LATENCY_BUCKETS: линейная интерполяция внутри интервала, как в
+        histogram_quantile Prometheus. Для пустой гистограммы - None"""
+        rank = q * sum(counts)
+        if not rank:
+            return None
+        lower = 0.0
+        for upper, count in zip(self.LATENCY_BUCKETS, counts):
+            if count and rank <= count:
+                return lower + (upper - lower) * rank / count
+            rank -= count
+            lower = upper
+        return lower
+    
+    def stats(self):
+        """Статистика в виде словаря: по типам запросов (ключ scripts),
+        итоги (total) и число неудачных попыток по кодам ошибок (errors).
+        Времена в секундах, quantiles - оценки квантилей полного времени
+        выполнения запроса, histogram - гистограмма этого времени для
+        запросов не из кэша: накопленные числа запросов buckets по
+        верхним границам интервалов, их число count и сумма времени sum"""
+        with self._lock:
+            scripts = {}
+            total = {}
+            empty = [[0] * (len(self.LATENCY_BUCKETS) + 1), 0.0]
+            for name, script in self.scripts.items():
+                counts, seconds = self.histograms.get(name, empty)
+                scripts[name] = dict(script)
+                for key, value in script.items():
+                    total[key] = total.get(key, 0) + value
+                cumulative = 0
+                buckets = {}
+                for upper, count in zip(self.LATENCY_BUCKETS + ('+Inf',),
+                                        counts):
+                    cumulative += count
+                    buckets[str(upper)] = cumulative
+                scripts[name]['quantiles'] = {
+                        str(q): self._quantile(counts, q)
+                        for q in self.QUANTILES}
+                scripts[name]['histogram'] = dict(buckets=buckets,
+                                                  count=cumulative,
+                                                  sum=seconds)
+            return dict(scripts=scripts, total=total,
+                        errors={str(code): count for code, count
+                                in self.errors.items()})
+    
+    def to_json(self):
+        """Статистика в формате json"""
+        return json.dumps(self.stats(), ensure_ascii=False, indent=4)
+    
+    def to_prometheus(self, prefix='unshared_vk'):
+        """Статистика в текстовом формате Prometheus. В значениях меток
+        экранируются обратная косая черта, кавычки и перевод строки"""
+        stats = self.stats()
+        lines = []
+        
+        def escape(label):
+            return str(label).replace('\\', '\\\\') \
+                             .replace('"', '\\"').replace('\n', '\\n')
+        
+        def metric(name, kind, text, values):
+            lines.append(f'# HELP {prefix}_{name} {text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in values:
+                label_text = ','.join(f'{key}="{escape(label)}"'
+                                      for key, label in labels)
+                lines.append(f'{prefix}_{name}{{{label_text}}} {value}'
+                             if label_text else f'{prefix}_{name} {value}')
+        
+        scripts = stats['scripts'].items()
+        for name, key, kind, text in (
+                ('requests_total', 'requests', 'counter',
+                 'Запросы execute'),
+                ('cached_requests_total', 'cached', 'counter',
+                 'Запросы, ответ на которые взят из кэша'),
+                ('failed_requests_total', 'failed', 'counter',
+                 'Запросы, завершившиеся ошибкой'),
+                ('retries_total', 'retries', 'counter',
+                 'Повторы запросов'),
+                ('payload_bytes_total', 'payload_bytes', 'counter',
+                 'Размер отправленного кода VKScript'),
+                ('response_bytes_total', 'response_bytes', 'counter',
+                 'Размер полученных ответов'),
+                ('http_seconds_total', 'latency', 'counter',
+                 'Время обмена с сервером'),
+                ('rate_wait_seconds_total', 'rate_wait', 'counter',
+                 'Ожидание из-за ограничения частоты запросов'),
+                ('retry_sleep_seconds_total', 'retry_sleep', 'counter',
+                 'Паузы перед повторами запросов')):
+            metric(name, kind, text,
+                   [((('script', script),), values[key])
+                    for script, values in scripts])
+        
+        lines.append(f'# HELP {prefix}_request_seconds Полное время '
+                     f'выполнения запросов')
+        lines.append(f'# TYPE {prefix}_request_seconds histogram')
+        for script, script_stats in scripts:
+            histogram = script_stats['histogram']
+            script = escape(script)
+            for upper, count in histogram['buckets'].items():
+                lines.append(f'{prefix}_request_seconds_bucket{{script='
+                             f'"{script}",le="{upper}"}} {count}')
+            lines.append(f'{prefix}_request_seconds_sum{{script='
+                         f'"{script}"}} {histogram["sum"]}')
+            lines.append(f'{prefix}_request_seconds_count{{script='
+                         f'"{script}"}} {histogram["count"]}')
+        
+        metric('errors_total', 'counter',
+               'Неудачные попытки запросов по кодам ошибок',
+               [((('code', code),), count)
+                for code, count in stats['errors'].items()])
+        
+        return '\n'.join(lines) + '\n'
+
+
+# Запрос execute: минифицированный текст VKScript code и словарь args
+# параметров, доступных в скрипте как Args.<имя>
+ExecuteRequest = namedtuple('ExecuteRequest', ['code', 'args'])
+
+_VKSCRIPT_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_VKSCRIPT_SPACE = re.compile(r'\s*([^\w$\s])\s*')
+
+
+@lru_cache(maxsize=None)
+def minify_vkscript(code):
+    """Минификация текста VKScript: пробельные символы вне строковых
+    литералов сжимаются до одного пробела, а вокруг знаков препинания и
+    операторов удаляются. Результат для каждого текста вычисляется один
+    раз и затем берется из кэша"""
+    parts = _VKSCRIPT_STRING.split(code)
+    for index in range(0, len(parts), 2):
+        parts[index] = _VKSCRIPT_SPACE.sub(r'\1',
+                                           ' '.join(parts[index].split()))
+    return ''.join(parts).strip()
+
+
+def vkscript_request(template, **args):
+    """Запрос execute по постоянному шаблону VKScript template (например,
+    CHECK_SPECIAL_GROUP_REQUEST_CODE) и параметрам args, доступным в
+    скрипте как Args.<имя>. Значения приводятся к строкам: True и False -
+    к 1 и 0, списки, кортежи и массивы array - к элементам через запятую
+    
+    Выход:
+        Объект ExecuteRequest для do_execute_request
+        
+    """
+    return ExecuteRequest(minify_vkscript(template),
+                          {name: _vkscript_arg(value)
+                           for name, value in args.items()})
+
+
+def _vkscript_arg(value):
+    """Значение параметра Args запроса execute"""
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (list, tuple, array)):
+        return ','.join(map(str, value))
+    return str(value)
+
+
+def _execute_request(code):
+    """Объект ExecuteRequest по тексту VKScript или готовому запросу"""
+    if isinstance(code, ExecuteRequest):
+        return code
+    return ExecuteRequest(code, {})
+
+
+def _execute_cache_key(api_cache, lang, request, token):
+    """Ключ кэша ответа на запрос execute. Ответы зависят от того, чьим
+    ключом доступа token они получены (закрытые профили, списки друзей),
+    поэтому ключ доступа входит в ключ записи (только в виде хэша)"""
+    if request.args:
+        return api_cache.key('execute', lang, request.code, request.args,
+                             token)
+    return api_cache.key('execute', lang, request.code, token)
+
+
+def _request_trace(request, cache_type):
+    """Начальная запись о запросе для функции on_request"""
+    payload = len(request.code.encode('utf-8')) \
+              + sum(len(name) + len(value.encode('utf-8'))
+                    for name, value in request.args.items())
+    return dict(script=cache_type,
+                payload_bytes=payload,
+                response_bytes=0,
+                latency=0.0,
+                elapsed=0.0,
+                attempts=0,
+                retries=0,
+                error_code=None,
+                error_codes=[],
+                rate_wait=0.0,
+                retry_sleep=0.0,
+                cached=False,
+                started=monotonic())
+
+
+def _trace_error(trace, response):
+    """Учет неудачной попытки запроса в записи о запросе"""
+    if isinstance(response, Exception):
+        code = getattr(response, 'error_code', None) \
+               or type(response).__name__
+    else:
+        code = response['error'].get('error_code')
+    trace['error_codes'].append(code)
+
+
+def _finish_trace(trace, on_request, success):
+    """Завершение записи о запросе и передача ее в on_request"""
+    trace['elapsed'] = monotonic() - trace.pop('started')
+    trace['retries'] = max(0, trace['attempts'] - 1)
+    if not success and trace['error_codes']:
+        trace['error_code'] = trace['error_codes'][-1]
+    elif not success:
+        trace['error_code'] = 'error'
+    on_request(trace)
+
+
+def retry_pause(retry_policy, response, attempt):
+    """Пауза перед повтором запроса после неудачной попытки attempt
+    (считая с 0). response - ответ ВК с ошибкой или исключительная
+    ситуация.
+    
+    Выход:
+        Пауза в секундах или None, если запрос повторять не нужно. При
+        превышении ограничений execute генерируется ExecuteLimitError,
+        при исчерпании срока политики повторов - RetryDeadlineError
+        
+    """
+    error = response if isinstance(response, Exception) else response['error']
+    if not isinstance(error, Exception) and is_execute_limit_error(error):
+        raise ExecuteLimitError(error)
+    if retry_policy.is_permanent(error) \
+       or attempt + 1 >= retry_policy.retries:
+        return None
+    pause = retry_policy.delay(attempt)
+    retry_policy.check_deadline(pause)
+    return pause
+
+
+def do_execute_request(code, lang=DEFAULT_LANG, *,
+                       token=TOKEN,
+                       request_delay=REQUEST_DELAY,
+                       request_repeat=MAX_REPEAT_REQUESTS,
+                       request_timeout=REQUEST_TIMEOUT,
+                       request_rate=REQUEST_RATE,
+                       retry_policy=None,
+                       on_request=None,
+                       session=None,
+                       api_cache=None,
+                       fast_json=FAST_JSON,
+                       compact_items=False,
+                       cache_type='execute',
+                       **kwarg):
+    """Выполнить запрос к методу execute API ВК
+    
+    Входные параметры:
+        code:   Текст VKScript для выполнения или объект ExecuteRequest
+                (см. vkscript_request) с параметрами Args
+        lang:   Язык, на котором выдавать выходную информацию
+        token:  Ключ доступа API ВК
+        request_delay:  Задержка перед первым повтором при ошибках и сбоях
+        request_repeat: Число повторений запросов при ошибках и сбоях
+        request_timeout: Задержки timeout
+                         None - ждать неограниченно
+                         Одно число - одинаковая задержка соединения/чтения
+                         Кортеж двух чисел - задержка соединения и чтения
+                         Рекомендуется задать не менее 3
+        request_rate:   Максимальное число запросов в секунду для token.
+                        Ограничение общее для всех потоков, использующих
+                        тот же ключ доступа. None или 0 - не ограничивать
+        retry_policy:   Объект RetryPolicy. Если не указан, используется
+                        RetryPolicy(request_repeat, request_delay)
+        on_request:     Функция, которая вызывается по завершении запроса
+                        (успешном или нет) со словарем-записью о нем:
+                            script:         тип запроса (cache_type)
+                            payload_bytes:  размер кода VKScript и
+                                            параметров Args
+                            response_bytes: размер полученных ответов
+                            latency:        время обмена с сервером
+                            elapsed:        полное время выполнения
+                            attempts:       число попыток
+                            retries:        число повторов
+                            error_code:     код ошибки ВК или имя
+                                            исключительной ситуации, если
+                                            запрос не выполнен, иначе None
+                            error_codes:    ошибки всех неудачных попыток
+                            rate_wait:      ожидание из-за ограничения
+                                            частоты запросов
+                            retry_sleep:    паузы перед повторами
+                            cached:         ответ взят из кэша
+                        Времена в секундах. Готовая сводная статистика -
+                        класс RequestStats
+        session:        Объект requests.Session, через который выполнять
+                        запрос. По умолчанию используется общая сессия
+                        модуля (см. get_session)
+        fast_json:      Использовать для разбора ответа orjson, если он
+                        установлен
+        compact_items:  Преобразовать списки идентификаторов items в ответе
+                        в компактные массивы array (см. compact_id_arrays)
+        api_cache:      Объект ApiCache. Если указан, ответ берется из
+                        кэша, а при его отсутствии сохраняется в кэше
+        cache_type:     Тип данных запроса, определяющий время хранения
+                        ответа в кэше (см. CACHE_TTL)
+                         
+    Выход:
+        Часть ответа request внутри секции response
+        
+    Ответ разбирается один раз, непосредственно из байтов тела ответа.
+    
+    В случае ошибок могут генерироваться исключительные ситуации
+    requests.RequestException: VKRequestError при ошибках в ответе ВК,
+    RetryDeadlineError при истечении срока политики повторов, остальные -
+    при сбоях передачи данных. Постоянные ошибки (см. RetryPolicy) не
+    повторяются. При превышении ограничений execute запрос не повторяется
+    и генерируется ExecuteLimitError
+    
+    """
+    request = _execute_request(code)
+    trace = _request_trace(request, cache_type)
+    
+    if api_cache is not None:
+        cache_key = _execute_cache_key(api_cache, lang, request, token)
+        cached = api_cache.get(cache_key, cache_type)
+        if cached is not None:
+            if on_request is not None:
+                trace['cached'] = True
+                _finish_trace(trace, on_request, True)
+            return compact_id_arrays(cached) if compact_items else cached
+    
+    if session is None:
+        session = get_session()
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    
+    success = False
+    try:
+        response = _execute_attempts(request, lang, session, token,
+                                     request_timeout, request_rate,
+                                     retry_policy, fast_json, trace)
+        success = True
+    finally:
+        if on_request is not None:
+            _finish_trace(trace, on_request, success)
+    
+    if api_cache is not None:
+        api_cache.put(cache_key, cache_type, response)
+    
+    if compact_items:
+        return compact_id_arrays(response)
+    return response
+
+
+def _execute_attempts(request, lang, session, token, request_timeout,
+                      request_rate, retry_policy, fast_json, trace):
+    """Попытки выполнения запроса execute request (объект ExecuteRequest)
+    для do_execute_request по политике повторов retry_policy. Время,
+    размеры и ошибки попыток учитываются в записи о запросе trace.
+    
+    Выход:
+        Часть ответа внутри секции response
+        
+    """
+    response = None
+    limiter = get_rate_limiter(token, request_rate)
+    for attempt in range(max(1, retry_policy.retries)):
+        retry_policy.check_deadline()
+        if limiter is not None:
+            wait = limiter.reserve()
+            if wait > 0:
+                sleep(wait)
+                trace['rate_wait'] += wait
+        trace['attempts'] += 1
+        started = monotonic()
+        try:
+            content = session.post(
+                REQUEST_EXECUTE_PATH,
+                data=dict(
+                        access_token=token,
+                        v=API_VERSION,
+                        lang=lang,
+                        code=request.code,
+                        **request.args
+                        ),
+                timeout=request_timeout
+                ).content
+            trace['response_bytes'] += len(content)
+            response = json_loads(content, fast=fast_json)
+#        except requests.exceptions.ReadTimeout as e:
+#            print('Произошел таймаут при чтении', file=sys.stderr)
+#            response = e
+#        except requests.exceptions.ConnectTimeout as e:
+#            print('Произошел таймаут при соединении', file=sys.stderr)
+#            response = e
+#        except requests.exceptions.ConnectionError as e:
+#            print('Произошла ошибка DNS lookup', file=sys.stderr)
+#            response = e
+        except requests.RequestException as e:
+            print(f'{type(e).__name__}: {e}', file=sys.stderr)
+            response = e
+        except ValueError as e:
+            print(f'Ответ ВК не в формате json: {e}', file=sys.stderr)
+            response = requests.RequestException(
+                    f'VK response is not valid json: {e}')
+        trace['latency'] += monotonic() - started
+        if not isinstance(response, Exception) \
+           and not 'error' in response:
+               break
+        _trace_error(trace, response)
+        pause = retry_pause(retry_policy, response, attempt)
+        if pause is None:
+            break
+        sleep(pause)
+        trace['retry_sleep'] += pause
+        
+    if isinstance(response, Exception):
+        raise response
+    if 'error' in response:
+        raise VKRequestError(response['error'])
+    
+    return response['response']
+
+
+def group_verdict(group_id, check, group_info=None):
+    """Запись о результате проверки одной группы group_id по ответу
+    запроса проверки группы check и данным о группе group_info (ответ
+    groups.getById, см. load_groups_info). Данные о группах запрашиваются
+    только для особых групп, без них название, короткое имя и число
+    участников равны None:
+        
+        {
+            "gid": идентификатор группы,
+            "name": "Название группы",
+            "screen_name": "короткое имя группы",
+            "members_count": количество участников сообщества,
+            "friends_in_group": количество друзей пользователя в группе,
+            "exact": False, если проверка прекращена после превышения
+                     порога и friends_in_group - только нижняя оценка,
+            "special": True, если группа особая
+        }
+        
+    """
+    if group_info is None:
+        group_info = {}
+    return dict(
+            gid = group_id,
+            name = group_info.get('name'),
+            screen_name = group_info.get('screen_name'),
+            members_count = group_info.get('members_count'),
+            friends_in_group = check['friends_in_group'],
+            exact = check.get('exact_count', True),
+            special = check['special_group']
+            )
+
+
+def special_group_record(verdict):
+    """Запись об особой группе для выходного списка по записи
+    о результате проверки группы (см. group_verdict)"""
+    return dict(
+            name = verdict['name'],
+            gid = verdict['gid'],
+            members_count = verdict['members_count']
+            )
+
+
+def friends_histogram(verdicts):
+    """Распределение групп по числу друзей в них
+    
+    Входные параметры:
+        verdicts: записи о результатах проверки групп с точным числом
+                  друзей (см. group_verdict, exact_counts)
+        
+    Выход:
+        Словарь {число друзей в группе: число таких групп}, упорядоченный
+        по числу друзей
+        
+    """
+    histogram = {}
+    for verdict in verdicts:
+        count = verdict['friends_in_group']
+        histogram[count] = histogram.get(count, 0) + 1
+    return dict(sorted(histogram.items()))
+
+
+def split_by_thresholds(verdicts, thresholds=THRESHOLDS):
+    """Списки особых групп сразу для нескольких порогов специфичности по
+    одним и тем же результатам проверки групп
+    
+    Входные параметры:
+        verdicts:   записи о результатах проверки групп с точным числом
+                    друзей (см. group_verdict, exact_counts)
+        thresholds: пороги специфичности
+        
+    Выход:
+        Словарь {порог: список особых групп в формате
+        find_unshared_groups} в порядке возрастания порогов
+        
+    """
+    results = {threshold: [] for threshold in sorted(set(thresholds))}
+    for verdict in verdicts:
+        record = None
+        for threshold, special_groups in results.items():
+            if verdict['friends_in_group'] <= threshold:
+                if record is None:
+                    record = special_group_record(verdict)
+                special_groups.append(record)
+    return results
+
+
+def print_special_group(verdict):
+    """Вывод на экран данных об особой группе по записи
+    о результате проверки группы (см. group_verdict)"""
+    print(f'\n{Fore.CYAN}Группа:{Style.RESET_ALL}\n'
+          f'{Fore.GREEN}'
+          f'\t{verdict["name"]}\n'
+          f'{Fore.YELLOW}'
+          f'\t{verdict["screen_name"]} '
+          f'{Fore.RED}'
+          f'(id: {verdict["gid"]})\n'
+          f'{Style.RESET_ALL}'
+          f'\t{verdict["members_count"]}'
+          f' членов\n'
+          f'\t{verdict["friends_in_group"]} друзей\n',
+          flush=True)
+
+
+def check_user_info(user_info, user_id, raise_nouser=True, progress=None):
+    """Проверка, что пользователь из ответа GET_MAIN_USER_INFO_REQUEST_CODE
+    существует и не деактивирован. Если поиск продолжать нельзя, то перед
+    выходом вызывается progress(100) (если progress указан).
+    
+    Выход:
+        True, если поиск особых групп пользователя можно продолжать.
+        Иначе False, если raise_nouser равно False (сообщение выводится
+        в стандартный поток ошибок), или исключительная ситуация ValueError
+        
+    """
+    if not user_info['user'] or 'deactivated' in user_info['user'][0]:
+        if progress is not None:
+            progress(100)
+    if not user_info['user']:
+        if(raise_nouser):
+            raise ValueError(f'Пользователя {user_id} не существует')
+        print(f'Пользователя {user_id} не существует', file=sys.stderr)
+        return False
+    if 'deactivated' in user_info['user'][0]:
+        if(raise_nouser):
+            raise ValueError(f'Пользователь {user_id} деактивирован '
+                             f'({user_info["user"][0]["deactivated"]})')
+        print(f'Пользователь {user_id} деактивирован '
+              f'({user_info["user"][0]["deactivated"]})',
+              file=sys.stderr)
+        return False
+    return True
+
+
+def print_user_info(user_id, user_info):
+    """Вывод на экран общих данных о пользователе"""
+    print(f'\n{Fore.RED}Пользователь {user_id}:{Style.RESET_ALL}\n'
+          f'\t{user_info["user"][0]["last_name"]}, '
+          f'{user_info["user"][0]["first_name"]}\n'
+          f'\t(id: {user_info["user"][0]["id"]})\n'
+          f'Состоит в {user_info["groups"]["count"]} группах, '
+          f'{user_info["friends"]["count"]} друзей\n',
+          flush=True)
+
+
+def print_summary(user_info, special_count):
+    """Вывод на экран итогов поиска особых групп"""
+    print(f'{Fore.RED}Всего групп: '
+          f'{user_info["groups"]["count"]}{Style.RESET_ALL}')
+    print(f'{Fore.RED}Из них особых групп: '
+          f'{special_count}{Style.RESET_ALL}')
+
+
+def group_chunks(groups, friends_count, *, batch=BATCH,
+                 friend_is_member_step=FRIEND_IS_MEMBER_STEP):
+    """Разбиение списка групп groups на части, каждая из которых
+    проверяется одним запросом execute. friend_is_member_step - уже
+    выбранное число друзей в запросе groups.isMember (см. member_step)"""
+    if batch:
+        chunk_size = groups_per_execute(
+                friends_count,
+                friend_is_member_step=friend_is_member_step)
+    else:
+        chunk_size = 1
+    chunks = [groups[start:start + chunk_size]
+              for start in range(0, len(groups), chunk_size)]
+    _step_metrics.record_member_step(friend_is_member_step, len(groups))
+    for chunk in chunks:
+        _step_metrics.record_chunk(len(chunk))
+    return chunks
+
+
+def friend_slices(friends, friend_is_member_step=FRIEND_IS_MEMBER_STEP):
+    """Параметр friends запросов проверки групп: идентификаторы друзей
+    friends, разбитые на срезы по friend_is_member_step (одно обращение
+    к groups.isMember на срез). Срезы разделяются ";", друзья в срезе -
+    запятой"""
+    return ';'.join(
+            ','.join(map(str, friends[start:start + friend_is_member_step]))
+            for start in range(0, len(friends), friend_is_member_step))
+
+
+def check_groups_code(chunk, friends, *, batch=BATCH,
+                      members_threshold=MEMBERS_THRESHOLD,
+                      exact_counts=EXACT_COUNTS):
+    """Запрос execute (объект ExecuteRequest) для проверки части групп
+    chunk. friends - срезы друзей пользователя (см. friend_slices)"""
+    if batch:
+        return vkscript_request(CHECK_SPECIAL_GROUPS_BATCH_REQUEST_CODE,
+                                group_ids=chunk,
+                                friends=friends,
+                                members_threshold=members_threshold,
+                                exact=exact_counts)
+    return vkscript_request(CHECK_SPECIAL_GROUP_REQUEST_CODE,
+                            group_id=chunk[0],
+                            friends=friends,
+                            members_threshold=members_threshold,
+                            exact=exact_counts)
+
+
+def save_special_groups(special_groups, json_file=DEFAULT_OUTPUT_JSON_FILE):
+    """Сохранение списка особых групп в файл json_file (если указан)
+    
+    Выход:
+        Тот же список в виде строки json
+        
+    """
+    text = json.dumps(special_groups, indent=4, ensure_ascii=False)
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    return text
+
+
+def load_checkpoint(checkpoint_file, uid, members_threshold, params=None):
+    """Загрузка контрольной точки поиска особых групп.
+    
+    Входные параметры:
+        checkpoint_file:   файл контрольной точки
+        uid:               числовой идентификатор пользователя
+        members_threshold: порог специфичности
+        params:            словарь остальных параметров поиска, от которых
+                           зависят результаты (exact_counts, strategy).
+                           Должен совпадать с сохраненным в файле
+        
+    Выход:
+        Кортеж (список уже проверенных групп, список найденных особых
+        групп, словарь {идентификатор группы: число друзей в группе} для
+        проверенных групп). Если файла нет или он сохранен для другого
+        пользователя, порога или параметров, возвращаются пустые списки и
+        словарь
+        
+    """
+    try:
+        with open(checkpoint_file, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return [], [], {}
+    if checkpoint.get('uid') != uid \
+       or checkpoint.get('members_threshold') != members_threshold \
+       or checkpoint.get('params', {}) != (params or {}):
+        return [], [], {}
+    return (checkpoint['done'], checkpoint['special_groups'],
+            {int(group): count for group, count
+             in checkpoint.get('counts', {}).items()})
+
+
+def save_checkpoint(checkpoint_file, uid, members_threshold,
+                    done, special_groups, params=None, counts=None):
+    """Сохранение контрольной точки поиска особых групп (см.
+    load_checkpoint). Файл заменяется атомарно, поэтому при аварийном
+    завершении программы в нем остается предыдущая целая версия"""
+    tmp_file = f'{checkpoint_file}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(uid=uid,
+                       members_threshold=members_threshold,
+                       params=params or {},
+                       done=done,
+                       special_groups=special_groups,
+                       counts=counts or {}),
+                  f, ensure_ascii=False)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def load_snapshot(snapshot_file, uid):
+    """Загрузка снимка результатов предыдущего поиска особых групп
+    пользователя для повторного поиска в инкрементальном режиме.
+    
+    Входные параметры:
+        snapshot_file: файл снимка
+        uid:           числовой идентификатор пользователя
+        
+    Выход:
+        Словарь {"friends": список друзей, "counts": {идентификатор группы:
+        число друзей в группе}} или None, если файла нет или он сохранен
+        для другого пользователя
+        
+    """
+    try:
+        with open(snapshot_file, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    if snapshot.get('uid') != uid:
+        return None
+    return dict(friends=snapshot['friends'],
+                counts={int(group): count for group, count
+                        in snapshot['counts'].items()})
+
+
+def save_snapshot(snapshot_file, uid, friends, counts):
+    """Сохранение снимка результатов поиска особых групп (см.
+    load_snapshot). Файл заменяется атомарно"""
+    tmp_file = f'{snapshot_file}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(uid=uid, friends=list(friends), counts=counts), f)
+    os.replace(tmp_file, snapshot_file)
+
+
+class _GroupScan:
+    """Обработка результатов проверки групп одного пользователя:
+    отображение прогресса, вывод на экран, накопление списка особых групп,
+    передача их в NDJSON файл и функцию sink и сохранение контрольных
+    точек. Общая для синхронной и асинхронной версий поиска.
+    
+    Результаты должны передаваться в метод add в порядке групп
+    пользователя. После окончания работы необходимо вызвать finish или,
+    при ошибке, close.
+    
+    Параметр params - словарь параметров поиска, от которых зависят
+    результаты (см. load_checkpoint). Контрольная точка, сохраненная с
+    другими параметрами, не используется.
+    
+    """
+    
+    def __init__(self, user_id, user_info, *,
+                 members_threshold=MEMBERS_THRESHOLD,
+                 silent=SILENT,
+                 progress=simple_progress,
+                 checkpoint_file=None,
+                 checkpoint_every=CHECKPOINT_EVERY,
+                 ndjson_file=None,
+                 sink=None,
+                 params=None):
+        self.user_info = user_info
+        self.uid = user_info['user'][0]['id']
+        self.members_threshold = members_threshold
+        self.params = dict(params or {})
+        self.silent = silent
+        self.progress = progress
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_every = checkpoint_every
+        self.sink = sink
+        # Список особых групп накапливается только для контрольной точки,
+        # вызывающий получает найденные группы из результата add
+        self.keep_results = bool(checkpoint_file)
+        self._ndjson = None
+        if ndjson_file:
+            self._ndjson = open(ndjson_file, 'a', encoding='utf-8')
+        
+        # counts - число друзей в каждой проверенной группе для снимка
+        # инкрементального поиска (см. save_snapshot). При продолжении с
+        # контрольной точки восстанавливается и для групп, проверенных
+        # до прерывания
+        if checkpoint_file:
+            self.done, self.special_groups, self.counts = load_checkpoint(
+                    checkpoint_file, self.uid, members_threshold,
+                    self.params)
+        else:
+            self.done, self.special_groups, self.counts = [], [], {}
+        self._checkpoint_done = len(self.done)
+        self.special_count = len(self.special_groups)
+        
+        self.progress_step = 100 / (user_info['groups']['count'] + 1)
+        self.progress_status = self.progress_step * (1 + len(self.done))
+        progress(self.progress_status)
+        
+        if not silent:
+            print_user_info(user_id, user_info)
+            if self.done:
+                print(f'Продолжение с контрольной точки: проверено '
+                      f'{len(self.done)} групп\n', flush=True)
+    
+    def pending_groups(self):
+        """Список групп, которые еще нужно проверить"""
+        done = set(self.done)
+        return [group for group in self.user_info['groups']['items']
+                if group not in done]
+    
+    def add(self, verdict):
+        """Обработка результата проверки одной группы (см. group_verdict)
+        
+        Выход:
+            Запись об особой группе для выходного списка или None, если
+            группа не особая
+            
+        """
+        self.progress_status += self.progress_step
+        self.progress(self.progress_status)
+        
+        record = None
+        if verdict['special']:
+            record = special_group_record(verdict)
+            self.special_count += 1
+            if self.keep_results:
+                self.special_groups.append(record)
+            if self._ndjson is not None:
+                self._ndjson.write(
+                        json.dumps(record, ensure_ascii=False) + '\n')
+                self._ndjson.flush()
+            if self.sink is not None:
+                self.sink(record)
+            if not self.silent:
+                print_special_group(verdict)
+        self.done.append(verdict['gid'])
+        self.counts[verdict['gid']] = verdict['friends_in_group']
+        
+        if self.checkpoint_file and len(self.done) \
+           >= self._checkpoint_done + self.checkpoint_every:
+            self.save_checkpoint()
+            
+        return record
+    
+    def save_checkpoint(self):
+        """Сохранить контрольную точку, если она задана"""
+        if self.checkpoint_file:
+            save_checkpoint(self.checkpoint_file, self.uid,
+                            self.members_threshold,
+                            self.done, self.special_groups, self.params,
+                            self.counts)
+            self._checkpoint_done = len(self.done)
+    
+    def close(self):
+        """Закрыть выходной NDJSON файл"""
+        if self._ndjson is not None:
+            self._ndjson.close()
+            self._ndjson = None
+    
+    def finish(self):
+        """Завершение поиска. Контрольная точка больше не нужна и
+        удаляется
+        
+        Выход:
+            None
+            
+        """
+        self.close()
+        self.progress(100)
+        
+        if not self.silent:
+            print_summary(self.user_info, self.special_count)
+        
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+
+def find_unshared_groups(user_id, *,                        
+                         members_threshold=MEMBERS_THRESHOLD,
+                         json_file=DEFAULT_OUTPUT_JSON_FILE,
+                         lang=DEFAULT_LANG,
+                         token=TOKEN,
+                         silent=SILENT,
+                         raise_nouser=True,
+                         progress=simple_progress,                         
+                         group_step=GROUP_STEP,
+                         friend_step=FRIEND_STEP,
+                         friend_load_step=FRIEND_LOAD_STEP,
+                         friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                         request_delay=REQUEST_DELAY,
+                         request_repeat=MAX_REPEAT_REQUESTS,
+                         request_timeout=REQUEST_TIMEOUT,
+                         request_rate=REQUEST_RATE,
+                         retry_policy=None,
+                         on_request=None,
+                         deadline=None,
+                         batch=BATCH,
+                         exact_counts=EXACT_COUNTS,
+                         strategy=STRATEGY,
+                         engine=ENGINE,
+                         tokens=None,
+                         workers=WORKERS,
+                         session=None,
+                         api_cache=None,
+                         cache=None,
+                         checkpoint_file=None,
+                         checkpoint_every=CHECKPOINT_EVERY,
+                         ndjson_file=None,
+                         sink=None,
+                         snapshot_file=None,
+                         stream=False,
+                         return_stats=False,
+                         **kwarg):
+    """Поиск "особых" групп указанного пользователя. Групп,
+    в которых состоит ограниченное количество его друзей.
+    
+    Входные параметры:
+        user_id:           идентификатор пользователя в виде строки/числа
+                           Например: 'eshmargunov', 'id171691064',
+                                     '171691064', 171691064
+        members_threshold: Максимально число пользователей, для которого группа
+                           еще считается особой
+        json_file:         файл для сохранения списка данных об особых группах
+                           Формат json, кодировка utf-8
+                           Если указано значение None выходной файл не
+                           формируется
+        lang:              язык вывода выходных данных
+                           (см. https://vk.com/dev/api_requests)
+        token:             ключ доступа API ВК
+        silent:            "молчаливый" режим - True означает не выводить
+                           дополнительную информацию в стандартный поток вывода
+        raise_nouser:      при значении True, если пользователя с указанным
+                           идентификатором не существует, будет сгенерирована
+                           исключительная ситуация ValueError. При значении
+                           False будет выведено сообщение об ошибке в
+                           стандартный поток ошибок и функция вернет пустой
+                           список групп. В выходной файл также будет сохранен
+                           пустой списко групп.
+        request_delay:     задержка перед первым повтором запроса при
+                           ошибках и сбоях
+        request_repeat:    максимальное число повторений запросов при
+                           ошибках и сбоях
+        request_timeout:   задержки timeout
+                           None - ждать неограниченно
+                           Одно число - одинаковая задержка соединения/чтения
+                           Кортеж двух чисел - задержка соединения и чтения
+                           Рекомендуется задать не менее 3
+        request_rate:      максимальное число запросов в секунду для token
+                           (см. RateLimiter). None или 0 - не ограничивать
+        retry_policy:      политика повторов запросов (объект RetryPolicy).
+                           По умолчанию повторы выполняются не более
+                           request_repeat раз с экспоненциально растущей
+                           задержкой, начиная с request_delay. Постоянные
+                           ошибки (неверный ключ доступа, нет доступа и
+                           т.п.) не повторяются
+        deadline:          общее время поиска в секундах. Если запросы не
+                           успевают выполниться, генерируется
+                           RetryDeadlineError. None - не ограничивать
+        on_request:        функция, вызываемая с записью о каждом запросе к
+                           API ВК (см. do_execute_request). Например,
+                           объект RequestStats
+        return_stats:      вернуть вместе с результатом сводную статистику
+                           запросов (объект RequestStats): кортеж
+                           (результат, статистика)
+        batch:             проверять несколько групп в одном запросе execute.
+                           Число групп в запросе рассчитывается по количеству
+                           друзей пользователя (см. groups_per_execute)
+        exact_counts:      всегда считать точное число друзей в группе.
+                           По умолчанию проверка группы прекращается, как
+                           только число друзей в ней превысит
+                           members_threshold, что значительно сокращает
+                           число обращений к groups.isMember. Для особых
+                           групп число друзей всегда точное. При
+                           использовании snapshot_file точный подсчет
+                           включается автоматически
+        strategy:          стратегия поиска: 'groups' - проверять членство
+                           друзей в каждой группе, 'friends' - получать
+                           списки групп друзей и подсчитывать друзей в
+                           группах локально (выгодно при многих группах и
+                           немногих друзьях, число друзей в группах всегда
+                           точное), 'auto' - выбрать по оценке числа
+                           запросов (см. plan_strategy). Стратегия
+                           'friends' выполняет все запросы до выдачи
+                           первой записи: потоковая выдача, досрочное
+                           прекращение перебора и контрольные точки с ней
+                           не сокращают число запросов. При повторном
+                           поиске по snapshot_file не используется
+        engine:            способ подсчета друзей в группах по спискам
+                           групп друзей (стратегия 'friends') и в поиске
+                           по многим пользователям: 'python', 'numpy'
+                           (матрица членства, см. модуль matrix) или
+                           'auto' - 'numpy', если пакет установлен
+        tokens:            список ключей доступа API ВК. Если указан, то
+                           используется вместо token, и запросы проверки
+                           групп распределяются между ключами по очереди.
+                           Для каждого ключа действует свое ограничение
+                           частоты запросов request_rate
+        workers:           число потоков, одновременно выполняющих проверку
+                           групп. Порядок групп в результате не зависит от
+                           числа потоков
+        session:           объект requests.Session для запросов к API ВК.
+                           По умолчанию используется общая сессия модуля,
+                           соединения которой сохраняются между вызовами.
+                           Размер пула соединений сессии должен быть не
+                           меньше workers (см. make_session)
+        checkpoint_file:   файл контрольной точки. Если указан, то каждые
+                           checkpoint_every групп, а также при ошибке или
+                           прерывании поиска в него сохраняются уже
+                           проверенные группы и найденные особые группы.
+                           Повторный вызов для того же пользователя,
+                           порога, exact_counts и strategy продолжит поиск
+                           с контрольной точки, не проверяя группы
+                           повторно. После успешного
+                           завершения поиска файл удаляется
+        checkpoint_every:  через сколько проверенных групп сохранять
+                           контрольную точку
+        api_cache:         объект ApiCache - постоянный кэш ответов API ВК.
+                           Повторный поиск для того же пользователя в
+                           пределах времени хранения выполняется по
+                           данным кэша
+        cache:             объект ScanCache - кэш данных о группах и
+                           результатов проверки членства в памяти. Данные
+                           об особых группах запрашиваются после проверки
+                           групп пачками и только если их нет в кэше, поэтому
+                           один кэш удобно использовать для поиска по многим
+                           пользователям. По умолчанию создается новый
+        ndjson_file:       файл, в конец которого сразу по нахождении
+                           дописывается каждая особая группа в виде строки
+                           json (формат NDJSON, кодировка utf-8)
+        sink:              функция, которая вызывается с записью о каждой
+                           особой группе сразу по ее нахождении (записи,
+                           восстановленные из контрольной точки, повторно не
+                           передаются)
+        snapshot_file:     файл снимка результатов поиска (списки друзей и
+                           групп пользователя и число друзей в каждой
+                           группе). Снимок сохраняется после успешного
+                           завершения поиска. Если файл уже содержит снимок
+                           для того же пользователя, поиск выполняется в
+                           инкрементальном режиме: проверяются только новые
+                           группы и членство добавленных друзей, а после
+                           удаления друзей - все группы (см.
+                           iter_rescan_groups). При продолжении с
+                           контрольной точки число друзей в уже
+                           проверенных группах берется из нее
+        stream:            вернуть вместо строки json генератор записей об
+                           особых группах. Поиск выполняется по мере
+                           получения записей из генератора, список особых
+                           групп в памяти не накапливается, файл json_file
+                           не формируется
+                         
+            Следующие параметры не рекомендуется изменять:
+        group_step:       число групп читать в запросе groups.get
+        friend_step:      число друзей в запросе friends.get при получении
+                          общих данных о пользователе
+        friend_load_step: не используется: список друзей загружается один
+                          раз вместе с общими данными о пользователе.
+                          Сохранен для совместимости
+        friend_is_member_step: желаемое число друзей в запросе
+                          groups.isMember. Фактическое значение
+                          подбирается по числу друзей (см. member_step)
+                          
+        Шаги не превышают ограничений API ВК. Если ВК сообщает о
+        превышении ограничений execute, общие данные о пользователе
+        запрашиваются повторно с максимальными шагами, а пакетные запросы
+        делятся на части (см. execute_chunks). Статистику выбранных
+        размеров возвращает get_step_metrics
+        
+    Возвращаемое значение:
+        
+        Объект json со списком особых групп в кодировке utf-8:
+            
+            [
+                {
+                    "name": "Название группы", 
+                    "gid": "идентификатор группы", 
+                    "members_count": количество_участников_собщества
+                },
+                {
+                …
+                }
+            ]
+            
+        Файл такого же формата может сохраняться на носитель информации в
+        соответствии с установкой параметра json_file
+        
+        При stream=True возвращается генератор словарей того же вида
+        
+        При return_stats=True возвращается кортеж (результат, объект
+        RequestStats). При stream=True статистика пополняется по мере
+        получения записей из генератора
+        
+    Функция может генерировать исключительные ситуации:
+        - При отсутсвии пользователя с указанным идентификатором и
+          соответсвующей установке параметра raise_nouser (ValueError)
+        - Исключительные ситуации Request при повторах ошибочных ответов
+          серверов ВК или сбоях передачи данных, ошибках DNS lookup.
+          VKRequestError (с кодом ошибки ВК error_code) сразу при
+          постоянных ошибках ВК, RetryDeadlineError при истечении
+          времени deadline
+        
+    """
+    
+    request_stats = None
+    if return_stats:
+        request_stats = on_request = RequestStats(on_request)
+    
+    # Записи нужны по мере нахождения: задержка их ради запроса данных о
+    # группах большими пачками ограничивается
+    group_info_hold = None
+    if stream or checkpoint_file or ndjson_file or sink is not None:
+        group_info_hold = GROUP_INFO_HOLD
+    
+    special_groups = _find_special_groups(
+            user_id,
+            members_threshold=members_threshold,
+            lang=lang,
+            token=token,
+            silent=silent,
+            raise_nouser=raise_nouser,
+            progress=progress,
+            group_step=group_step,
+            friend_step=friend_step,
+            friend_is_member_step=friend_is_member_step,
+            request_delay=request_delay,
+            request_repeat=request_repeat,
+            request_timeout=request_timeout,
+            request_rate=request_rate,
+            retry_policy=retry_policy,
+            on_request=on_request,
+            deadline=deadline,
+            batch=batch,
+            exact_counts=exact_counts,
+            strategy=strategy,
+            engine=engine,
+            tokens=tokens,
+            workers=workers,
+            session=session,
+            api_cache=api_cache,
+            cache=cache,
+            checkpoint_file=checkpoint_file,
+            checkpoint_every=checkpoint_every,
+            ndjson_file=ndjson_file,
+            sink=sink,
+            snapshot_file=snapshot_file,
+            group_info_hold=group_info_hold)
+    
+    if stream:
+        result = special_groups
+    else:
+        result = save_special_groups(list(special_groups), json_file)
+    
+    if return_stats:
+        return result, request_stats
+    return result
+
+
+def _find_special_groups(user_id, *, members_threshold, lang, token, silent,
+                         raise_nouser, progress, group_step, friend_step,
+                         friend_is_member_step, request_delay,
+                         request_repeat, request_timeout, request_rate,
+                         retry_policy, deadline, on_request, batch,
+                         exact_counts, strategy, engine, tokens, workers,
+                         session, api_cache, cache, checkpoint_file,
+                         checkpoint_every, ndjson_file, sink,
+                         snapshot_file, group_info_hold):
+    """Генератор, выполняющий поиск особых групп для find_unshared_groups.
+    Выдает записи об особых группах по мере их нахождения (сначала
+    сохраненные в контрольной точке). Параметры - как у
+    find_unshared_groups, group_info_hold - как у iter_unshared_groups.
+    Задержка записей ограничивается, когда они нужны по мере нахождения:
+    при потоковой выдаче, контрольных точках и записи в NDJSON файл или
+    sink"""
+    
+    if not(is_in_ipython() or is_a_tty()): silent = True
+    
+    tokens = list(tokens) if tokens else [token]
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    retry_policy = retry_policy.with_deadline(deadline)
+    
+    progress(0)
+    
+    user_info = load_user_info(user_id, lang,
+                               token=tokens[0],
+                               group_step=group_step,
+                               friend_step=friend_step,
+                               request_delay=request_delay,
+                               request_repeat=request_repeat,
+                               request_timeout=request_timeout,
+                               request_rate=request_rate,
+                               retry_policy=retry_policy,
+                               on_request=on_request,
+                               session=session,
+                               api_cache=api_cache)
+    
+    if check_user_info(user_info, user_id, raise_nouser, progress):
+        
+        scan = _GroupScan(user_id, user_info,
+                          members_threshold=members_threshold,
+                          silent=silent,
+                          progress=progress,
+                          checkpoint_file=checkpoint_file,
+                          checkpoint_every=checkpoint_every,
+                          ndjson_file=ndjson_file,
+                          sink=sink,
+                          params=dict(exact_counts=exact_counts
+                                                   or bool(snapshot_file),
+                                      strategy=strategy))
+        
+        snapshot = None
+        if snapshot_file:
+            snapshot = load_snapshot(snapshot_file, scan.uid)
+        if snapshot is not None:
+            verdicts = iter_rescan_groups(
+                            user_info, snapshot,
+                            members_threshold=members_threshold,
+                            lang=lang,
+                            friend_is_member_step=friend_is_member_step,
+                            request_delay=request_delay,
+                            request_repeat=request_repeat,
+                            request_timeout=request_timeout,
+                            request_rate=request_rate,
+                            retry_policy=retry_policy,
+                            on_request=on_request,
+                            tokens=tokens,
+                            workers=workers,
+                            session=session,
+                            api_cache=api_cache,
+                            cache=cache,
+                            groups=scan.pending_groups())
+        else:
+            verdicts = iter_unshared_groups(
+                            user_id,
+                            members_threshold=members_threshold,
+                            lang=lang,
+                            friend_is_member_step=friend_is_member_step,
+                            request_delay=request_delay,
+                            request_repeat=request_repeat,
+                            request_timeout=request_timeout,
+                            request_rate=request_rate,
+                            retry_policy=retry_policy,
+                            on_request=on_request,
+                            batch=batch,
+                            exact_counts=exact_counts \
+                                         or bool(snapshot_file),
+                            strategy=strategy,
+                            engine=engine,
+                            tokens=tokens,
+                            workers=workers,
+                            session=session,
+                            api_cache=api_cache,
+                            cache=cache,
+                            user_info=user_info,
+                            groups=scan.pending_groups(),
+                            group_info_hold=group_info_hold)
+        try:
+            yield from list(scan.special_groups)
+            for verdict in verdicts:
+                record = scan.add(verdict)
+                if record is not None:
+                    yield record
+        except BaseException:
+            scan.save_checkpoint()
+            scan.close()
+            raise
+        finally:
+            verdicts.close()
+                    
+        scan.finish()
+        
+        if snapshot_file:
+            save_snapshot(snapshot_file, scan.uid,
+                          user_info['friends']['items'], scan.counts)
+
+
+def find_unshared_groups_thresholds(user_id, thresholds=THRESHOLDS, *,
+                                    json_file=DEFAULT_OUTPUT_JSON_FILE,
+                                    lang=DEFAULT_LANG,
+                                    token=TOKEN,
+                                    silent=SILENT,
+                                    raise_nouser=True,
+                                    progress=simple_progress,
+                                    group_step=GROUP_STEP,
+                                    friend_step=FRIEND_STEP,
+                                    request_delay=REQUEST_DELAY,
+                                    request_repeat=MAX_REPEAT_REQUESTS,
+                                    request_timeout=REQUEST_TIMEOUT,
+                                    request_rate=REQUEST_RATE,
+                                    retry_policy=None,
+                                    on_request=None,
+                                    deadline=None,
+                                    tokens=None,
+                                    session=None,
+                                    api_cache=None,
+                                    return_stats=False,
+                                    **kwarg):
+    """Поиск особых групп пользователя сразу для нескольких порогов
+    специфичности за один проход.
+    
+    Для всех групп пользователя один раз подсчитывается точное число
+    друзей в группе (exact_counts=True), после чего списки особых групп
+    для каждого порога и распределение групп по числу друзей
+    вычисляются локально, без повторного поиска для каждого порога.
+    
+    Входные параметры - как у find_unshared_groups, и дополнительно:
+        thresholds: пороги специфичности (members_threshold)
+        
+    Остальные именованные параметры (batch, strategy, engine, workers,
+    friend_is_member_step и т.п.) передаются в iter_unshared_groups.
+    Параметры members_threshold и exact_counts задаются функцией, а
+    переданные значения игнорируются. Контрольные точки, NDJSON файл и
+    снимки результатов не поддерживаются: параметры checkpoint_file,
+    checkpoint_every, ndjson_file, snapshot_file и friend_load_step
+    допускаются только со значением None.
+    
+    Возвращаемое значение:
+        
+        Словарь:
+            
+            {
+                "thresholds": {
+                    порог: [список особых групп в формате
+                            find_unshared_groups],
+                    …
+                },
+                "histogram": {
+                    число друзей в группе: число таких групп,
+                    …
+                }
+            }
+            
+        Пороги и числа друзей упорядочены по возрастанию. Если указан
+        json_file, словарь сохраняется в нем в формате json
+        
+        При return_stats=True возвращается кортеж (результат, объект
+        RequestStats)
+        
+    Функция может генерировать те же исключительные ситуации, что и
+    find_unshared_groups, а также ValueError, если не указано ни одного
+    порога или указан неподдерживаемый параметр.
+    
+    """
+    thresholds = sorted(set(thresholds))
+    if not thresholds:
+        raise ValueError('Не указаны пороги специфичности')
+    
+    kwarg.pop('members_threshold', None)
+    kwarg.pop('exact_counts', None)
+    unsupported = [name for name in ('checkpoint_file', 'checkpoint_every',
+                                     'ndjson_file', 'snapshot_file',
+                                     'friend_load_step')
+                   if kwarg.pop(name, None) is not None]
+    if unsupported:
+        raise ValueError(f'Параметры не поддерживаются при поиске для '
+                         f'нескольких порогов: {", ".join(unsupported)}')
+    
+    if not(is_in_ipython() or is_a_tty()): silent = True
+    
+    request_stats = None
+    if return_stats:
+        request_stats = on_request = RequestStats(on_request)
+    
+    tokens = list(tokens) if tokens else [token]
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    retry_policy = retry_policy.with_deadline(deadline)
+    
+    progress(0)
+    
+    user_info = load_user_info(user_id, lang,
+                               token=tokens[0],
+                               group_step=group_step,
+                               friend_step=friend_step,
+                               request_delay=request_delay,
+                               request_repeat=request_repeat,
+                               request_timeout=request_timeout,
+                               request_rate=request_rate,
+                               retry_policy=retry_policy,
+                               on_request=on_request,
+                               session=session,
+                               api_cache=api_cache)
+    
+    verdicts = []
+    found = check_user_info(user_info, user_id, raise_nouser, progress)
+    if found:
+        if not silent:
+            print_user_info(user_id, user_info)
+        
+        progress_step = 100 / (user_info['groups']['count'] + 1)
+        progress_status = progress_step
+        progress(progress_status)
+        
+        for verdict in iter_unshared_groups(
+                            user_id,
+                            members_threshold=thresholds[-1],
+                            lang=lang,
+                            request_delay=request_delay,
+                            request_repeat=request_repeat,
+                            request_timeout=request_timeout,
+                            request_rate=request_rate,
+                            retry_policy=retry_policy,
+                            on_request=on_request,
+                            exact_counts=True,
+                            tokens=tokens,
+                            session=session,
+                            api_cache=api_cache,
+                            user_info=user_info,
+                            group_info_hold=None,
+                            **kwarg):
+            verdicts.append(verdict)
+            progress_status += progress_step
+            progress(progress_status)
+        progress(100)
+    
+    special_groups = split_by_thresholds(verdicts, thresholds)
+    result = dict(thresholds=special_groups,
+                  histogram=friends_histogram(verdicts))
+    
+    if found and not silent:
+        print(f'{Fore.RED}Всего групп: '
+              f'{user_info["groups"]["count"]}{Style.RESET_ALL}')
+        for threshold, groups in special_groups.items():
+            print(f'{Fore.RED}Особых групп при пороге {threshold}: '
+                  f'{len(groups)}{Style.RESET_ALL}')
+    
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+    
+    if return_stats:
+        return result, request_stats
+    return result
+
+
+def load_user_info(user_id, lang=DEFAULT_LANG, *,
+                   token=TOKEN,
+                   group_step=GROUP_STEP,
+                   friend_step=FRIEND_STEP,
+                   **kwarg):
+    """Запрос общих данных о пользователе: профиля, списков групп и друзей
+    (GET_MAIN_USER_INFO_REQUEST_CODE). Остальные именованные параметры
+    передаются в do_execute_request.
+    
+    Выход:
+        Ответ запроса: словарь с ключами user, groups и friends. Списки
+        items групп и друзей - массивы array (см. compact_id_arrays)
+        
+    """
+    code = vkscript_request(GET_MAIN_USER_INFO_REQUEST_CODE,
+                            user_id=user_id,
+                            group_step=min(group_step, MAX_GROUP_STEP),
+                            friend_step=min(friend_step, MAX_FRIEND_STEP))
+    try:
+        return do_execute_request(code, lang, token=token,
+                                  compact_items=True,
+                                  cache_type='user_info', **kwarg)
+    except ExecuteLimitError:
+        # Списки не уместились в ограничения execute с заданными шагами:
+        # повтор с максимально допустимыми шагами
+        if group_step >= MAX_GROUP_STEP and friend_step >= MAX_FRIEND_STEP:
+            raise
+    _step_metrics.record_fallback()
+    return load_user_info(user_id, lang, token=token,
+                          group_step=MAX_GROUP_STEP,
+                          friend_step=MAX_FRIEND_STEP, **kwarg)
+
+
+def iter_unshared_groups(user_id, *,
+                         members_threshold=MEMBERS_THRESHOLD,
+                         lang=DEFAULT_LANG,
+                         token=TOKEN,
+                         raise_nouser=True,
+                         group_step=GROUP_STEP,
+                         friend_step=FRIEND_STEP,
+                         friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                         request_delay=REQUEST_DELAY,
+                         request_repeat=MAX_REPEAT_REQUESTS,
+                         request_timeout=REQUEST_TIMEOUT,
+                         request_rate=REQUEST_RATE,
+                         retry_policy=None,
+                         on_request=None,
+                         batch=BATCH,
+                         exact_counts=EXACT_COUNTS,
+                         strategy=STRATEGY,
+                         engine=ENGINE,
+                         tokens=None,
+                         workers=WORKERS,
+                         session=None,
+                         api_cache=None,
+                         cache=None,
+                         user_info=None,
+                         groups=None,
+                         group_info_hold=GROUP_INFO_HOLD,
+                         **kwarg):
+    """Генератор результатов проверки групп пользователя. Основа
+    find_unshared_groups без вывода на экран, отображения прогресса и
+    сохранения в файлы.
+    
+    Записи выдаются по одной на каждую проверенную группу в порядке групп
+    пользователя по мере получения ответов ВК (см. group_verdict):
+        
+        {
+            "gid": идентификатор группы,
+            "name": "Название группы",
+            "screen_name": "короткое имя группы",
+            "members_count": количество участников сообщества,
+            "friends_in_group": количество друзей пользователя в группе,
+            "exact": True, если friends_in_group - точное число (см.
+                     exact_counts),
+            "special": True, если группа особая
+        }
+        
+    Проверка выполняется по мере получения записей: если прекратить
+    перебор (например, после первых N особых групп), оставшиеся группы
+    не запрашиваются. Для стратегии 'friends' (см. iter_groups_by_friends)
+    все запросы выполняются до выдачи первой записи.
+    
+    Данные о группах (название, короткое имя, число участников)
+    запрашиваются только для особых групп, пачками по GROUP_INFO_STEP
+    групп после их проверки, а у остальных групп эти данные равны None.
+    Записи, начиная с первой особой группы, задерживаются до заполнения
+    пачки, но не дольше group_info_hold секунд (см. _fill_groups_info).
+    
+    Входные параметры - как у find_unshared_groups, и дополнительно:
+        cache:     объект ScanCache для данных о группах и результатов
+                   проверки членства. Данные о группах, которые уже есть
+                   в кэше, повторно не запрашиваются. По умолчанию
+                   создается новый
+        user_info: уже полученные общие данные о пользователе (см.
+                   load_user_info). Если не указаны, запрашиваются
+        groups:    список идентификаторов групп для проверки. По умолчанию
+                   проверяются все группы пользователя
+        group_info_hold: сколько секунд записи могут ждать заполнения
+                   пачки групп для запроса данных о них. None - ждать
+                   заполнения пачки или окончания проверки
+                   
+    Если пользователь не существует или деактивирован, генерируется
+    исключительная ситуация ValueError или, при raise_nouser=False,
+    генератор не выдает ни одной записи.
+    
+    """
+    tokens = list(tokens) if tokens else [token]
+    
+    if user_info is None:
+        user_info = load_user_info(user_id, lang,
+                                   token=tokens[0],
+                                   group_step=group_step,
+                                   friend_step=friend_step,
+                                   request_delay=request_delay,
+                                   request_repeat=request_repeat,
+                                   request_timeout=request_timeout,
+                                   request_rate=request_rate,
+                                   retry_policy=retry_policy,
+                                   on_request=on_request,
+                                   session=session,
+                                   api_cache=api_cache)
+        if not check_user_info(user_info, user_id, raise_nouser):
+            return
+    
+    if groups is None:
+        groups = user_info['groups']['items']
+    
+    if cache is None:
+        cache = ScanCache()
+    
+    if strategy == 'auto':
+        strategy = plan_strategy(
+                len(groups), len(user_info['friends']['items']),
+                batch=batch,
+                friend_is_member_step=friend_is_member_step)['strategy']
+    if strategy == 'friends':
+        yield from iter_groups_by_friends(
+                user_info,
+                members_threshold=members_threshold,
+                lang=lang,
+                friend_is_member_step=friend_is_member_step,
+                engine=engine,
+                groups=groups,
+                cache=cache,
+                request_delay=request_delay,
+                request_repeat=request_repeat,
+                request_timeout=request_timeout,
+                request_rate=request_rate,
+                retry_policy=retry_policy,
+                on_request=on_request,
+                tokens=tokens,
+                workers=workers,
+                session=session,
+                api_cache=api_cache)
+        return
+    if strategy != 'groups':
+        raise ValueError(f'Неизвестная стратегия поиска: {strategy}')
+    
+    step = member_step(len(user_info['friends']['items']),
+                       friend_is_member_step)
+    friends = friend_slices(user_info['friends']['items'], step)
+    chunks = group_chunks(groups,
+                          len(user_info['friends']['items']),
+                          batch=batch,
+                          friend_is_member_step=step)
+    
+    def make_code(chunk):
+        return check_groups_code(chunk, friends,
+                                 batch=batch,
+                                 members_threshold=members_threshold,
+                                 exact_counts=exact_counts)
+    
+    request_kwarg = dict(tokens=tokens,
+                         workers=workers,
+                         request_delay=request_delay,
+                         request_repeat=request_repeat,
+                         request_timeout=request_timeout,
+                         request_rate=request_rate,
+                         retry_policy=retry_policy,
+                         on_request=on_request,
+                         session=session,
+                         api_cache=api_cache)
+    responses = execute_chunks(chunks, make_code, lang,
+                               cache_type='group_check', **request_kwarg)
+    verdicts = (group_verdict(group, check)
+                for chunk, response in zip(chunks, responses)
+                for group, check in zip(chunk,
+                                        response if batch else [response]))
+    try:
+        yield from _fill_groups_info(verdicts, cache, lang,
+                                     hold=group_info_hold, **request_kwarg)
+    finally:
+        responses.close()
+
+
+def execute_requests(codes, lang=DEFAULT_LANG, *,
+                     tokens=None,
+                     workers=WORKERS,
+                     **kwarg):
+    """Выполнение последовательности запросов execute, возможно в
+    нескольких потоках. Запросы распределяются по ключам доступа tokens по
+    очереди. Остальные именованные параметры передаются в
+    do_execute_request.
+    
+    Выход:
+        Генератор ответов в порядке кодов codes независимо от того, в
+        каком порядке завершились запросы. При прекращении перебора
+        невыполненные запросы отменяются
+        
+    """
+    tokens = list(tokens) if tokens else [TOKEN]
+    
+    def execute(index, code):
+        return do_execute_request(code, lang,
+                                  token=tokens[index % len(tokens)],
+                                  **kwarg)
+    
+    return _run_ordered(execute, codes, workers)
+
+
+def execute_chunks(chunks, make_code, lang=DEFAULT_LANG, *,
+                   tokens=None,
+                   workers=WORKERS,
+                   **kwarg):
+    """Выполнение запросов execute для частей данных chunks, как в
+    execute_requests. Текст VKScript для части строит функция make_code,
+    ответ на запрос должен быть списком результатов по элементам части.
+    
+    Если ВК сообщает о превышении ограничений execute (ExecuteLimitError),
+    часть делится пополам, половины запрашиваются отдельно, а их ответы
+    объединяются. Часть из одного элемента не делится.
+    
+    Выход:
+        Генератор ответов в порядке частей chunks
+        
+    """
+    tokens = list(tokens) if tokens else [TOKEN]
+    
+    def execute(index, chunk):
+        token = tokens[index % len(tokens)]
+        try:
+            return do_execute_request(make_code(chunk), lang,
+                                      token=token, **kwarg)
+        except ExecuteLimitError:
+            if len(chunk) < 2:
+                raise
+        _step_metrics.record_split()
+        middle = len(chunk) // 2
+        return execute(index, chunk[:middle]) \
+               + execute(index + 1, chunk[middle:])
+    
+    return _run_ordered(execute, chunks, workers)
+
+
+def _run_ordered(execute, items, workers):
+    """Генератор результатов execute(index, item) для элементов items,
+    выполняемых в workers потоках, в порядке items. Вперед выполняется
+    не более 2 * workers вызовов: следующий вызов ставится в очередь,
+    когда очередной результат выдан. При прекращении перебора
+    невыполненные вызовы отменяются, остальные элементы не запрашиваются"""
+    if workers <= 1:
+        for index, item in enumerate(items):
+            yield execute(index, item)
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    item_iter = iter(enumerate(items))
+    try:
+        while True:
+            for index, item in item_iter:
+                pending.append(executor.submit(execute, index, item))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+class ScanCache:
+    """Кэш данных ВК, общий для поиска особых групп многих пользователей
+    (см. find_unshared_groups_batch): данные о группах (groups.getById) и
+    результаты проверки членства друзей в группах (groups.isMember).
+    Один объект можно использовать в нескольких вызовах. Потокобезопасен.
+    
+    Атрибуты hits и misses - число проверок членства (пар группа-друг),
+    найденных и не найденных в кэше.
+    
+    """
+    
+    def __init__(self):
+        self.groups = {}  # идентификатор группы -> данные группы
+        self.members = {} # идентификатор группы -> {друг: член ли группы}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def unknown_members(self, group, friends):
+        """Список друзей из friends, членство которых в группе group
+        еще не проверялось"""
+        with self._lock:
+            known = self.members.get(group, {})
+            unknown = [friend for friend in friends if friend not in known]
+            self.misses += len(unknown)
+            self.hits += len(friends) - len(unknown)
+            return unknown
+    
+    def set_members(self, group, users, flags):
+        """Сохранение результатов groups.isMember для группы group"""
+        with self._lock:
+            known = self.members.setdefault(group, {})
+            for user, flag in zip(users, flags):
+                known[user] = bool(flag)
+    
+    def count_members(self, group, friends):
+        """Число друзей из friends, состоящих в группе group. Друзья, для
+        которых нет данных, считаются не состоящими в группе"""
+        with self._lock:
+            known = self.members.get(group, {})
+            return sum(1 for friend in friends if known.get(friend))
+    
+    def members_copy(self):
+        """Копия результатов проверки членства: словарь {группа: {друг:
+        член ли группы}}"""
+        with self._lock:
+            return {group: dict(known)
+                    for group, known in self.members.items()}
+    
+    def unknown_groups(self, groups):
+        """Список групп из groups, данных о которых нет в кэше"""
+        with self._lock:
+            return [group for group in groups if group not in self.groups]
+    
+    def set_group(self, group_info):
+        """Сохранение данных о группе из ответа groups.getById"""
+        with self._lock:
+            self.groups[group_info['id']] = group_info
+
+
+def load_memberships(needed, cache, lang=DEFAULT_LANG, *,
+                     friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                     **kwarg):
+    """Загрузка в кэш результатов проверки членства друзей в группах.
+    Запрашиваются только пары группа-друг, которых еще нет в кэше, по
+    MAX_EXECUTE_CALLS обращений к groups.isMember в одном запросе execute.
+    Остальные именованные параметры передаются в execute_requests.
+    
+    Входные параметры:
+        needed: словарь {идентификатор группы: список друзей для проверки}
+        cache:  объект ScanCache
+        
+    Выход:
+        Число выполненных запросов execute
+        
+    """
+    checks = []
+    for group, friends in needed.items():
+        unknown = cache.unknown_members(group, list(friends))
+        step = min(friend_is_member_step, MAX_FRIEND_IS_MEMBER_STEP)
+        if unknown:
+            step = -(-len(unknown) // -(-len(unknown) // step))
+            _step_metrics.record_member_step(step)
+        for start in range(0, len(unknown), step):
+            checks.append((group, unknown[start:start + step]))
+    
+    packs = [checks[start:start + MAX_EXECUTE_CALLS]
+             for start in range(0, len(checks), MAX_EXECUTE_CALLS)]
+    for pack in packs:
+        _step_metrics.record_chunk(len(pack))
+    
+    def make_code(pack):
+        return vkscript_request(
+                CHECK_MEMBERSHIP_REQUEST_CODE,
+                checks=';'.join(f'{group}:{",".join(map(str, friends))}'
+                                for group, friends in pack))
+    responses = execute_chunks(packs, make_code, lang,
+                               cache_type='membership', **kwarg)
+    for pack, response in zip(packs, responses):
+        for (group, friends), (users, flags) in zip(pack, response):
+            cache.set_members(group, users, flags)
+    
+    return len(packs)
+
+
+def load_groups_info(groups, cache=None, lang=DEFAULT_LANG, **kwarg):
+    """Загрузка данных о группах (название, короткое имя, число
+    участников) по GROUP_INFO_STEP групп в одном обращении к
+    groups.getById и по MAX_EXECUTE_CALLS обращений в запросе execute.
+    Группы, данные о которых уже есть в кэше cache (объект ScanCache),
+    повторно не запрашиваются. Остальные именованные параметры
+    передаются в execute_requests.
+    
+    Выход:
+        Словарь {идентификатор группы: данные группы}
+        
+    """
+    if cache is None:
+        cache = ScanCache()
+    
+    unknown = cache.unknown_groups(groups)
+    steps = [','.join(map(str, unknown[start:start + GROUP_INFO_STEP]))
+             for start in range(0, len(unknown), GROUP_INFO_STEP)]
+    packs = [steps[start:start + MAX_EXECUTE_CALLS]
+             for start in range(0, len(steps), MAX_EXECUTE_CALLS)]
+    
+    def make_code(pack):
+        return vkscript_request(GET_GROUPS_INFO_REQUEST_CODE,
+                                group_ids=';'.join(pack))
+    for response in execute_chunks(packs, make_code, lang,
+                                   cache_type='groups_info', **kwarg):
+        for group_info in response:
+            cache.set_group(group_info)
+    
+    return {group: cache.groups[group] for group in groups
+            if group in cache.groups}
+
+
+def _set_groups_info(verdicts, groups_info):
+    """Заполнение данных об особых группах в записях о результатах
+    проверки групп verdicts по словарю groups_info (см. load_groups_info)
+    
+    Выход:
+        Тот же список verdicts
+        
+    """
+    for verdict in verdicts:
+        group_info = groups_info.get(verdict['gid'])
+        if verdict['special'] and group_info is not None:
+            verdict.update(name=group_info.get('name'),
+                           screen_name=group_info.get('screen_name'),
+                           members_count=group_info.get('members_count'))
+    return verdicts
+
+
+def _fill_groups_info(verdicts, cache, lang=DEFAULT_LANG, hold=None,
+                      **kwarg):
+    """Генератор записей о результатах проверки групп verdicts (см.
+    group_verdict), дополненных данными об особых группах. Данные
+    запрашиваются load_groups_info пачками по GROUP_INFO_STEP особых групп
+    (одно обращение к groups.getById), группы из кэша cache повторно не
+    запрашиваются. Записи, начиная с первой особой группы, задерживаются
+    до заполнения пачки или окончания проверки, порядок записей
+    сохраняется. Если указано hold, неполная пачка запрашивается, как
+    только после первой задержанной записи пройдет hold секунд (проверка
+    выполняется при получении очередной записи), чтобы записи выдавались
+    по мере проверки. Остальные именованные параметры передаются в
+    load_groups_info"""
+    pending = []
+    special = []
+    held = None
+    for verdict in verdicts:
+        if verdict['special']:
+            special.append(verdict['gid'])
+            if held is None:
+                held = monotonic()
+        elif not special:
+            yield verdict
+            continue
+        pending.append(verdict)
+        if len(special) >= GROUP_INFO_STEP \
+           or hold is not None and monotonic() - held >= hold:
+            yield from _set_groups_info(
+                    pending, load_groups_info(special, cache, lang, **kwarg))
+            pending, special, held = [], [], None
+    if special:
+        yield from _set_groups_info(
+                pending, load_groups_info(special, cache, lang, **kwarg))
+
+
+def iter_rescan_groups(user_info, snapshot, *,
+                       members_threshold=MEMBERS_THRESHOLD,
+                       lang=DEFAULT_LANG,
+                       friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                       groups=None,
+                       cache=None,
+                       **kwarg):
+    """Генератор инкрементального повторного поиска особых групп по
+    снимку предыдущего поиска (см. load_snapshot). Выдает записи о
+    результатах проверки групп (см. group_verdict) в порядке групп
+    пользователя. Остальные именованные параметры передаются в
+    execute_requests.
+    
+    Проверяется только то, что могло измениться с предыдущего поиска:
+        - для новых групп проверяется членство всех друзей;
+        - для прежних групп, если друзья только добавлялись, проверяется
+          членство добавленных друзей, и их число прибавляется к
+          сохраненному числу друзей в группе;
+        - если кто-то из друзей удален, для прежних групп заново
+          проверяется членство всех текущих друзей: снимок не хранит, в
+          каких группах состоял удаленный друг, а проверка его членства
+          сейчас не учитывает выход из группы после снимка.
+    Изменения членства в группах оставшихся друзей не учитываются,
+    поэтому периодически рекомендуется выполнять полный поиск.
+    
+    Данные о группах (название, короткое имя, число участников)
+    загружаются только для особых групп, у остальных групп они равны None.
+    
+    Входные параметры:
+        user_info: общие данные о пользователе (см. load_user_info)
+        snapshot:  снимок предыдущего поиска
+        groups:    список групп для проверки. По умолчанию - все группы
+                   пользователя
+        cache:     объект ScanCache для данных о группах и результатов
+                   проверки членства. По умолчанию создается новый
+        
+    """
+    friends = user_info['friends']['items']
+    old_friends = set(snapshot['friends'])
+    added = [friend for friend in friends if friend not in old_friends]
+    removed = list(old_friends.difference(friends))
+    counts = snapshot['counts']
+    if groups is None:
+        groups = user_info['groups']['items']
+    
+    needed = {}
+    for group in groups:
+        if group not in counts or removed:
+            needed[group] = friends
+        elif added:
+            needed[group] = added
+    
+    if cache is None:
+        cache = ScanCache()
+    load_memberships(needed, cache, lang,
+                     friend_is_member_step=friend_is_member_step, **kwarg)
+    
+    new_counts = {}
+    for group in groups:
+        if group in counts and not removed:
+            new_counts[group] = counts[group] \
+                                + cache.count_members(group, added)
+        else:
+            new_counts[group] = cache.count_members(group, friends)
+    
+    groups_info = load_groups_info(
+            [group for group in groups
+             if new_counts[group] <= members_threshold],
+            cache, lang, **kwarg)
+    
+    for group in groups:
+        group_info = groups_info.get(group, {})
+        yield dict(gid = group,
+                   name = group_info.get('name'),
+                   screen_name = group_info.get('screen_name'),
+                   members_count = group_info.get('members_count'),
+                   friends_in_group = new_counts[group],
+                   special = new_counts[group] <= members_threshold)
+
+
+def use_matrix(engine=ENGINE):
+    """Использовать ли для подсчета друзей в группах матрицу членства
+    (matrix.MembershipMatrix) при способе подсчета engine (см. ENGINE).
+    Если указан 'numpy', а пакет не установлен, генерируется
+    исключительная ситуация ImportError"""
+    if engine == 'auto':
+        return numpy is not None
+    if engine == 'numpy':
+        if numpy is None:
+            raise ImportError('Для подсчета engine="numpy" необходим пакет '
+                              'numpy')
+        return True
+    if engine == 'python':
+        return False
+    raise ValueError(f'Неизвестный способ подсчета: {engine}')
+
+
+def plan_strategy(groups_count, friends_count, *, batch=BATCH,
+                  friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                  hidden_share=HIDDEN_FRIENDS_SHARE):
+    """Оценка стоимости поиска особых групп обеими стратегиями (см.
+    STRATEGY) по числу групп и друзей пользователя и выбор более дешевой.
+    
+    Стратегия 'groups' проверяет каждую группу обращениями к
+    groups.isMember по срезам друзей, затем запрашивает данные об особых
+    группах (groups.getById по GROUP_INFO_STEP групп в запросе execute).
+    Оценка - без учета прекращения проверки после превышения порога и как
+    если бы все группы были особыми, т.е. сверху.
+    
+    Стратегия 'friends' запрашивает списки групп друзей (по одному
+    groups.get на друга, до MAX_EXECUTE_CALLS друзей в запросе execute) и
+    данные об особых группах (groups.getById, оценка - как если бы все
+    группы были особыми). Членство друзей, чьи группы недоступны (их доля
+    оценивается как hidden_share), проверяется во всех группах обращениями
+    к groups.isMember по MAX_EXECUTE_CALLS в запросе execute.
+    
+    Выход:
+        Словарь:
+            
+        {
+            "strategy": "groups" или "friends",
+            "groups":  {"requests": число запросов execute,
+                        "api_calls": число обращений к API},
+            "friends": {"requests": ..., "api_calls": ...}
+        }
+        
+        Выбирается стратегия с меньшим числом запросов execute (они
+        ограничены REQUEST_RATE в секунду на ключ доступа), при равенстве -
+        с меньшим числом обращений к API, затем 'groups'
+        
+    """
+    step = member_step(friends_count, friend_is_member_step)
+    info_calls = -(-groups_count // GROUP_INFO_STEP)
+    group_calls = groups_count * -(-friends_count // step) + info_calls
+    if batch:
+        group_requests = -(-groups_count // groups_per_execute(
+                friends_count, friend_is_member_step=step))
+    else:
+        group_requests = groups_count
+    group_requests += info_calls
+    
+    hidden = -int(-friends_count * hidden_share // 1)
+    hidden_calls = groups_count * -(-hidden // step)
+    friend_calls = friends_count + hidden_calls + info_calls
+    friend_requests = -(-friends_count // MAX_EXECUTE_CALLS) \
+                      + -(-hidden_calls // MAX_EXECUTE_CALLS) \
+                      + -(-info_calls // MAX_EXECUTE_CALLS)
+    
+    estimates = dict(groups=dict(requests=group_requests,
+                                 api_calls=group_calls),
+                     friends=dict(requests=friend_requests,
+                                  api_calls=friend_calls))
+    cost = {name: (estimate['requests'], estimate['api_calls'])
+            for name, estimate in estimates.items()}
+    strategy = 'friends' if cost['friends'] < cost['groups'] else 'groups'
+    
+    return dict(strategy=strategy, **estimates)
+
+
+def iter_friends_groups(friends, lang=DEFAULT_LANG, **kwarg):
+    """Генератор списков групп друзей friends: по MAX_EXECUTE_CALLS
+    обращений к groups.get (до MAX_GROUP_STEP групп) в одном запросе
+    execute. Остальные именованные параметры передаются в
+    execute_requests.
+    
+    Выход:
+        Пары (друг, список групп) в порядке friends. Вместо списка групп -
+        None, если группы друга недоступны (закрытый профиль, скрытый
+        список групп, удаленная страница) или их больше MAX_GROUP_STEP
+        
+    """
+    friends = list(friends)
+    packs = [friends[start:start + MAX_EXECUTE_CALLS]
+             for start in range(0, len(friends), MAX_EXECUTE_CALLS)]
+    
+    def make_code(pack):
+        return vkscript_request(GET_FRIENDS_GROUPS_REQUEST_CODE,
+                                friends=pack,
+                                count=MAX_GROUP_STEP)
+    responses = execute_chunks(packs, make_code, lang,
+                               cache_type='friends_groups', **kwarg)
+    try:
+        for pack, response in zip(packs, responses):
+            for friend, groups in zip(pack, response):
+                if not isinstance(groups, dict) \
+                   or groups['count'] > len(groups['items']):
+                    groups = None
+                else:
+                    groups = groups['items']
+                yield friend, groups
+    finally:
+        responses.close()
+
+
+def iter_groups_by_friends(user_info, *,
+                           members_threshold=MEMBERS_THRESHOLD,
+                           lang=DEFAULT_LANG,
+                           friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                           engine=ENGINE,
+                           groups=None,
+                           cache=None,
+                           **kwarg):
+    """Генератор поиска особых групп по спискам групп друзей (стратегия
+    'friends', см. plan_strategy). Выдает записи о результатах проверки
+    групп (см. group_verdict) в порядке групп пользователя. Остальные
+    именованные параметры передаются в execute_requests.
+    
+    Списки групп друзей запрашиваются по MAX_EXECUTE_CALLS друзей в
+    запросе execute, число друзей в каждой группе пользователя
+    подсчитывается локально. Для друзей, чьи группы недоступны (см.
+    iter_friends_groups), членство во всех группах пользователя
+    проверяется groups.isMember. Число друзей в группе всегда точное.
+    
+    Все запросы выполняются до выдачи первой записи. Данные о группах
+    (название, короткое имя, число участников) загружаются только для
+    особых групп, у остальных групп они равны None.
+    
+    Входные параметры:
+        user_info: общие данные о пользователе (см. load_user_info)
+        engine:    способ подсчета друзей в группах (см. ENGINE)
+        groups:    список групп для проверки. По умолчанию - все группы
+                   пользователя
+        cache:     объект ScanCache для данных о группах и результатов
+                   проверки членства. По умолчанию создается новый
+        
+    """
+    if groups is None:
+        groups = user_info['groups']['items']
+    
+    if cache is None:
+        cache = ScanCache()
+    
+    counts = dict.fromkeys(groups, 0)
+    hidden = []
+    lists = []
+    for friend, friend_groups in iter_friends_groups(
+                                    user_info['friends']['items'],
+                                    lang, **kwarg):
+        if friend_groups is None:
+            hidden.append(friend)
+        else:
+            lists.append((friend, friend_groups))
+    
+    if use_matrix(engine):
+        from unshared_vk.matrix import MembershipMatrix
+        counts.update(zip(groups, MembershipMatrix.from_friend_groups(
+                lists, groups).group_counts(groups=groups).tolist()))
+    else:
+        for friend, friend_groups in lists:
+            for group in friend_groups:
+                if group in counts:
+                    counts[group] += 1
+    
+    if hidden:
+        load_memberships(dict.fromkeys(groups, hidden), cache, lang,
+                         friend_is_member_step=friend_is_member_step,
+                         **kwarg)
+        for group in groups:
+            counts[group] += cache.count_members(group, hidden)
+    
+    groups_info = load_groups_info(
+            [group for group in groups if counts[group] <= members_threshold],
+            cache, lang, **kwarg)
+    
+    for group in groups:
+        group_info = groups_info.get(group, {})
+        yield dict(gid = group,
+                   name = group_info.get('name'),
+                   screen_name = group_info.get('screen_name'),
+                   members_count = group_info.get('members_count'),
+                   friends_in_group = counts[group],
+                   exact = True,
+                   special = counts[group] <= members_threshold)
+
+
+def find_unshared_groups_batch(user_ids, *,
+                               members_threshold=MEMBERS_THRESHOLD,
+                               json_file=None,
+                               lang=DEFAULT_LANG,
+                               token=TOKEN,
+                               silent=SILENT,
+                               raise_nouser=False,
+                               progress=simple_progress,
+                               group_step=GROUP_STEP,
+                               friend_step=FRIEND_STEP,
+                               friend_is_member_step=FRIEND_IS_MEMBER_STEP,
+                               request_delay=REQUEST_DELAY,
+                               request_repeat=MAX_REPEAT_REQUESTS,
+                               request_timeout=REQUEST_TIMEOUT,
+                               request_rate=REQUEST_RATE,
+                               retry_policy=None,
+                               on_request=None,
+                               deadline=None,
+                               tokens=None,
+                               workers=WORKERS,
+                               session=None,
+                               api_cache=None,
+                               cache=None,
+                               engine=ENGINE,
+                               **kwarg):
+    """Поиск особых групп сразу для многих пользователей.
+    
+    Сначала загружаются общие данные всех пользователей, затем проверки
+    членства планируются по группам, а не по пользователям: для каждой
+    группы друзья всех пользователей из списка, состоящих в ней,
+    проверяются вместе и только один раз. Общие друзья и группы разных
+    пользователей не запрашиваются повторно. Данные о группах
+    запрашиваются пачками и только для особых групп. Результаты
+    сохраняются в кэше cache (объект ScanCache), который можно передать в
+    следующий вызов.
+    
+    Входные параметры - как у find_unshared_groups, и дополнительно:
+        user_ids: список идентификаторов пользователей
+        cache:    объект ScanCache. По умолчанию создается новый. По
+                  результатам проверки членства в нем можно построить
+                  матрицу членства (matrix.MembershipMatrix.from_scan_cache)
+                  для дальнейшего анализа
+        api_cache: объект ApiCache - постоянный кэш ответов API ВК
+        
+    Стратегия, пакетная проверка и точный подсчет задаются самой
+    функцией, а записи возвращаются только после проверки всех
+    пользователей: параметры batch, strategy, exact_counts, stream, sink,
+    checkpoint_file, checkpoint_every, ndjson_file, snapshot_file и
+    friend_load_step допускаются только со значением None.
+    
+    По умолчанию raise_nouser=False: несуществующие и деактивированные
+    пользователи не прерывают поиск, для них возвращается пустой список.
+    
+    Возвращаемое значение:
+        Словарь {идентификатор пользователя: список особых групп в формате
+        find_unshared_groups}. Если указан json_file, словарь сохраняется в
+        нем в формате json
+        
+    Функция генерирует исключительную ситуацию ValueError, если указан
+    неподдерживаемый параметр.
+        
+    """
+    unsupported = [name for name in ('batch', 'strategy', 'exact_counts',
+                                     'stream', 'sink', 'checkpoint_file',
+                                     'checkpoint_every', 'ndjson_file',
+                                     'snapshot_file', 'friend_load_step')
+                   if kwarg.pop(name, None) is not None]
+    if unsupported:
+        raise ValueError(f'Параметры не поддерживаются при поиске для '
+                         f'нескольких пользователей: '
+                         f'{", ".join(unsupported)}')
+    
+    if not(is_in_ipython() or is_a_tty()): silent = True
+    
+    if cache is None:
+        cache = ScanCache()
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    retry_policy = retry_policy.with_deadline(deadline)
+    
+    request_kwarg = dict(tokens=tokens or [token],
+                         workers=workers,
+                         request_delay=request_delay,
+                         request_repeat=request_repeat,
+                         request_timeout=request_timeout,
+                         request_rate=request_rate,
+                         retry_policy=retry_policy,
+                         on_request=on_request,
+                         session=session,
+                         api_cache=api_cache)
+    
+    progress(0)
+    
+    user_ids = list(dict.fromkeys(user_ids))
+    request_tokens = request_kwarg['tokens']
+    
+    def load(index, user_id):
+        token = request_tokens[index % len(request_tokens)]
+        return load_user_info(user_id, lang,
+                              token=token,
+                              group_step=group_step,
+                              friend_step=friend_step,
+                              request_delay=request_delay,
+                              request_repeat=request_repeat,
+                              request_timeout=request_timeout,
+                              request_rate=request_rate,
+                              retry_policy=retry_policy,
+                              on_request=on_request,
+                              session=session,
+                              api_cache=api_cache)
+    users = {}
+    for user_id, user_info in zip(user_ids,
+                                  _run_ordered(load, user_ids, workers)):
+        if check_user_info(user_info, user_id, raise_nouser):
+            users[user_id] = user_info
+    progress(10)
+    
+    needed = {}
+    for user_info in users.values():
+        friends = user_info['friends']['items']
+        for group in user_info['groups']['items']:
+            needed.setdefault(group, set()).update(friends)
+    
+    load_memberships(needed, cache, lang,
+                     friend_is_member_step=friend_is_member_step,
+                     **request_kwarg)
+    progress(80)
+    
+    if use_matrix(engine):
+        from unshared_vk.matrix import MembershipMatrix
+        matrix = MembershipMatrix.from_scan_cache(cache)
+        group_counts = {
+                user_id: zip(user_info['groups']['items'],
+                             matrix.group_counts(
+                                    user_info['friends']['items'],
+                                    user_info['groups']['items']).tolist())
+                for user_id, user_info in users.items()}
+    else:
+        group_counts = {
+                user_id: [(group, cache.count_members(
+                                    group, user_info['friends']['items']))
+                          for group in user_info['groups']['items']]
+                for user_id, user_info in users.items()}
+    special = {user_id: [(group, count) for group, count in counts
+                         if count <= members_threshold]
+               for user_id, counts in group_counts.items()}
+    
+    groups_info = load_groups_info(
+            list({group for groups in special.values()
+                  for group, count in groups}),
+            cache, lang, **request_kwarg)
+    progress(100)
+    
+    results = {user_id: [] for user_id in user_ids}
+    for user_id, groups in special.items():
+        if not silent:
+            print_user_info(user_id, users[user_id])
+        for group, count in groups:
+            # Группа без данных groups.getById (например, удаленная)
+            # остается в результате с пустыми названием и числом
+            # участников, как при поиске для одного пользователя
+            verdict = group_verdict(group,
+                                    dict(friends_in_group=count,
+                                         special_group=True),
+                                    groups_info.get(group))
+            results[user_id].append(special_group_record(verdict))
+            if not silent:
+                print_special_group(verdict)
+        if not silent:
+            print_summary(users[user_id], len(results[user_id]))
+    
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+    
+    return results
+
+
+async def async_do_execute_request(code, lang=DEFAULT_LANG, *,
+                                   token=TOKEN,
+                                   request_delay=REQUEST_DELAY,
+                                   request_repeat=MAX_REPEAT_REQUESTS,
+                                   request_timeout=REQUEST_TIMEOUT,
+                                   request_rate=REQUEST_RATE,
+                                   retry_policy=None,
+                                   on_request=None,
+                                   session=None,
+                                   api_cache=None,
+                                   fast_json=FAST_JSON,
+                                   compact_items=False,
+                                   cache_type='execute',
+                                   **kwarg):
+    """Асинхронная версия do_execute_request на основе aiohttp
+    
+    Входные параметры те же, что у do_execute_request, и дополнительно:
+        session: объект aiohttp.ClientSession, через который выполнять
+                 запрос. Если не указан, создается временная сессия
+                 
+    Ограничение частоты запросов request_rate общее с do_execute_request:
+    синхронные и асинхронные запросы с одним ключом доступа учитываются
+    вместе.
+    
+    Выход:
+        Часть ответа request внутри секции response
+        
+    В случае ошибок могут генерироваться исключительные ситуации
+    aiohttp.ClientError и asyncio.TimeoutError при сбоях передачи данных,
+    requests.RequestException при повторяющихся ошибках в ответах ВК
+    
+    """
+    if aiohttp is None:
+        raise ImportError('Для асинхронных запросов необходим пакет aiohttp')
+    
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await async_do_execute_request(
+                    code, lang, token=token,
+                    request_delay=request_delay,
+                    request_repeat=request_repeat,
+                    request_timeout=request_timeout,
+                    request_rate=request_rate,
+                    retry_policy=retry_policy,
+                    on_request=on_request,
+                    session=session,
+                    api_cache=api_cache,
+                    fast_json=fast_json,
+                    compact_items=compact_items,
+                    cache_type=cache_type)
+    
+    request = _execute_request(code)
+    trace = _request_trace(request, cache_type)
+    
+    if api_cache is not None:
+        cache_key = _execute_cache_key(api_cache, lang, request, token)
+        cached = api_cache.get(cache_key, cache_type)
+        if cached is not None:
+            if on_request is not None:
+                trace['cached'] = True
+                _finish_trace(trace, on_request, True)
+            return compact_id_arrays(cached) if compact_items else cached
+    
+    if request_timeout is None:
+        timeout = aiohttp.ClientTimeout(total=None)
+    elif isinstance(request_timeout, tuple):
+        timeout = aiohttp.ClientTimeout(total=None,
+                                        sock_connect=request_timeout[0],
+                                        sock_read=request_timeout[1])
+    else:
+        timeout = aiohttp.ClientTimeout(total=None,
+                                        sock_connect=request_timeout,
+                                        sock_read=request_timeout)
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    
+    success = False
+    try:
+        response = await _async_execute_attempts(request, lang, session,
+                                                 token, timeout,
+                                                 request_rate, retry_policy,
+                                                 fast_json, trace)
+        success = True
+    finally:
+        if on_request is not None:
+            _finish_trace(trace, on_request, success)
+    
+    if api_cache is not None:
+        api_cache.put(cache_key, cache_type, response)
+    
+    if compact_items:
+        return compact_id_arrays(response)
+    return response
+
+
+async def _async_execute_attempts(request, lang, session, token, timeout,
+                                  request_rate, retry_policy, fast_json,
+                                  trace):
+    """Асинхронная версия _execute_attempts. timeout - объект
+    aiohttp.ClientTimeout"""
+    response = None
+    limiter = get_rate_limiter(token, request_rate)
+    for attempt in range(max(1, retry_policy.retries)):
+        retry_policy.check_deadline()
+        if limiter is not None:
+            wait = limiter.reserve()
+            await asyncio.sleep(wait)
+            trace['rate_wait'] += max(0, wait)
+        trace['attempts'] += 1
+        started = monotonic()
+        try:
+            async with session.post(
+                    REQUEST_EXECUTE_PATH,
+                    data=dict(
+                            access_token=token,
+                            v=API_VERSION,
+                            lang=lang,
+                            code=request.code,
+                            **request.args
+                            ),
+                    timeout=timeout
+                    ) as r:
+                content = await r.read()
+            trace['response_bytes'] += len(content)
+            response = json_loads(content, fast=fast_json)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f'{type(e).__name__}: {e}', file=sys.stderr)
+            response = e
+        except ValueError as e:
+            print(f'Ответ ВК не в формате json: {e}', file=sys.stderr)
+            response = requests.RequestException(
+                    f'VK response is not valid json: {e}')
+        trace['latency'] += monotonic() - started
+        if not isinstance(response, Exception) \
+           and not 'error' in response:
+               break
+        _trace_error(trace, response)
+        pause = retry_pause(retry_policy, response, attempt)
+        if pause is None:
+            break
+        await asyncio.sleep(pause)
+        trace['retry_sleep'] += pause
+        
+    if isinstance(response, Exception):
+        raise response
+    if 'error' in response:
+        raise VKRequestError(response['error'])
+    
+    return response['response']
+
+
+async def async_find_unshared_groups(user_id, *,
+                                     members_threshold=MEMBERS_THRESHOLD,
+                                     json_file=DEFAULT_OUTPUT_JSON_FILE,
+                                     lang=DEFAULT_LANG,
+                                     token=TOKEN,
+                                     silent=SILENT,
+                                     raise_nouser=True,
+                                     progress=simple_progress,
+                                     group_step=GROUP_STEP,
+                                     friend_step=FRIEND_STEP,
+                                     friend_load_step=FRIEND_LOAD_STEP,
+                                     friend_is_member_step=\
+                                         FRIEND_IS_MEMBER_STEP,
+                                     request_delay=REQUEST_DELAY,
+                                     request_repeat=MAX_REPEAT_REQUESTS,
+                                     request_timeout=REQUEST_TIMEOUT,
+                                     request_rate=REQUEST_RATE,
+                                     retry_policy=None,
+                                     on_request=None,
+                                     deadline=None,
+                                     batch=BATCH,
+                                     exact_counts=EXACT_COUNTS,
+                                     tokens=None,
+                                     concurrency=ASYNC_CONCURRENCY,
+                                     session=None,
+                                     api_cache=None,
+                                     cache=None,
+                                     checkpoint_file=None,
+                                     checkpoint_every=CHECKPOINT_EVERY,
+                                     ndjson_file=None,
+                                     sink=None,
+                                     return_stats=False,
+                                     **kwarg):
+    """Асинхронная версия find_unshared_groups на основе aiohttp.
+    
+    Входные параметры и возвращаемое значение те же, что у
+    find_unshared_groups, вместо workers используются:
+        concurrency: максимальное число одновременно выполняемых запросов
+                     проверки групп в рамках одного поиска
+        session:     объект aiohttp.ClientSession. Если не указан,
+                     на время поиска создается своя сессия. Одну сессию
+                     можно использовать для многих одновременных поисков
+                     
+    Ограничение частоты запросов request_rate действует на ключ доступа
+    и общее для всех одновременно выполняемых поисков.
+    
+    При отмене задачи (asyncio.CancelledError) все выполняющиеся запросы
+    поиска также отменяются.
+    
+    """
+    if aiohttp is None:
+        raise ImportError('Для асинхронных запросов необходим пакет aiohttp')
+    
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await async_find_unshared_groups(
+                    user_id,
+                    members_threshold=members_threshold,
+                    json_file=json_file,
+                    lang=lang,
+                    token=token,
+                    silent=silent,
+                    raise_nouser=raise_nouser,
+                    progress=progress,
+                    group_step=group_step,
+                    friend_step=friend_step,
+                    friend_is_member_step=friend_is_member_step,
+                    request_delay=request_delay,
+                    request_repeat=request_repeat,
+                    request_timeout=request_timeout,
+                    request_rate=request_rate,
+                    retry_policy=retry_policy,
+                    on_request=on_request,
+                    deadline=deadline,
+                    batch=batch,
+                    exact_counts=exact_counts,
+                    tokens=tokens,
+                    concurrency=concurrency,
+                    session=session,
+                    api_cache=api_cache,
+                    cache=cache,
+                    checkpoint_file=checkpoint_file,
+                    checkpoint_every=checkpoint_every,
+                    ndjson_file=ndjson_file,
+                    sink=sink,
+                    return_stats=return_stats)
+    
+    if not(is_in_ipython() or is_a_tty()): silent = True
+    
+    tokens = list(tokens) if tokens else [token]
+    
+    if retry_policy is None:
+        retry_policy = RetryPolicy(request_repeat, request_delay)
+    retry_policy = retry_policy.with_deadline(deadline)
+    
+    request_stats = None
+    if return_stats:
+        request_stats = on_request = RequestStats(on_request)
+    
+    progress(0)
+    
+    user_info = await async_load_user_info(user_id, lang,
+                                           token=tokens[0],
+                                           group_step=group_step,
+                                           friend_step=friend_step,
+                                           request_delay=request_delay,
+                                           request_repeat=request_repeat,
+                                           request_timeout=request_timeout,
+                                           request_rate=request_rate,
+                                           retry_policy=retry_policy,
+                                           on_request=on_request,
+                                           session=session,
+                                           api_cache=api_cache)
+    
+    special_groups = []
+    
+    if check_user_info(user_info, user_id, raise_nouser, progress):
+        
+        scan = _GroupScan(user_id, user_info,
+                          members_threshold=members_threshold,
+                          silent=silent,
+                          progress=progress,
+                          checkpoint_file=checkpoint_file,
+                          checkpoint_every=checkpoint_every,
+                          ndjson_file=ndjson_file,
+                          sink=sink,
+                          params=dict(exact_counts=exact_counts,
+                                      strategy='groups'))
+        special_groups = list(scan.special_groups)
+        
+        # Записи нужны по мере нахождения: задержка их ради запроса данных
+        # о группах большими пачками ограничивается
+        group_info_hold = None
+        if checkpoint_file or ndjson_file or sink is not None:
+            group_info_hold = GROUP_INFO_HOLD
+        
+        verdicts = async_iter_unshared_groups(
+                        user_id,
+                        members_threshold=members_threshold,
+                        lang=lang,
+                        friend_is_member_step=friend_is_member_step,
+                        request_delay=request_delay,
+                        request_repeat=request_repeat,
+                        request_timeout=request_timeout,
+                        request_rate=request_rate,
+                        retry_policy=retry_policy,
+                        on_request=on_request,
+                        batch=batch,
+                        exact_counts=exact_counts,
+                        tokens=tokens,
+                        concurrency=concurrency,
+                        session=session,
+                        api_cache=api_cache,
+                        cache=cache,
+                        user_info=user_info,
+                        groups=scan.pending_groups(),
+                        group_info_hold=group_info_hold)
+        try:
+            async for verdict in verdicts:
+                record = scan.add(verdict)
+                if record is not None:
+                    special_groups.append(record)
+        except BaseException:
+            scan.save_checkpoint()
+            scan.close()
+            raise
+        finally:
+            await verdicts.aclose()
+                    
+        scan.finish()
+    
+    result = save_special_groups(special_groups, json_file)
+    if return_stats:
+        return result, request_stats
+    return result
+
+
+async def async_load_user_info(user_id, lang=DEFAULT_LANG, *,
+                               token=TOKEN,
+                               group_step=GROUP_STEP,
+                               friend_step=FRIEND_STEP,
+                               **kwarg):
+    """Асинхронная версия load_user_info. Остальные именованные
+    параметры передаются в async_do_execute_request"""
+    code = vkscript_request(GET_MAIN_USER_INFO_REQUEST_CODE,
+                            user_id=user_id,
+                            group_step=min(group_step, MAX_GROUP_STEP),
+                            friend_step=min(friend_step, MAX_FRIEND_STEP))
+    try:
+        return await async_do_execute_request(code, lang, token=token,
+                                              compact_items=True,
+                                              cache_type='user_info',
+                                              **kwarg)
+    except ExecuteLimitError:
+        if group_step >= MAX_GROUP_STEP and friend_step >= MAX_FRIEND_STEP:
+            raise
+    _step_metrics.record_fallback()
+    return await async_load_user_info(user_id, lang, token=token,
+                                      group_step=MAX_GROUP_STEP,
+                                      friend_step=MAX_FRIEND_STEP, **kwarg)
+
+
+async def async_load_groups_info(groups, cache=None, lang=DEFAULT_LANG,
+                                 **kwarg):
+    """Асинхронная версия load_groups_info. Части запрашиваются
+    последовательно. Остальные именованные параметры передаются в
+    async_do_execute_request"""
+    if cache is None:
+        cache = ScanCache()
+    
+    unknown = cache.unknown_groups(groups)
+    steps = [','.join(map(str, unknown[start:start + GROUP_INFO_STEP]))
+             for start in range(0, len(unknown), GROUP_INFO_STEP)]
+    
+    async def load(pack):
+        """Запрос данных о группах части pack. При превышении ограничений
+        execute часть делится пополам (см. execute_chunks)"""
+        code = vkscript_request(GET_GROUPS_INFO_REQUEST_CODE,
+                                group_ids=';'.join(pack))
+        try:
+            return await async_do_execute_request(code, lang,
+                                                  cache_type='groups_info',
+                                                  **kwarg)
+        except ExecuteLimitError:
+            if len(pack) < 2:
+                raise
+        _step_metrics.record_split()
+        middle = len(pack) // 2
+        return await load(pack[:middle]) + await load(pack[middle:])
+    
+    for start in range(0, len(steps), MAX_EXECUTE_CALLS):
+        for group_info in await load(steps[start:start + MAX_EXECUTE_CALLS]):
+            cache.set_group(group_info)
+    
+    return {group: cache.groups[group] for group in groups
+            if group in cache.groups}
+
+
+async def _async_fill_groups_info(verdicts, cache, lang=DEFAULT_LANG,
+                                  hold=None, **kwarg):
+    """Асинхронная версия _fill_groups_info для асинхронного генератора
+    verdicts. Остальные именованные параметры передаются в
+    async_load_groups_info"""
+    pending = []
+    special = []
+    held = None
+    async for verdict in verdicts:
+        if verdict['special']:
+            special.append(verdict['gid'])
+            if held is None:
+                held = monotonic()
+        elif not special:
+            yield verdict
+            continue
+        pending.append(verdict)
+        if len(special) >= GROUP_INFO_STEP \
+           or hold is not None and monotonic() - held >= hold:
+            groups_info = await async_load_groups_info(special, cache, lang,
+                                                       **kwarg)
+            for verdict in _set_groups_info(pending, groups_info):
+                yield verdict
+            pending, special, held = [], [], None
+    if special:
+        groups_info = await async_load_groups_info(special, cache, lang,
+                                                   **kwarg)
+        for verdict in _set_groups_info(pending, groups_info):
+            yield verdict
+
+
+async def async_iter_unshared_groups(user_id, *,
+                                     members_threshold=MEMBERS_THRESHOLD,
+                                     lang=DEFAULT_LANG,
+                                     token=TOKEN,
+                                     raise_nouser=True,
+                                     group_step=GROUP_STEP,
+                                     friend_step=FRIEND_STEP,
+                                     friend_is_member_step=\
+                                         FRIEND_IS_MEMBER_STEP,
+                                     request_delay=REQUEST_DELAY,
+                                     request_repeat=MAX_REPEAT_REQUESTS,
+                                     request_timeout=REQUEST_TIMEOUT,
+                                     request_rate=REQUEST_RATE,
+                                     retry_policy=None,
+                                     on_request=None,
+                                     batch=BATCH,
+                                     exact_counts=EXACT_COUNTS,
+                                     tokens=None,
+                                     concurrency=ASYNC_CONCURRENCY,
+                                     session=None,
+                                     api_cache=None,
+                                     cache=None,
+                                     user_info=None,
+                                     groups=None,
+                                     group_info_hold=GROUP_INFO_HOLD,
+                                     **kwarg):
+    """Асинхронная версия iter_unshared_groups (асинхронный генератор).
+    Вместо workers используется concurrency - максимальное число
+    одновременно выполняемых запросов. Параметр session обязателен
+    (объект aiohttp.ClientSession).
+    
+    При прекращении перебора или отмене задачи выполняющиеся запросы
+    отменяются.
+    
+    """
+    tokens = list(tokens) if tokens else [token]
+    
+    if user_info is None:
+        user_info = await async_load_user_info(
+                            user_id, lang,
+                            token=tokens[0],
+                            group_step=group_step,
+                            friend_step=friend_step,
+                            request_delay=request_delay,
+                            request_repeat=request_repeat,
+                            request_timeout=request_timeout,
+                            request_rate=request_rate,
+                            retry_policy=retry_policy,
+                            on_request=on_request,
+                            session=session,
+                            api_cache=api_cache)
+        if not check_user_info(user_info, user_id, raise_nouser):
+            return
+    
+    if groups is None:
+        groups = user_info['groups']['items']
+    
+    if cache is None:
+        cache = ScanCache()
+    
+    step = member_step(len(user_info['friends']['items']),
+                       friend_is_member_step)
+    friends = friend_slices(user_info['friends']['items'], step)
+    chunks = group_chunks(groups,
+                          len(user_info['friends']['items']),
+                          batch=batch,
+                          friend_is_member_step=step)
+    
+    async def check_chunk(index, chunk):
+        """Проверка части групп одним запросом execute. При превышении
+        ограничений execute часть делится пополам (см. execute_chunks)"""
+        code = check_groups_code(
+                    chunk, friends,
+                    batch=batch,
+                    members_threshold=members_threshold,
+                    exact_counts=exact_counts)
+        try:
+            response = await async_do_execute_request(
+                                code, lang,
+                                cache_type='group_check',
+                                token=tokens[index % len(tokens)],
+                                request_delay=request_delay,
+                                request_repeat=request_repeat,
+                                request_timeout=request_timeout,
+                                request_rate=request_rate,
+                                retry_policy=retry_policy,
+                                on_request=on_request,
+                                session=session,
+                                api_cache=api_cache)
+        except ExecuteLimitError:
+            if len(chunk) < 2:
+                raise
+            _step_metrics.record_split()
+            middle = len(chunk) // 2
+            return await check_chunk(index, chunk[:middle]) \
+                   + await check_chunk(index + 1, chunk[middle:])
+        return response if batch else [response]
+    
+    async def iter_verdicts():
+        """Результаты проверки групп без данных о группах. Одновременно
+        выполняется не более concurrency запросов, результаты выдаются в
+        порядке групп пользователя"""
+        pending = deque()
+        chunk_iter = iter(enumerate(chunks))
+        try:
+            while True:
+                for index, chunk in chunk_iter:
+                    pending.append((chunk, asyncio.ensure_future(
+                                               check_chunk(index, chunk))))
+                    if len(pending) >= concurrency:
+                        break
+                if not pending:
+                    break
+                chunk, task = pending[0]
+                checks = await task
+                pending.popleft()
+                for group, check in zip(chunk, checks):
+                    yield group_verdict(group, check)
+        finally:
+            for chunk, task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*(task for chunk, task in pending),
+                                     return_exceptions=True)
+    
+    verdicts = iter_verdicts()
+    filled = _async_fill_groups_info(verdicts, cache, lang,
+                                     hold=group_info_hold,
+                                     token=tokens[0],
+                                     request_delay=request_delay,
+                                     request_repeat=request_repeat,
+                                     request_timeout=request_timeout,
+                                     request_rate=request_rate,
+                                     retry_policy=retry_policy,
+                                     on_request=on_request,
+                                     session=session,
+                                     api_cache=api_cache)
+    try:
+        async for verdict in filled:
+            yield verdict
+    finally:
+        await filled.aclose()
+        await verdicts.aclose()
+
+# Инициализация colorama, которая используется 
+# для управления выводом эскейп последоваетльностей управления терминалом
+# и перенаправлением их в Windows Api вызовы. Чтобы не заниматься этим вручну.
+# Используется для цветного вывода
+if is_in_ipython():
+    colorama.init(convert=False, strip=False)
+else:
+    colorama.init()
+
+
+if __name__ == '__main__':
+    
+    # Разбор командной строки
+    
+    import argparse
+    
+    def str2bool(value):
+        """Форматирование булевых значений командной строки"""
+        if value.lower() in \
+            ('yes', 'true', 't', 'y', '1', 'д', 'да', 'истина'):
+            return True
+        elif value.lower() in \
+            ('no', 'false', 'f', 'n', '0', 'н', 'нет', 'ложь'):
+            return False
+        else:
+            raise argparse.ArgumentTypeError('Ожидалось логическое значение')
             
     def str2timeout(value):
         """Форматирование задания timeout в командной строке"""
@@ -764,7 +4496,13 @@ if __name__ == '__main__':
                         help='число повторений запросов')
     parser.add_argument('--request-delay', nargs='?', type=float,
                         const=REQUEST_DELAY, default=REQUEST_DELAY,
-                        help='задержка между запросами при ошибках')
+                        help='задержка перед первым повтором запроса при '
+                             'ошибках')
+    parser.add_argument('--request-rate', nargs='?', type=float,
+                        const=REQUEST_RATE, default=REQUEST_RATE,
+                        help='максимальное число запросов в секунду')
+    parser.add_argument('--deadline', nargs='?', type=float, default=None,
+                        help='общее время поиска в секундах')
     if REQUEST_TIMEOUT is None:
         parser.add_argument('--request-timeout1', nargs='?', type=str2timeout,
                             const='None', default='None',
@@ -819,6 +4557,57 @@ if __name__ == '__main__':
                         const=MEMBERS_THRESHOLD,
                         default=MEMBERS_THRESHOLD,
                         help='порог специфичности')
+    parser.add_argument('--thresholds', nargs='+', type=int, default=None,
+                        help='несколько порогов специфичности: один проход '
+                             'с точным подсчетом друзей во всех группах, '
+                             'списки особых групп для каждого порога и '
+                             'распределение групп по числу друзей')
+    parser.add_argument('--batch', type=str2bool, nargs='?',
+                        const=True, default=BATCH,
+                        help='проверять несколько групп в одном запросе')
+    parser.add_argument('--exact-counts', type=str2bool, nargs='?',
+                        const=True, default=EXACT_COUNTS,
+                        help='считать точное число друзей в группах, не '
+                             'прекращая проверку после превышения порога')
+    parser.add_argument('--strategy', nargs='?', type=str,
+                        choices=('groups', 'friends', 'auto'),
+                        const=STRATEGY, default=STRATEGY,
+                        help='стратегия поиска: проверка групп, списки '
+                             'групп друзей или выбор по оценке числа '
+                             'запросов')
+    parser.add_argument('--engine', nargs='?', type=str,
+                        choices=('python', 'numpy', 'auto'),
+                        const=ENGINE, default=ENGINE,
+                        help='способ подсчета друзей в группах по '
+                             'полученным данным о членстве')
+    parser.add_argument('--tokens', nargs='+', type=str, default=None,
+                        help='несколько ключей доступа ВК для распределения '
+                             'запросов (заменяет --token)')
+    parser.add_argument('--workers', nargs='?', type=int,
+                        const=WORKERS, default=WORKERS,
+                        help='число потоков проверки групп')
+    parser.add_argument('--checkpoint-file', nargs='?', type=str,
+                        default=None,
+                        help='файл контрольной точки для продолжения '
+                             'прерванного поиска')
+    parser.add_argument('--checkpoint-every', nargs='?', type=int,
+                        const=CHECKPOINT_EVERY, default=CHECKPOINT_EVERY,
+                        help='через сколько групп сохранять контрольную '
+                             'точку')
+    parser.add_argument('--ndjson-file', nargs='?', type=str, default=None,
+                        help='выходной NDJSON файл, пополняемый по мере '
+                             'нахождения особых групп')
+    parser.add_argument('--snapshot-file', nargs='?', type=str,
+                        default=None,
+                        help='файл снимка результатов для инкрементального '
+                             'повторного поиска')
+    parser.add_argument('--users-file', nargs='?', type=str, default=None,
+                        help='файл со списком пользователей (по одному в '
+                             'строке) для поиска по многим пользователям')
+    parser.add_argument('--cache-file', nargs='?', type=str,
+                        const=CACHE_FILE, default=None,
+                        help='использовать постоянный кэш ответов ВК в '
+                             'указанном файле')
     parser.add_argument('-i', '--interactive', type=str2bool, nargs='?',
                         const=True, default=False,
                         help="интерактивный ввод данных")
@@ -844,7 +4633,12 @@ if __name__ == '__main__':
         
     for item in ('group_step', 'friend_step', 'friend_load_step',
                  'friend_is_member_step', 'silent', 'token',
-                 'request_delay', 'request_repeat'):
+                 'request_delay', 'request_repeat', 'request_rate',
+                 'deadline',
+                 'batch', 'exact_counts', 'strategy', 'engine', 'tokens',
+                 'workers',
+                 'checkpoint_file', 'checkpoint_every', 'ndjson_file',
+                 'snapshot_file'):
         params[item] = args[item]
     
     if args['request_timeout1'] == 'None' \
@@ -858,6 +4652,13 @@ if __name__ == '__main__':
         params['request_timeout'] = (float(args['request_timeout1']),
                                      float(args['request_timeout2']))
     
+    params['api_cache'] = None
+    if args['cache_file']:
+        params['api_cache'] = ApiCache(args['cache_file'])
+    
+    if args['workers'] > POOL_SIZE:
+        set_default_session(make_session(pool_size=args['workers']))
+    
     if args['interactive']:
         
         # Ввод в режиме интерактивного ввода
@@ -885,6 +4686,32 @@ if __name__ == '__main__':
         find_unshared_groups(user_id,
                              members_threshold=members_threshold,
                              **params)
+    elif args['users_file']:
+        
+        # Поиск для всех пользователей из файла
+        
+        with open(args['users_file'], encoding='utf-8') as f:
+            user_ids = [line.strip() for line in f if line.strip()]
+        
+        # Параметры, которые всегда имеют значения по умолчанию, но при
+        # этом поиске не используются, не передаются
+        
+        for item in ('batch', 'exact_counts', 'strategy',
+                     'friend_load_step', 'checkpoint_every'):
+            del params[item]
+        find_unshared_groups_batch(user_ids,
+                                   members_threshold=members_threshold,
+                                   **params)
+    elif not user_id is None and args['thresholds']:
+        
+        # Поиск для нескольких порогов за один проход. Параметры,
+        # которые всегда имеют значения по умолчанию, но при этом поиске
+        # не используются, не передаются
+        
+        for item in ('friend_load_step', 'checkpoint_every'):
+            del params[item]
+        find_unshared_groups_thresholds(user_id, args['thresholds'],
+                                        **params)
     elif not user_id is None:
         
         # Вызов функции для пользователя, указанного в командной строке